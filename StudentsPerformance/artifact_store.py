@@ -0,0 +1,256 @@
+"""
+Artifact files of the fitted objects (features processors, models, compiled plans) and a versioned registry.
+
+An artifact is a single file: a JSON header followed by a pickle protocol 5 stream whose NumPy arrays are
+stored out-of-band, each at a 64-byte aligned offset. Loading with mmap_mode='r' maps the file and hands the
+arrays to pickle as views on the mapping, so large arrays are neither read nor copied up front and worker
+processes serving the same artifact share its pages through the page cache. The header holds the SHA-256
+of the payload (checked with verify=True) and the library versions of the saving process.
+
+    save_artifact(path, model, metadata={'test_score': 0.87}, compress='zlib')
+    model = load_artifact(path, mmap_mode='r')
+
+    registry = ArtifactRegistry('artifacts/registry')
+    registry.register('best_model', path, score=0.87)
+    registry.load('best_model', 'best')
+
+Files without the header (plain pickles written before this format) still load.
+"""
+import sys
+import bz2
+import lzma
+import zlib
+import json
+import mmap
+import pickle
+import shutil
+import hashlib
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+from StudentsPerformance.logger import logger
+from StudentsPerformance.profiler import profiler
+
+
+MAGIC = b'SPARTIF\x01'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+COMPRESSORS = {
+    'zlib': (lambda data, level: zlib.compress(data, level), zlib.decompress),
+    'bz2': (lambda data, level: bz2.compress(data, level), bz2.decompress),
+    'lzma': (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+
+# Libraries whose versions are recorded with an artifact when they are loaded in the saving process
+VERSIONED_LIBRARIES = ('numpy', 'scipy', 'pandas', 'sklearn', 'xgboost', 'catboost')
+
+
+def library_versions() -> Dict[str, str]:
+    versions = {'python': sys.version.split()[0]}
+    for name in VERSIONED_LIBRARIES:
+        module = sys.modules.get(name)
+        if module is not None:
+            versions[name] = getattr(module, '__version__', 'unknown')
+    return versions
+
+
+def metadata_path(artifact_path: Path) -> Path:
+    """Metadata sidecar of an artifact: the JSON file with the same name."""
+    return Path(artifact_path).with_suffix('.json')
+
+
+def _padding(offset: int) -> int:
+    return -offset % ALIGNMENT
+
+
+def _payload_chunks(sections, starts):
+    """The sections at their offsets, with the zero padding in between."""
+    position = 0
+    for section, start in zip(sections, starts):
+        if start > position:
+            yield b'\0' * (start - position)
+        yield section
+        position = start + section.nbytes
+
+
+def save_artifact(path: Path, obj: Any, metadata: Optional[Dict] = None, compress: Optional[str] = None,
+                  compress_level: int = 3) -> Dict:
+    """
+    Writes obj as an artifact file, and its metadata sidecar when metadata is given.
+
+    :param path: Artifact file.
+    :param obj: Picklable object.
+    :param metadata: JSON-serializable information stored in the sidecar (score, params, data hash, ...),
+        completed with the artifact header.
+    :param compress: None, 'zlib', 'bz2' or 'lzma'. A compressed artifact cannot be memory-mapped.
+    :param compress_level: Compression level.
+    :return: The artifact header.
+    """
+    if compress is not None and compress not in COMPRESSORS:
+        raise ValueError(f"Unknown compression '{compress}', expected one of {list(COMPRESSORS)}")
+
+    buffers: List[pickle.PickleBuffer] = []
+    stream = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+
+    # Payload layout: the pickle stream, then each out-of-band buffer at an aligned offset
+    sections, starts, layout = [memoryview(stream)], [0], []
+    offset = len(stream)
+    for buffer in buffers:
+        raw = buffer.raw()
+        offset += _padding(offset)
+        layout.append([offset, raw.nbytes])
+        sections.append(raw)
+        starts.append(offset)
+        offset += raw.nbytes
+
+    digest = hashlib.sha256()
+    for chunk in _payload_chunks(sections, starts):
+        digest.update(chunk)
+
+    header = {'format': FORMAT_VERSION, 'protocol': 5, 'compress': compress, 'pickle_length': len(stream),
+              'buffers': layout, 'payload_length': offset, 'sha256': digest.hexdigest(),
+              'library_versions': library_versions(), 'created_at': datetime.now().isoformat(timespec='seconds')}
+    header_bytes = json.dumps(header).encode()
+    prefix = MAGIC + len(header_bytes).to_bytes(8, 'little') + header_bytes
+    prefix += b'\0' * _padding(len(prefix))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with profiler.span('save_artifact', path=str(path), compress=compress):
+        with open(tmp_path, 'wb') as file:
+            file.write(prefix)
+            if compress is not None:
+                payload = b''.join(bytes(chunk) for chunk in _payload_chunks(sections, starts))
+                file.write(COMPRESSORS[compress][0](payload, compress_level))
+            else:
+                for chunk in _payload_chunks(sections, starts):
+                    file.write(chunk)
+        # Renamed into place, so a reader never sees a partial artifact
+        tmp_path.replace(path)
+
+    header['size_bytes'] = path.stat().st_size
+    if metadata is not None:
+        sidecar = {**metadata, 'artifact': {'file': path.name, **header}}
+        with open(metadata_path(path), 'w') as file:
+            json.dump(sidecar, file, indent=2, default=str)
+    return header
+
+
+def read_header(path: Path) -> Optional[Dict]:
+    """:return: The header of an artifact file, None for a plain pickle."""
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            return None
+        length = int.from_bytes(file.read(8), 'little')
+        header = json.loads(file.read(length))
+    header['data_offset'] = len(MAGIC) + 8 + length + _padding(len(MAGIC) + 8 + length)
+    return header
+
+
+def load_artifact(path: Path, mmap_mode: Optional[str] = 'r', verify: bool = False) -> Any:
+    """
+    Loads an artifact file (or a plain pickle).
+
+    :param path: Artifact file.
+    :param mmap_mode: 'r' maps the file and backs the arrays with the mapping (read-only arrays, shared
+        pages); None reads the file into private memory. Ignored for compressed artifacts.
+    :param verify: Check the SHA-256 of the payload, which reads the whole file.
+    :return: The unpickled object.
+    """
+    path = Path(path)
+    header = read_header(path)
+    if header is None:
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+    if header['format'] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format {header['format']} in {path}")
+    if mmap_mode not in ('r', None):
+        raise ValueError(f"mmap_mode must be 'r' or None, got {mmap_mode!r}")
+
+    with profiler.span('load_artifact', path=str(path), mmap_mode=mmap_mode, compress=header['compress']):
+        with open(path, 'rb') as file:
+            if header['compress'] is not None:
+                file.seek(header['data_offset'])
+                payload = memoryview(bytearray(COMPRESSORS[header['compress']][1](file.read())))
+            elif mmap_mode:
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                payload = memoryview(mapping)[header['data_offset']:]
+            else:
+                file.seek(header['data_offset'])
+                payload = memoryview(bytearray(file.read()))
+
+        if len(payload) != header['payload_length']:
+            raise ValueError(f"Truncated artifact {path}: {len(payload)} of {header['payload_length']} bytes")
+        if verify and hashlib.sha256(payload).hexdigest() != header['sha256']:
+            raise ValueError(f"Checksum mismatch for artifact {path}")
+
+        buffers = [payload[start:start + length] for start, length in header['buffers']]
+        return pickle.loads(payload[:header['pickle_length']], buffers=buffers)
+
+
+class ArtifactRegistry:
+    """
+    Versioned copies of artifacts: <root>/<name>/v0001/<file> (+ its sidecar), with an index.json listing the
+    versions and the 'latest' and 'best' (highest score) pointers.
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+
+    def _index_path(self, name: str) -> Path:
+        return self.root / name / 'index.json'
+
+    def index(self, name: str) -> Dict:
+        index_path = self._index_path(name)
+        if not index_path.exists():
+            return {'versions': [], 'latest': None, 'best': None}
+        with open(index_path, 'r') as file:
+            return json.load(file)
+
+    def register(self, name: str, artifact_path: Path, score: Optional[float] = None) -> int:
+        """
+        Copies an artifact file (and its sidecar) as the next version of name.
+
+        :param score: Higher is better; the version with the highest score is the 'best' one.
+        :return: The new version number.
+        """
+        artifact_path = Path(artifact_path)
+        index = self.index(name)
+        version = max((entry['version'] for entry in index['versions']), default=0) + 1
+        version_dir = self.root / name / f'v{version:04d}'
+        version_dir.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(artifact_path, version_dir / artifact_path.name)
+        if metadata_path(artifact_path).exists():
+            shutil.copyfile(metadata_path(artifact_path), version_dir / metadata_path(artifact_path).name)
+
+        header = read_header(artifact_path) or {}
+        index['versions'].append({'version': version, 'file': f'{version_dir.name}/{artifact_path.name}',
+                                  'score': score, 'sha256': header.get('sha256'),
+                                  'registered_at': datetime.now().isoformat(timespec='seconds')})
+        index['latest'] = version
+        scored = [entry for entry in index['versions'] if entry['score'] is not None]
+        index['best'] = max(scored, key=lambda entry: entry['score'])['version'] if scored else version
+
+        tmp_path = self._index_path(name).with_suffix('.tmp')
+        with open(tmp_path, 'w') as file:
+            json.dump(index, file, indent=2)
+        tmp_path.replace(self._index_path(name))
+        logger.info(f"Registered {artifact_path} as {name} v{version} (latest: v{index['latest']}, "
+                    f"best: v{index['best']})")
+        return version
+
+    def resolve(self, name: str, version: Union[int, str] = 'latest') -> Path:
+        """:param version: Version number, 'latest' or 'best'."""
+        index = self.index(name)
+        if version in ('latest', 'best'):
+            version = index[version]
+        entries = [entry for entry in index['versions'] if entry['version'] == version]
+        if not entries:
+            raise KeyError(f'No version {version} of {name} in {self.root}')
+        return self.root / name / entries[0]['file']
+
+    def load(self, name: str, version: Union[int, str] = 'latest', **kwargs) -> Any:
+        """:param kwargs: Passed to load_artifact (mmap_mode, verify)."""
+        return load_artifact(self.resolve(name, version), **kwargs)
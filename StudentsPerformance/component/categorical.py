@@ -0,0 +1,71 @@
+import inspect
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+
+
+# Preprocessing variants a model can be trained on:
+#   encoded          - the full ColumnTransformer output (one-hot encoded and scaled categoricals)
+#   raw_categorical  - the numerical pipeline only, categoricals kept as pandas categoricals
+INPUT_MODES = ('encoded', 'raw_categorical')
+
+
+class RawCategoricalProcessor(BaseEstimator, TransformerMixin):
+    """
+    Preprocessing of the raw_categorical input mode: the numerical pipeline is applied to the numerical
+    columns and the categorical columns are returned as pandas categoricals with the categories seen in
+    training, so models with native categorical support (XGBoost, CatBoost) split on them directly.
+
+    Missing and unseen values are mapped to the missing_category level, which CatBoost requires (it
+    rejects NaN in categorical features).
+    """
+
+    def __init__(self, numerical_pipeline, numerical_features, categorical_features, missing_category='missing',
+                 dtype='float64'):
+        self.numerical_pipeline = numerical_pipeline
+        self.numerical_features = numerical_features
+        self.categorical_features = categorical_features
+        self.missing_category = missing_category
+        self.dtype = dtype
+
+    def _as_text(self, values: pd.Series) -> pd.Series:
+        return values.astype(object).where(values.notna(), self.missing_category).astype(str)
+
+    def fit(self, X: pd.DataFrame, y=None):
+        self.numerical_pipeline_ = clone(self.numerical_pipeline).fit(X[list(self.numerical_features)])
+        self.categories_ = {}
+        for column in self.categorical_features:
+            categories = sorted(set(self._as_text(X[column])) - {self.missing_category})
+            self.categories_[column] = categories + [self.missing_category]
+        return self
+
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        numerical = np.asarray(self.numerical_pipeline_.transform(X[list(self.numerical_features)]),
+                               dtype=self.dtype)
+        output = pd.DataFrame(numerical, columns=list(self.numerical_features))
+        for column in self.categorical_features:
+            categories = self.categories_[column]
+            values = self._as_text(X[column].reset_index(drop=True))
+            values = values.where(values.isin(categories), self.missing_category)
+            output[column] = pd.Categorical(values, categories=categories)
+        return output
+
+
+def native_categorical_params(estimator, categorical_columns) -> dict:
+    """
+    Parameters turning on the native categorical support of an estimator.
+
+    :param estimator: XGBoost, CatBoost or scikit-learn HistGradientBoosting estimator.
+    :param categorical_columns: Names of the categorical columns of the raw_categorical input.
+    :return: Parameters to set on the estimator.
+    """
+    # CatBoost's get_params only lists the parameters that were set, so the constructor signature is checked too
+    params = set(estimator.get_params()) | set(inspect.signature(type(estimator).__init__).parameters)
+    if 'enable_categorical' in params:      # XGBoost
+        return {'enable_categorical': True}
+    if 'cat_features' in params:            # CatBoost; a tuple, CatBoost copies lists which breaks clone()
+        return {'cat_features': tuple(categorical_columns)}
+    if 'categorical_features' in params:    # scikit-learn HistGradientBoosting
+        return {'categorical_features': 'from_dtype'}
+    raise ValueError(f'{type(estimator).__name__} has no native categorical support, '
+                     f'use the encoded input mode')
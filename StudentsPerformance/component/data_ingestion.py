@@ -1,45 +1,28 @@
-import os
 import sys
+import shutil
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from sklearn.model_selection import train_test_split
 from StudentsPerformance.entity import DataIngestionConfig
-from StudentsPerformance.config import ConfigurationManager
 from StudentsPerformance.exception import CustomException
 from StudentsPerformance.logger import logger
-from dotenv import load_dotenv
-load_dotenv()
-
-from kaggle.api.kaggle_api_extended import KaggleApi
+from StudentsPerformance.profiler import profiler
+from StudentsPerformance.utils import save_dataframe, DataFrameChunkWriter
+from StudentsPerformance.component.data_sources import fetch_dataset
 
 
 class DataIngestion:
     def __init__(self, config: DataIngestionConfig):
         self.config = config
 
-    def _initialize_kaggle_api(self) -> KaggleApi:
-        """Initialize and authenticate Kaggle API."""
-        api = KaggleApi()
-        api.authenticate()
-        return api
-
-    def _download_dataset(self, api: KaggleApi):
-        try:
-            data_ingestion_path = Path(self.config.root_dir)
-            data_identifier = self.config.kaggle_dataset_id
-
-            # Download the dataset
-            logger.info(f"Starting download for dataset: {data_identifier}")
-            api.dataset_download_files(data_identifier, path=str(data_ingestion_path), unzip=True)
-            logger.info(f"Dataset downloaded successfully to {data_ingestion_path}")
-
-            # Rename the downloaded file
-            downloaded_csv_file = Path(data_ingestion_path, os.listdir(data_ingestion_path)[0])
-            downloaded_csv_file.rename(self.config.dataset_path)
-
-        except Exception as e:
-            logger.error(f"Error occurred while downloading dataset: {str(e)}")
-            raise CustomException(e, sys)
+    def _fetch_dataset(self):
+        """Copy the verified dataset from the configured source (or the download cache) to dataset_path."""
+        dataset_file = fetch_dataset(self.config.source, self.config.kaggle_dataset_id, self.config.cache_dir)
+        dataset_path = Path(self.config.dataset_path)
+        if dataset_file.resolve() != dataset_path.resolve():
+            dataset_path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(dataset_file, dataset_path)
 
     def _load_data(self) -> pd.DataFrame:
         """Load dataset from CSV file."""
@@ -47,27 +30,93 @@ class DataIngestion:
         if not dataset_path.exists():
             logger.error(f'Dataset file not found: {dataset_path}')
             raise FileNotFoundError(f'Dataset file not found: {dataset_path}')
-        return pd.read_csv(dataset_path)
+        with profiler.span('read_csv', path=str(dataset_path)) as span:
+            dataset = pd.read_csv(dataset_path)
+            span['attributes']['rows'] = len(dataset)
+        return dataset
 
     def _split_and_save_data(self, dataset: pd.DataFrame):
         try:
             # Splitting dataset into training and test sets
-            train_data, test_data = train_test_split(dataset, test_size=0.2, random_state=42)
+            split = self.config.split
+            train_data, test_data = train_test_split(dataset, test_size=split.test_size,
+                                                     random_state=split.random_state)
 
-            train_data.to_csv(self.config.train_data_path, index=False, header=True)
-            test_data.to_csv(self.config.test_data_path, index=False, header=True)
+            save_dataframe(train_data, self.config.train_data_path, self.config.artifact_format)
+            save_dataframe(test_data, self.config.test_data_path, self.config.artifact_format)
             logger.info('Saving training & testing dataset  -->  completed')
 
         except Exception as e:
             logger.error(f"Error occurred during data splitting and saving: {e}")
             raise CustomException(e, sys)
 
+    @staticmethod
+    def _uniform(keys: np.ndarray, seed: int) -> np.ndarray:
+        """Deterministic pseudo-random numbers in [0, 1) derived from the keys and the seed."""
+        hashes = pd.util.hash_array(np.asarray(keys))
+        seed_hash = pd.util.hash_array(np.array([seed], dtype=np.uint64))[0]
+        return (pd.util.hash_array(hashes ^ seed_hash) >> np.uint64(11)) * 2.0 ** -53
+
+    def _stratify_bin_edges(self) -> np.ndarray:
+        """First pass reading only the stratify column: equal-width bin edges between its min and max."""
+        split = self.config.split
+        low, high = np.inf, -np.inf
+        for chunk in pd.read_csv(self.config.dataset_path, usecols=[split.stratify_column], chunksize=split.chunksize):
+            low = min(low, chunk[split.stratify_column].min())
+            high = max(high, chunk[split.stratify_column].max())
+        return np.linspace(low, high, split.stratify_bins + 1)[1:-1]
+
+    def _streaming_split(self):
+        """
+        Splits the dataset chunk by chunk, so memory is O(chunk) instead of O(dataset).
+
+        Without stratification a row goes to the test set when the hash of its key (or row number) and the
+        seed falls below test_size, which is reproducible whatever the chunk size. With stratification, rows
+        are binned on stratify_column and each bin is sampled systematically from a seeded random start, so
+        every bin gets test_size of its rows (deterministic for a given input order and seed).
+        """
+        try:
+            split = self.config.split
+            edges = self._stratify_bin_edges() if split.stratify_column is not None else None
+            if edges is not None:
+                n_bins = len(edges) + 2     # np.digitize puts NaN after the last edge bin
+                seen = np.zeros(n_bins, dtype=np.int64)
+                phase = self._uniform(np.arange(n_bins, dtype=np.uint64), split.random_state)
+
+            start = 0
+            with DataFrameChunkWriter(self.config.train_data_path, self.config.artifact_format) as train_writer, \
+                    DataFrameChunkWriter(self.config.test_data_path, self.config.artifact_format) as test_writer:
+                for chunk in pd.read_csv(self.config.dataset_path, chunksize=split.chunksize):
+                    if edges is None:
+                        keys = chunk[split.key_column].to_numpy() if split.key_column is not None \
+                            else np.arange(start, start + len(chunk), dtype=np.uint64)
+                        is_test = self._uniform(keys, split.random_state) < split.test_size
+                    else:
+                        bins = np.digitize(chunk[split.stratify_column].to_numpy(dtype=np.float64), edges)
+                        rank = seen[bins] + pd.Series(bins).groupby(bins).cumcount().to_numpy() + 1
+                        quota = np.floor(rank * split.test_size + phase[bins])
+                        is_test = quota > np.floor((rank - 1) * split.test_size + phase[bins])
+                        seen += np.bincount(bins, minlength=n_bins)
+
+                    train_writer.write(chunk[~is_test])
+                    test_writer.write(chunk[is_test])
+                    start += len(chunk)
+
+            logger.info(f'Streaming split: {train_writer.n_rows} training rows, {test_writer.n_rows} testing rows')
+
+        except Exception as e:
+            logger.error(f"Error occurred during the streaming split: {e}")
+            raise CustomException(e, sys)
+
     def initiate_data_ingestion(self):
         try:
-            api = self._initialize_kaggle_api()
-            self._download_dataset(api)
-            dataset = self._load_data()
-            self._split_and_save_data(dataset)
+            self._fetch_dataset()
+            if self.config.split.mode == 'streaming':
+                with profiler.span('streaming_split'):
+                    self._streaming_split()
+            else:
+                dataset = self._load_data()
+                self._split_and_save_data(dataset)
             logger.info('Data ingestion process completed successfully')
 
         except Exception as e:
@@ -76,6 +125,10 @@ class DataIngestion:
 
 
 if __name__ == '__main__':
+    from StudentsPerformance.logger import configure_logging
+    from StudentsPerformance.config import ConfigurationManager
+
+    configure_logging()
     config = ConfigurationManager()
     data_ingestion_config = config.get_data_ingestion_config()
     data_ingestion = DataIngestion(data_ingestion_config)
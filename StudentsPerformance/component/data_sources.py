@@ -0,0 +1,188 @@
+import re
+import sys
+import json
+import shutil
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+from StudentsPerformance.logger import logger
+from StudentsPerformance.utils import hash_file
+from StudentsPerformance.exception import CustomException
+from StudentsPerformance.entity import DataSourceConfig
+
+
+def _select_csv(directory: Path, file_name: Optional[str]) -> Path:
+    """
+    Picks the dataset file of a downloaded/mirrored dataset: the configured file name, or else the only
+    CSV file of the directory. Never depends on the directory listing order.
+    """
+    if file_name is not None:
+        path = directory / file_name
+        if not path.exists():
+            raise FileNotFoundError(f'Dataset file {file_name} not found in {directory}')
+        return path
+
+    csv_files = sorted(directory.rglob('*.csv'))
+    if len(csv_files) != 1:
+        raise ValueError(f'Expected exactly one CSV file in {directory}, found {[f.name for f in csv_files]}; '
+                         f'set data_ingestion.source.file_name')
+    return csv_files[0]
+
+
+class DataSource:
+    """Where the raw dataset comes from."""
+
+    def __init__(self, config: DataSourceConfig, dataset_id: str):
+        self.config = config
+        self.dataset_id = dataset_id
+
+    def fetch(self, work_dir: Path) -> Path:
+        """
+        Makes the dataset file available locally.
+
+        :param work_dir: Scratch directory the source may download into.
+        :return: Path of the dataset CSV file.
+        """
+        raise NotImplementedError
+
+    def local_path(self) -> Optional[Path]:
+        """:return: The dataset file when it is already on this machine (None for remote sources)."""
+        return None
+
+
+class KaggleSource(DataSource):
+    def fetch(self, work_dir: Path) -> Path:
+        # The Kaggle client authenticates at import time, so it is only imported when a download is needed
+        from dotenv import load_dotenv
+        load_dotenv()
+        from kaggle.api.kaggle_api_extended import KaggleApi
+
+        api = KaggleApi()
+        api.authenticate()
+        logger.info(f"Starting download for dataset: {self.dataset_id}")
+        api.dataset_download_files(self.dataset_id, path=str(work_dir), unzip=True)
+        logger.info(f"Dataset downloaded successfully to {work_dir}")
+        return _select_csv(work_dir, self.config.file_name)
+
+
+class LocalPathSource(DataSource):
+    def fetch(self, work_dir: Path) -> Path:
+        return self.local_path()
+
+    def local_path(self) -> Optional[Path]:
+        path = Path(self.config.uri)
+        return _select_csv(path, self.config.file_name) if path.is_dir() else path
+
+
+class FileMirrorSource(DataSource):
+    """
+    A file:// mirror of Kaggle datasets: <mirror>/<owner>/<dataset>/<file>, or a file:// URL of the file.
+    """
+
+    def fetch(self, work_dir: Path) -> Path:
+        return self.local_path()
+
+    def local_path(self) -> Optional[Path]:
+        url = urlparse(self.config.uri)
+        if url.scheme != 'file':
+            raise ValueError(f'Mirror URI must be a file:// URL, got {self.config.uri}')
+        path = Path(url2pathname(url.path))
+        if path.is_dir():
+            dataset_dir = path / self.dataset_id
+            return _select_csv(dataset_dir if dataset_dir.is_dir() else path, self.config.file_name)
+        return path
+
+
+SOURCES = {'kaggle': KaggleSource, 'local': LocalPathSource, 'mirror': FileMirrorSource}
+
+
+def source_file(source_config: DataSourceConfig, dataset_id: str) -> Optional[Path]:
+    """
+    :return: The local or mirror dataset file of a source, None for Kaggle (whose content is only known
+        after a download; pin its sha256 to make a new version visible) or when it cannot be resolved.
+    """
+    try:
+        return SOURCES[source_config.type](source_config, dataset_id).local_path()
+    except (KeyError, OSError, TypeError, ValueError):
+        return None
+
+
+class DatasetCache:
+    """
+    Verified dataset files keyed by dataset id, source and SHA-256:
+    <cache_dir>/<dataset id>/<source type>-<source key>/<sha256>.csv, plus a 'latest' pointer used for
+    unpinned Kaggle downloads. Two sources of the same dataset id (e.g. two local files) never share entries.
+    """
+
+    def __init__(self, cache_dir: Path, dataset_id: str, source_config: DataSourceConfig):
+        signature = json.dumps([source_config.type, source_config.uri, source_config.file_name])
+        source_key = hashlib.sha256(signature.encode()).hexdigest()[:12]
+        self.directory = Path(cache_dir, re.sub(r'[^A-Za-z0-9_.-]+', '__', dataset_id),
+                              f'{source_config.type}-{source_key}')
+
+    def _entry(self, sha256: str) -> Path:
+        return self.directory / f'{sha256}.csv'
+
+    def lookup(self, sha256: Optional[str]) -> Optional[Path]:
+        """:return: The cached file with the given checksum (or the latest one), None on a miss."""
+        if sha256 is None:
+            latest = self.directory / 'latest.json'
+            if not latest.exists():
+                return None
+            with open(latest, 'r') as file:
+                sha256 = json.load(file)['sha256']
+        entry = self._entry(sha256)
+        return entry if entry.exists() else None
+
+    def store(self, path: Path, sha256: str) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = self._entry(sha256)
+        tmp_entry = entry.with_suffix('.tmp')
+        shutil.copyfile(path, tmp_entry)
+        tmp_entry.replace(entry)
+        with open(self.directory / 'latest.json', 'w') as file:
+            json.dump({'sha256': sha256, 'source_file': path.name}, file)
+        return entry
+
+
+def fetch_dataset(source_config: DataSourceConfig, dataset_id: str, cache_dir: Optional[Path]) -> Path:
+    """
+    Returns a verified local copy of the dataset. Local and mirror files are read and hashed on every call
+    (cheap), so an edited or repointed file is never hidden by the cache; Kaggle is downloaded only on a
+    cache miss.
+
+    :param source_config: Source type, URI, file name and optional pinned SHA-256.
+    :param dataset_id: Dataset identifier (Kaggle id), part of the cache key with the source.
+    :param cache_dir: Download cache directory (None disables caching).
+    :return: Path of the dataset CSV file.
+    """
+    try:
+        if source_config.type not in SOURCES:
+            raise ValueError(f"Unknown data source '{source_config.type}', expected one of {list(SOURCES)}")
+
+        cache = DatasetCache(cache_dir, dataset_id, source_config) if cache_dir is not None else None
+        if cache is not None and not source_config.refresh and source_config.type == 'kaggle':
+            cached = cache.lookup(source_config.sha256)
+            if cached is not None:
+                logger.info(f"Dataset {dataset_id} loaded from cache: {cached}")
+                return cached
+
+        source = SOURCES[source_config.type](source_config, dataset_id)
+        with tempfile.TemporaryDirectory() as work_dir:
+            path = source.fetch(Path(work_dir))
+            sha256 = hash_file(path)
+            if source_config.sha256 is not None and sha256 != source_config.sha256:
+                raise ValueError(f'Checksum mismatch for {dataset_id}: expected {source_config.sha256}, got {sha256}')
+            if cache is None:
+                if source_config.type == 'kaggle':
+                    raise ValueError('The kaggle source needs a cache_dir to keep the downloaded file')
+                return path
+            cached = cache.lookup(sha256) if not source_config.refresh else None
+            return cached if cached is not None else cache.store(path, sha256)
+
+    except Exception as e:
+        logger.error(f"Error occurred while fetching dataset {dataset_id}: {e}")
+        raise CustomException(e, sys)
@@ -1,17 +1,33 @@
 import os
 import sys
+import json
+import shutil
+import hashlib
 import numpy as np
 import pandas as pd
+from scipy import sparse
 from pathlib import Path
+from dataclasses import asdict
 from importlib import import_module
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from StudentsPerformance.logger import logger
-from StudentsPerformance.utils import save_object
+from StudentsPerformance.profiler import profiler
+from StudentsPerformance.utils import save_object, hash_file, load_dataframe
 from StudentsPerformance.exception import CustomException
-from StudentsPerformance.component.data_ingestion import DataIngestion
 from StudentsPerformance.entity import DataTransformationConfig
-from StudentsPerformance.config import ConfigurationManager
+from StudentsPerformance.component.categorical import RawCategoricalProcessor
+
+
+# File names inside a transformation cache entry
+PROCESSOR_FILE = 'features_processors.pkl'
+TRAIN_ARRAY_FILE = 'train_array.npy'
+TEST_ARRAY_FILE = 'test_array.npy'
+RAW_TRAIN_FILE = 'raw_train.parquet'
+RAW_TEST_FILE = 'raw_test.parquet'
+
+# ColumnTransformer sparse_threshold of each matrix_format: the output is CSR when its density is below it
+SPARSE_THRESHOLDS = {'dense': 0.0, 'auto': 0.3, 'sparse': 1.0}
 
 
 class DataTransformation:
@@ -62,39 +78,129 @@ class DataTransformation:
 
         return numerical_pipeline, categorical_pipeline
 
+    def _cache_key(self) -> str:
+        """
+        Computes the content address of a transformation: input file hashes plus the serialized
+        features and pipeline configuration.
+        """
+        key = {
+            'train_data': hash_file(Path(self.config.train_data_path)),
+            'test_data': hash_file(Path(self.config.test_data_path)),
+            'features_data_transformation': asdict(self.config.features_data_transformation),
+            'pipeline_data_transformation': asdict(self.config.pipeline_data_transformation),
+            'array_dtype': self.config.array_dtype,
+            'matrix_format': self.config.matrix_format,
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _load_from_cache(self, cache_path: Path):
+        """
+        Returns the memory-mapped train/test arrays of a cache entry and restores its fitted processor
+        at features_output_path, or None if the entry does not exist.
+        """
+        cached_files = [cache_path / PROCESSOR_FILE]
+        for name in (TRAIN_ARRAY_FILE, TEST_ARRAY_FILE):
+            # Sparse arrays are stored as .npz next to where the dense .npy would be
+            dense_file = cache_path / name
+            cached_files.append(dense_file if dense_file.exists() else dense_file.with_suffix('.npz'))
+        if not all(file.exists() for file in cached_files):
+            return None
+
+        self._restore_processor(cached_files[0], Path(self.config.features_output_path))
+        logger.info(f"Data transformation loaded from cache: {cache_path}")
+        return tuple(sparse.load_npz(file) if file.suffix == '.npz' else np.load(file, mmap_mode='r')
+                     for file in cached_files[1:])
+
+    @staticmethod
+    def _restore_processor(cached_file: Path, output_path: Path):
+        if not output_path.exists() or hash_file(output_path) != hash_file(cached_file):
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(cached_file, output_path)
+
+    @staticmethod
+    def _commit_cache_entry(cache_path: Path, write_files):
+        # Written under a temporary name and renamed, so an interrupted run never leaves a partial entry
+        tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+        write_files(tmp_path)
+        shutil.rmtree(cache_path, ignore_errors=True)
+        tmp_path.rename(cache_path)
+        logger.info(f"Data transformation cached at {cache_path}")
+
+    def _save_to_cache(self, cache_path: Path, train_data_array, test_data_array):
+        def write_files(directory: Path):
+            shutil.copyfile(self.config.features_output_path, directory / PROCESSOR_FILE)
+            for name, data_array in ((TRAIN_ARRAY_FILE, train_data_array), (TEST_ARRAY_FILE, test_data_array)):
+                if sparse.issparse(data_array):
+                    sparse.save_npz(directory / Path(name).with_suffix('.npz'), data_array, compressed=False)
+                else:
+                    np.save(directory / name, data_array)
+
+        self._commit_cache_entry(cache_path, write_files)
+
+    def _attach_target(self, features_transformed, target):
+        """Appends the target column(s) as the last columns, keeping CSR features sparse."""
+        target = np.asarray(target, dtype=self.config.array_dtype).reshape(features_transformed.shape[0], -1)
+        if sparse.issparse(features_transformed):
+            return sparse.hstack([features_transformed, target], format='csr', dtype=self.config.array_dtype)
+        return np.c_[features_transformed, target].astype(self.config.array_dtype, copy=False)
+
     def data_transformation(self):
         try:
-            # Load training and testing data
-            train_data = pd.read_csv(self.config.train_data_path)
-            test_data = pd.read_csv(self.config.test_data_path)
+            cache_path = None
+            if self.config.cache_dir is not None:
+                cache_path = Path(self.config.cache_dir, self._cache_key())
+                cached_arrays = self._load_from_cache(cache_path)
+                if cached_arrays is not None:
+                    return cached_arrays
 
             features = self.config.features_data_transformation
             numerical_features = features.numerical_features
             categorical_features = features.categorical_features
 
-            # Separate features and target variable
-            features_train = train_data.drop(columns=[features.target_variable], axis=1)
-            features_test = test_data.drop(columns=[features.target_variable], axis=1)
-            target_train = train_data[features.target_variable]
-            target_test = test_data[features.target_variable]
+            # Load only the columns used by the transformation
+            columns = list(numerical_features) + list(categorical_features) + features.target_variables
+            with profiler.span('load_data', format=self.config.artifact_format):
+                train_data = load_dataframe(self.config.train_data_path, self.config.artifact_format, columns=columns)
+                test_data = load_dataframe(self.config.test_data_path, self.config.artifact_format, columns=columns)
+
+            # Separate the features from the target variable(s); the features are transformed once for all targets
+            features_train = train_data.drop(columns=features.target_variables, axis=1)
+            features_test = test_data.drop(columns=features.target_variables, axis=1)
+            target_train = train_data[features.target_variables]
+            target_test = test_data[features.target_variables]
 
             # Initialize the pipelines
             numerical_pipeline, categorical_pipeline = self.initialize_pipeline()
 
             # Combine the pipelines using ColumnTransformer
+            if self.config.matrix_format not in SPARSE_THRESHOLDS:
+                raise ValueError(f"Unknown matrix_format '{self.config.matrix_format}', "
+                                 f"expected one of {list(SPARSE_THRESHOLDS)}")
             processing = ColumnTransformer([('numerical_pipeline', numerical_pipeline, numerical_features),
-                                            ('categorical_pipeline', categorical_pipeline, categorical_features)])
+                                            ('categorical_pipeline', categorical_pipeline, categorical_features)],
+                                           sparse_threshold=SPARSE_THRESHOLDS[self.config.matrix_format])
 
             # Transform the data
-            train_features_transformed = processing.fit_transform(features_train)
-            test_features_transformed = processing.transform(features_test)
+            with profiler.span('fit_transform', rows=len(features_train)):
+                train_features_transformed = processing.fit_transform(features_train)
+            with profiler.span('transform', rows=len(features_test)):
+                test_features_transformed = processing.transform(features_test)
+
+            if self.config.matrix_format == 'sparse' and not sparse.issparse(train_features_transformed):
+                logger.warning("matrix_format is sparse but no configured step produces sparse output, "
+                               "the transformed arrays are dense")
 
             # Combine transformed features with target variable
-            train_data_array = np.c_[train_features_transformed, np.array(target_train)]
-            test_data_array = np.c_[test_features_transformed , np.array(target_test)]
+            train_data_array = self._attach_target(train_features_transformed, target_train)
+            test_data_array = self._attach_target(test_features_transformed, target_test)
 
             # Save the processing object for future use
-            save_object(file_path=Path(self.config.features_output_path), object=processing)
+            save_object(file_path=Path(self.config.features_output_path), object=processing,
+                        compress=self.config.artifact_store.compress)
+            if cache_path is not None:
+                self._save_to_cache(cache_path, train_data_array, test_data_array)
             logger.info("Data transformation completed successfully.")
 
             return train_data_array, test_data_array
@@ -104,23 +210,57 @@ class DataTransformation:
             raise CustomException(e, sys)
 
 
-if __name__ == '__main__':
-    try:
-        # Configuration setup
-        config = ConfigurationManager()
+    def raw_categorical_transformation(self):
+        """
+        Preprocessing of the models trained with the raw_categorical input mode: fits a
+        RawCategoricalProcessor on the training split and saves it at raw_features_output_path.
+
+        :return: Tuple (train features, test features) of DataFrames with categorical columns.
+        """
+        try:
+            processor_path = Path(self.config.raw_features_output_path)
+            cache_path = None
+            if self.config.cache_dir is not None:
+                cache_path = Path(self.config.cache_dir, f'{self._cache_key()}-raw_categorical')
+                cached_files = [cache_path / name for name in (PROCESSOR_FILE, RAW_TRAIN_FILE, RAW_TEST_FILE)]
+                if all(file.exists() for file in cached_files):
+                    self._restore_processor(cached_files[0], processor_path)
+                    logger.info(f"Raw categorical transformation loaded from cache: {cache_path}")
+                    return pd.read_parquet(cached_files[1]), pd.read_parquet(cached_files[2])
+
+            features = self.config.features_data_transformation
+            columns = list(features.numerical_features) + list(features.categorical_features)
+            with profiler.span('load_data', format=self.config.artifact_format, variant='raw_categorical'):
+                train_data = load_dataframe(self.config.train_data_path, self.config.artifact_format, columns=columns)
+                test_data = load_dataframe(self.config.test_data_path, self.config.artifact_format, columns=columns)
+
+            numerical_pipeline, _ = self.initialize_pipeline()
+            processing = RawCategoricalProcessor(numerical_pipeline, list(features.numerical_features),
+                                                 list(features.categorical_features), dtype=self.config.array_dtype)
+            with profiler.span('fit_transform', rows=len(train_data), variant='raw_categorical'):
+                train_features = processing.fit_transform(train_data)
+            with profiler.span('transform', rows=len(test_data), variant='raw_categorical'):
+                test_features = processing.transform(test_data)
 
-        # Data ingestion process
-        data_ingestion_config = config.get_data_ingestion_config()
-        data_ingestion = DataIngestion(data_ingestion_config)
-        data_ingestion.initiate_data_ingestion()
+            save_object(file_path=processor_path, object=processing, compress=self.config.artifact_store.compress)
+            if cache_path is not None:
+                def write_files(directory: Path):
+                    shutil.copyfile(processor_path, directory / PROCESSOR_FILE)
+                    train_features.to_parquet(directory / RAW_TRAIN_FILE, index=False)
+                    test_features.to_parquet(directory / RAW_TEST_FILE, index=False)
 
-        # Data transformation process
-        data_transformation_config = config.get_data_transformation_config()
-        data_transformation = DataTransformation(data_transformation_config)
-        train_arr, test_arr = data_transformation.data_transformation()
+                self._commit_cache_entry(cache_path, write_files)
+            logger.info("Raw categorical transformation completed successfully.")
 
-        logger.info("Pipeline completed successfully.")
+            return train_features, test_features
+
+        except Exception as e:
+            logger.error(f"Failed to perform the raw categorical transformation: {str(e)}")
+            raise CustomException(e, sys)
+
+
+if __name__ == '__main__':
+    from StudentsPerformance.pipeline.training_pipeline import main
 
-    except Exception as e:
-        logger.error(f"Error in the main pipeline: {str(e)}")
-        raise CustomException(e, sys)
+    # Ingestion -> transformation, skipping the stages that are up to date
+    main(until='data_transformation')
@@ -0,0 +1,141 @@
+import time
+import numpy as np
+from scipy import sparse
+from scipy.optimize import nnls
+from concurrent.futures import ThreadPoolExecutor
+from sklearn.base import BaseEstimator, RegressorMixin, clone
+from sklearn.linear_model import LinearRegression
+from StudentsPerformance.utils import accepts_sparse
+
+
+ENSEMBLE_METHODS = ('blend', 'stack')
+
+
+def predict_latency_ms(model, X, repeat: int = 3) -> float:
+    """:return: Best latency of model.predict(X) in milliseconds over repeat calls."""
+    if sparse.issparse(X) and not accepts_sparse(model):
+        X = X.toarray()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.predict(X)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def blend_weights(predictions: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Non-negative weights summing to 1 that minimise the squared error of the weighted average of the
+    member predictions (least squares under the constraints, solved with NNLS).
+
+    :param predictions: (rows x members) or, for several targets, (rows x targets x members) predictions;
+        the weights are shared by the targets.
+    """
+    n_members = predictions.shape[-1]
+    weights, _ = nnls(predictions.reshape(-1, n_members), np.ravel(y))
+    if weights.sum() == 0:
+        return np.full(n_members, 1 / n_members)
+    return weights / weights.sum()
+
+
+class EnsembleRegressor(BaseEstimator, RegressorMixin):
+    """
+    Combines already fitted models trained on the same features.
+
+    blend: weighted average of the member predictions, the weights fitted on out-of-fold predictions.
+    stack: a meta-model (LinearRegression(positive=True) by default) fitted on the out-of-fold predictions,
+        one per target when there are several.
+
+    predict() evaluates every member on the same input batch into one (rows x members) matrix, in parallel
+    threads with n_threads > 1: the tree ensembles, boosting libraries and BLAS calls of the members release
+    the GIL while they predict.
+    """
+
+    def __init__(self, members, method='blend', meta_model=None, n_threads=0):
+        """
+        :param members: List of (name, fitted model).
+        :param method: 'blend' or 'stack'.
+        :param meta_model: Regressor of the stack method (None: LinearRegression(positive=True)).
+        :param n_threads: Threads predicting the members (0 or 1: one after the other).
+        """
+        self.members = members
+        self.method = method
+        self.meta_model = meta_model
+        self.n_threads = n_threads
+
+    def fit(self, out_of_fold: np.ndarray, y: np.ndarray):
+        """
+        Fits the combination of the members, not the members themselves.
+
+        :param out_of_fold: Out-of-fold predictions, one column per member in the order of members, shaped
+            (rows x targets x members) when y has one column per target.
+        """
+        if self.method not in ENSEMBLE_METHODS:
+            raise ValueError(f"Unknown ensemble method '{self.method}', expected one of {ENSEMBLE_METHODS}")
+        self.n_targets_ = 1 if np.ndim(y) == 1 else np.shape(y)[1]
+        if self.method == 'blend':
+            self.weights_ = blend_weights(out_of_fold, y)
+        else:
+            meta_model = self.meta_model if self.meta_model is not None else LinearRegression(positive=True)
+            if np.ndim(y) == 1:
+                self.meta_model_ = meta_model.fit(out_of_fold, y)
+            else:
+                # Each target is stacked on the member predictions of that target
+                self.meta_model_ = [clone(meta_model).fit(out_of_fold[:, j], y[:, j]) for j in range(self.n_targets_)]
+            meta_models = self.meta_model_ if isinstance(self.meta_model_, list) else [self.meta_model_]
+            self.weights_ = np.mean([np.ravel(getattr(model, 'coef_', np.full(len(self.members), np.nan)))
+                                     for model in meta_models], axis=0)
+        return self
+
+    def __sklearn_tags__(self):
+        # Sparse batches are densified per member, only for the members that need it
+        tags = super().__sklearn_tags__()
+        tags.input_tags.sparse = True
+        return tags
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_executor', None)
+        return state
+
+    def _member_input(self, X, model, dense_X):
+        if sparse.issparse(X) and not accepts_sparse(model):
+            if dense_X[0] is None:
+                dense_X[0] = X.toarray()
+            return dense_X[0]
+        return X
+
+    def member_predictions(self, X) -> np.ndarray:
+        """
+        :return: (rows x members) matrix of the member predictions on X, (rows x targets x members) with
+            several targets.
+        """
+        n_targets = getattr(self, 'n_targets_', 1)
+        target_shape = (n_targets,) if n_targets > 1 else ()
+        out = np.empty((X.shape[0],) + target_shape + (len(self.members),), dtype=np.float64)
+        # A sparse batch is densified at most once, for all the members that need dense input
+        dense_X = [None]
+        inputs = [self._member_input(X, model, dense_X) for _, model in self.members]
+
+        def predict_member(i):
+            out[..., i] = self.members[i][1].predict(inputs[i])
+
+        if self.n_threads and self.n_threads > 1 and len(self.members) > 1:
+            if getattr(self, '_executor', None) is None:
+                self._executor = ThreadPoolExecutor(max_workers=min(self.n_threads, len(self.members)),
+                                                    thread_name_prefix='ensemble')
+            list(self._executor.map(predict_member, range(len(self.members))))
+        else:
+            for i in range(len(self.members)):
+                predict_member(i)
+        return out
+
+    def combine(self, member_predictions: np.ndarray) -> np.ndarray:
+        if self.method == 'blend':
+            return member_predictions @ self.weights_
+        if isinstance(self.meta_model_, list):
+            return np.column_stack([model.predict(member_predictions[:, j]) for j, model in enumerate(self.meta_model_)])
+        return self.meta_model_.predict(member_predictions)
+
+    def predict(self, X) -> np.ndarray:
+        return self.combine(self.member_predictions(X))
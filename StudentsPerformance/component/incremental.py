@@ -0,0 +1,448 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+from StudentsPerformance.utils import accepts_sparse
+from StudentsPerformance.component.categorical import RawCategoricalProcessor
+
+
+# How a fitted model is brought up to date with a new batch:
+#   partial_fit            - estimators with partial_fit (SGDRegressor, MLPRegressor, ...)
+#   xgboost_continuation   - extra boosting rounds on top of the booster
+#   catboost_continuation  - extra iterations from the model as init_model
+#   warm_start             - extra stages/trees of the scikit-learn ensembles (GradientBoosting, RandomForest, ...)
+#   per_target             - MultiOutputRegressor: each target's model is continued
+#   members                - EnsembleRegressor: each member is updated, the weights are kept
+#   refit                  - anything else: refitted with its (searched) hyperparameters on all the data
+UPDATE_MODES = ('partial_fit', 'xgboost_continuation', 'catboost_continuation', 'warm_start', 'per_target',
+                'members', 'refit')
+
+
+def _steps(transformer):
+    return [step for _, step in transformer.steps] if isinstance(transformer, Pipeline) else [transformer]
+
+
+def _dense(X):
+    return X.toarray() if sparse.issparse(X) else np.asarray(X, dtype=np.float64)
+
+
+def model_input(model, X):
+    """Densifies a sparse batch for the models that were fitted on dense arrays."""
+    if sparse.issparse(X) and not accepts_sparse(model):
+        return X.toarray()
+    return X
+
+
+def _new_categories(transformer, X, columns) -> dict:
+    """Unseen values of each column of the OneHotEncoder of a (pipeline) transformer."""
+    found = {}
+    for step in _steps(transformer):
+        if type(step).__name__ == 'OneHotEncoder':
+            values = np.asarray(X, dtype=object)
+            for i, categories in enumerate(step.categories_):
+                unseen = set(values[:, i]) - set(categories)
+                if unseen:
+                    found[str(columns[i])] = sorted(map(str, unseen))
+            return found
+        X = step.transform(X)
+    return found
+
+
+def new_categories(processor, features: pd.DataFrame) -> dict:
+    """
+    Categories of the batch the processor has never seen: the encoded width (and the models fitted on
+    it) cannot grow incrementally, so they call for a full search.
+
+    :param processor: Fitted ColumnTransformer or RawCategoricalProcessor.
+    :return: Dict column -> sorted unseen values (empty when there are none).
+    """
+    found = {}
+    if isinstance(processor, RawCategoricalProcessor):
+        # Unseen values would be mapped to the missing level
+        for column in processor.categorical_features:
+            unseen = set(processor._as_text(features[column])) - set(processor.categories_[column])
+            if unseen:
+                found[column] = sorted(unseen)
+        return found
+    for _, transformer, columns in processor.transformers_:
+        if not isinstance(transformer, str) and len(columns):
+            found.update(_new_categories(transformer, features[columns], list(columns)))
+    return found
+
+
+def _unseen(step, X) -> list:
+    """:return: Sorted values of each input column of a fitted OneHotEncoder missing from its categories."""
+    values = np.asarray(X, dtype=object)
+    return [sorted({value for value in values[:, i] if value == value} - set(categories), key=str)
+            for i, categories in enumerate(step.categories_)]
+
+
+def _extend_step(step, kept, width: int) -> bool:
+    """
+    Widens the fitted statistics of a scaler following a OneHotEncoder to its new width. The new one-hot
+    columns were zero on every row seen so far, which is the statistics they get (zero mean and variance,
+    unit scale), so the next partial_fit updates them exactly.
+
+    :param kept: Positions of the current columns among the width new ones.
+    :return: False when the step cannot be widened.
+    """
+    def widened(values, fill):
+        if values is None or np.ndim(values) == 0:
+            return values
+        array = np.full(width, fill, dtype=np.asarray(values).dtype)
+        array[kept] = values
+        return array
+
+    name = type(step).__name__
+    if name == 'StandardScaler':
+        step.mean_, step.var_ = widened(step.mean_, 0.0), widened(step.var_, 0.0)
+        step.scale_ = widened(step.scale_, 1.0)
+        step.n_samples_seen_ = widened(step.n_samples_seen_, np.max(step.n_samples_seen_))
+    elif name == 'MaxAbsScaler':
+        step.max_abs_, step.scale_ = widened(step.max_abs_, 0.0), widened(step.scale_, 1.0)
+    elif name == 'MinMaxScaler':
+        low, high = step.feature_range
+        step.data_min_, step.data_max_ = widened(step.data_min_, 0.0), widened(step.data_max_, 0.0)
+        step.data_range_ = widened(step.data_range_, 0.0)
+        # A zero range counts as 1, as in MinMaxScaler.partial_fit
+        step.scale_, step.min_ = widened(step.scale_, high - low), widened(step.min_, low)
+    else:
+        return False
+    step.n_features_in_ = width
+    return True
+
+
+def _extend_transformer(transformer, X, width: int):
+    """
+    Adds the unseen values of X to the categories of the OneHotEncoder of a (pipeline) transformer.
+
+    :param width: Current output width of the transformer.
+    :return: Tuple (transformer, positions of the current outputs among the new ones, new width), None when
+        the encoder or a step after it cannot be extended.
+    """
+    steps = _steps(transformer)
+    encoder_index = next((i for i, step in enumerate(steps) if type(step).__name__ == 'OneHotEncoder'), None)
+    if encoder_index is None:
+        return transformer, np.arange(width), width
+    for step in steps[:encoder_index]:
+        X = step.transform(X)
+    encoder = steps[encoder_index]
+    unseen = _unseen(encoder, X)
+    if not any(unseen):
+        return transformer, np.arange(width), width
+    if encoder.drop is not None or encoder.min_frequency is not None or encoder.max_categories is not None \
+            or any(categories.dtype != object for categories in encoder.categories_):
+        # Dropped, infrequent and numerical (sorted) categories do not just append columns
+        return None
+
+    # The new categories come after the current ones of their column, with all-zero columns for the rows seen
+    categories = [np.concatenate([current, np.array(new, dtype=object)])
+                  for current, new in zip(encoder.categories_, unseen)]
+    sample = np.array([[column[0] for column in categories]], dtype=object)
+    extended = clone(encoder).set_params(categories=categories).fit(sample)
+    starts = np.cumsum([0] + [len(column) for column in categories])
+    kept = np.concatenate([start + np.arange(len(current)) for start, current in zip(starts, encoder.categories_)])
+    new_width = int(starts[-1])
+    if not all(_extend_step(step, kept, new_width) for step in steps[encoder_index + 1:]):
+        return None
+
+    if not isinstance(transformer, Pipeline):
+        return extended, kept, new_width
+    transformer.steps[encoder_index] = (transformer.steps[encoder_index][0], extended)
+    return transformer, kept, new_width
+
+
+def extend_categories(processor, features: pd.DataFrame):
+    """
+    Adds the categories of the batch the processor has never seen to its one-hot encoders, as new columns
+    after the current ones of their feature; the steps following an encoder (scalers) are widened to match.
+
+    :param processor: Fitted ColumnTransformer (a copy, it is modified).
+    :param features: Feature columns of the batch.
+    :return: Tuple (positions of the current output columns among the new ones, new output width), None when
+        the processor cannot be extended (RawCategoricalProcessor, dropped or infrequent categories, other
+        steps after an encoder).
+    """
+    if isinstance(processor, RawCategoricalProcessor):
+        return None
+    kept, output_indices, start = [], {}, 0
+    for i, (name, transformer, columns) in enumerate(processor.transformers_):
+        current = processor.output_indices_[name]
+        width = current.stop - current.start
+        if width == 0:
+            output_indices[name] = slice(0, 0)
+            continue
+        if not isinstance(transformer, str) and len(columns):
+            extended = _extend_transformer(transformer, features[columns], width)
+            if extended is None:
+                return None
+            transformer, block, width = extended
+            processor.transformers_[i] = (name, transformer, columns)
+        else:
+            block = np.arange(width)
+        kept.append(start + block)
+        output_indices[name] = slice(start, start + width)
+        start += width
+    processor.output_indices_ = output_indices
+    return np.concatenate(kept), start
+
+
+def _affine(step):
+    """:return: Tuple (scale, offset) of a fitted scaler (output = scale * input + offset), None for other steps."""
+    name = type(step).__name__
+    if name == 'StandardScaler':
+        scale = 1.0 / step.scale_ if step.scale_ is not None else 1.0
+        return scale, -step.mean_ * scale if step.with_mean else 0.0
+    if name == 'MaxAbsScaler':
+        return 1.0 / step.scale_, 0.0
+    if name == 'MinMaxScaler':
+        return step.scale_, step.min_
+    return None
+
+
+def _transformer_input_map(transformer, updated):
+    steps, updated_steps = _steps(transformer), _steps(updated)
+    # The trailing scalers define the output as an affine function of what the steps before them produce;
+    # those steps must be unchanged, up to the imputer fill values (only missing entries differ)
+    n_prefix = len(steps)
+    while n_prefix and _affine(steps[n_prefix - 1]) is not None:
+        n_prefix -= 1
+    for step, updated_step in zip(steps[:n_prefix], updated_steps[:n_prefix]):
+        affine, updated_affine = _affine(step), _affine(updated_step)
+        if affine is not None and not all(np.allclose(a, b) for a, b in zip(affine, updated_affine)):
+            return None
+
+    def compose(tail):
+        scale, offset = 1.0, 0.0
+        for step in tail:
+            step_scale, step_offset = _affine(step)
+            scale, offset = step_scale * scale, step_scale * offset + step_offset
+        return scale, offset
+
+    scale, offset = compose(steps[n_prefix:])
+    updated_scale, updated_offset = compose(updated_steps[n_prefix:])
+    ratio = scale / updated_scale
+    return ratio, offset - ratio * updated_offset
+
+
+def input_map(processor, updated_processor):
+    """
+    Expresses the outputs of a processor in terms of those of its updated copy: the scalers are affine, so
+    current = scale * updated + offset column by column (exact but for the rows the updated imputers fill).
+
+    :return: Tuple (scale, offset) of arrays as wide as the output, None when the update is not affine.
+    """
+    if isinstance(processor, RawCategoricalProcessor):
+        return None
+    width = max(indices.stop for indices in processor.output_indices_.values())
+    scale, offset = np.ones(width), np.zeros(width)
+    for (name, transformer, columns), (_, updated, _) in zip(processor.transformers_,
+                                                              updated_processor.transformers_):
+        if isinstance(transformer, str) or not len(columns):
+            continue
+        block = _transformer_input_map(transformer, updated)
+        if block is None:
+            return None
+        indices = processor.output_indices_[name]
+        scale[indices], offset[indices] = block
+    return scale, offset
+
+
+def _linear(model) -> bool:
+    return type(model).__module__.startswith('sklearn.linear_model') and hasattr(model, 'coef_') \
+        and hasattr(model, 'intercept_')
+
+
+# Models combining other fitted models, which read the inputs themselves
+WRAPPERS = ('EnsembleRegressor', 'MultiOutputRegressor')
+
+
+def _nested(model) -> list:
+    """:return: model and, for an ensemble or a MultiOutputRegressor, the models inside it (recursively)."""
+    name = type(model).__name__
+    inner = ([member for _, member in model.members] if name == 'EnsembleRegressor'
+             else model.estimators_ if name == 'MultiOutputRegressor' else [])
+    return [model] + [nested for member in inner for nested in _nested(member)]
+
+
+def _input_models(model) -> list:
+    """:return: The models reading the inputs: model itself, or the members/per-target models of a wrapper."""
+    return [nested for nested in _nested(model) if type(nested).__name__ not in WRAPPERS]
+
+
+def _coefficients(model) -> list:
+    """Names of the coefficient arrays of a linear model: coef_, and SGD's averaged/standard copies."""
+    return [name for name, value in vars(model).items()
+            if 'coef' in name and isinstance(value, np.ndarray) and value.shape[-1] == model.n_features_in_]
+
+
+def pad_inputs(model, kept, width: int) -> bool:
+    """
+    Makes a fitted model take the output of an extended processor (see extend_categories): the linear models
+    get a zero coefficient for each new column, so they predict as before until they are updated.
+
+    :param model: Fitted model (a copy, it is modified).
+    :param kept: Positions of the current input columns among the new ones.
+    :param width: New number of input columns.
+    :return: False, leaving the model as it was, when a model reading the inputs is not linear.
+    """
+    models = _input_models(model)
+    if not all(_linear(leaf) for leaf in models):
+        return False
+    for leaf in models:
+        for name in _coefficients(leaf):
+            coef = getattr(leaf, name)
+            padded = np.zeros(coef.shape[:-1] + (width,), dtype=coef.dtype)
+            padded[..., kept] = coef
+            setattr(leaf, name, padded)
+        leaf.n_features_in_ = width
+    for wrapper in _nested(model):
+        if type(wrapper).__name__ == 'MultiOutputRegressor':
+            wrapper.n_features_in_ = width
+    return True
+
+
+def rescale_inputs(model, scale, offset) -> bool:
+    """
+    Re-expresses a fitted model on updated inputs, given current = scale * updated + offset (see input_map):
+    a linear model's coefficients are multiplied by scale and its intercept absorbs coef . offset, so it
+    predicts the same. Models that are refitted on the update need nothing.
+
+    :param model: Fitted model (a copy, it is modified).
+    :return: False, leaving the model as it was, when a continued model reading the inputs is not linear.
+    """
+    models = _input_models(model)
+    if not all(_linear(leaf) or update_mode(leaf) == 'refit' for leaf in models):
+        return False
+    for leaf in models:
+        if not _linear(leaf):
+            continue
+        for name in _coefficients(leaf):
+            coef = getattr(leaf, name)
+            intercept_name = name.replace('coef', 'intercept')
+            if hasattr(leaf, intercept_name):
+                setattr(leaf, intercept_name, getattr(leaf, intercept_name) + coef @ offset)
+            setattr(leaf, name, coef * scale)
+    return True
+
+
+def _update_step(step, X, n_seen: int) -> float:
+    """
+    Updates the fitted statistics of one preprocessing step with the rows of X.
+
+    :return: Largest shift of a feature mean, in standard deviations before the update (0.0 when the step
+        has no such statistics).
+    """
+    name = type(step).__name__
+    if name == 'SimpleImputer' and step.strategy in ('mean', 'median'):
+        values = _dense(X)
+        known = ~np.isnan(values).all(axis=0)
+        batch = np.full(values.shape[1], np.nan)
+        batch[known] = (np.nanmean if step.strategy == 'mean' else np.nanmedian)(values[:, known], axis=0)
+        # Running mean, exact for 'mean'; the weighted average of the medians approximates the median
+        statistics = np.array(step.statistics_, dtype=np.float64)
+        statistics[known] = (n_seen * statistics[known] + len(values) * batch[known]) / (n_seen + len(values))
+        step.statistics_ = statistics
+        return 0.0
+    if name == 'StandardScaler' and step.with_std:
+        mean, scale = np.array(step.mean_), np.array(step.scale_)
+        step.partial_fit(X)
+        return float(np.max(np.abs(step.mean_ - mean) / np.where(scale == 0, 1.0, scale), initial=0.0))
+    if name in ('MinMaxScaler', 'MaxAbsScaler'):
+        step.partial_fit(X)
+    return 0.0
+
+
+def _update_transformer(transformer, X, n_seen: int) -> float:
+    shift = 0.0
+    for step in _steps(transformer):
+        shift = max(shift, _update_step(step, X, n_seen))
+        X = step.transform(X)
+    return shift
+
+
+def update_processor(processor, features: pd.DataFrame, n_seen: int) -> dict:
+    """
+    Updates the fitted preprocessing statistics in place with a new batch: running imputer means and
+    medians, and the StandardScaler/MinMaxScaler/MaxAbsScaler moments (partial_fit). The one-hot categories
+    are left as fitted, see new_categories.
+
+    :param processor: Fitted ColumnTransformer or RawCategoricalProcessor (a copy, it is modified).
+    :param features: Feature columns of the batch.
+    :param n_seen: Rows the statistics were fitted on, the weight of the current statistics.
+    :return: Report with the largest feature mean shift ('feature_shift', in standard deviations).
+    """
+    if isinstance(processor, RawCategoricalProcessor):
+        shift = _update_transformer(processor.numerical_pipeline_, features[list(processor.numerical_features)],
+                                    n_seen)
+    else:
+        shift = max((_update_transformer(transformer, features[columns], n_seen)
+                     for _, transformer, columns in processor.transformers_
+                     if not isinstance(transformer, str) and len(columns)), default=0.0)
+    return {'feature_shift': shift}
+
+
+def update_mode(model) -> str:
+    """:return: How model is updated with a new batch, one of UPDATE_MODES."""
+    name, module = type(model).__name__, type(model).__module__
+    if name == 'EnsembleRegressor':
+        return 'members'
+    if name == 'MultiOutputRegressor':
+        if hasattr(model, 'partial_fit'):
+            return 'partial_fit'
+        return 'per_target' if update_mode(model.estimator) != 'refit' else 'refit'
+    if hasattr(model, 'partial_fit'):
+        return 'partial_fit'
+    if module.startswith('xgboost'):
+        return 'xgboost_continuation'
+    if module.startswith('catboost'):
+        return 'catboost_continuation'
+    if 'warm_start' in model.get_params() and 'n_estimators' in model.get_params():
+        return 'warm_start'
+    return 'refit'
+
+
+def update_model(model, X, y, extra_estimators: int, refit_data):
+    """
+    Updates a fitted model with a new batch, in place where the model allows it.
+
+    :param model: Fitted model (a copy, it is modified).
+    :param X: Transformed features of the batch.
+    :param y: Target(s) of the batch.
+    :param extra_estimators: Boosting rounds or trees added by the continued and warm-started models.
+    :param refit_data: Callable returning (X, y) of all the training data plus the batch, called only when
+        a model has to be refitted.
+    :return: Tuple (updated model, update mode).
+    """
+    mode = update_mode(model)
+    if mode == 'members':
+        model.members = [(name, update_model(member, X, y, extra_estimators, refit_data)[0])
+                         for name, member in model.members]
+    elif mode == 'per_target':
+        model.estimators_ = [update_model(estimator, X, np.asarray(y)[:, j], extra_estimators, None)[0]
+                             for j, estimator in enumerate(model.estimators_)]
+    elif mode == 'partial_fit':
+        model.partial_fit(model_input(model, X), y)
+    elif mode == 'xgboost_continuation':
+        booster = model.get_booster()
+        if getattr(model, 'best_iteration', None) is not None:
+            # Continue from the trees predict() uses, and let it use the new ones too
+            booster = booster[:model.best_iteration + 1]
+            booster.set_attr(best_iteration=None, best_score=None)
+        n_rounds = booster.num_boosted_rounds()
+        model.set_params(n_estimators=extra_estimators, early_stopping_rounds=None)
+        model.fit(X, y, xgb_model=booster, verbose=False)
+        model.set_params(n_estimators=n_rounds + extra_estimators)
+    elif mode == 'catboost_continuation':
+        params = {**model.get_params(), 'iterations': extra_estimators}
+        params.pop('early_stopping_rounds', None)
+        model = type(model)(**params).fit(X, y, init_model=model)
+    elif mode == 'warm_start':
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + extra_estimators)
+        model.fit(model_input(model, X), y)
+        model.set_params(warm_start=False)
+    else:
+        X_all, y_all = refit_data()
+        model = clone(model).fit(model_input(model, X_all), y_all)
+    return model, mode
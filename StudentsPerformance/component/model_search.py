@@ -0,0 +1,716 @@
+import os
+import sys
+import time
+import inspect
+import shutil
+import tempfile
+import numpy as np
+from scipy import sparse
+from pathlib import Path
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from sklearn.base import clone
+from sklearn.metrics import r2_score
+from sklearn.model_selection import KFold, ParameterGrid, ParameterSampler
+from StudentsPerformance.logger import logger
+from StudentsPerformance.utils import accepts_sparse
+from StudentsPerformance.profiler import profiler, measure
+from StudentsPerformance.exception import CustomException
+from StudentsPerformance.entity import SearchStrategyConfig
+from StudentsPerformance.component.trial_store import fingerprint_data, model_class_name, params_key
+
+
+SEARCH_METHODS = ('grid', 'random', 'halving_grid', 'halving_random')
+
+
+# Training data shared by every task of a worker process. It is set once per worker by the pool
+# initializer instead of being pickled again with each of the (candidate x fold) tasks.
+_WORKER_DATA = {}
+
+
+def _load_shared(array):
+    # np.asarray drops the memmap subclass, so fold slices are plain arrays for the estimators
+    if isinstance(array, str):
+        return np.asarray(np.load(array, mmap_mode='r'))
+    if isinstance(array, dict):
+        # CSR matrix shared as its data/indices/indptr arrays
+        parts = tuple(np.asarray(np.load(array[part], mmap_mode='r')) for part in ('data', 'indices', 'indptr'))
+        return sparse.csr_matrix(parts, shape=array['shape'])
+    return array
+
+
+def _init_worker(arrays, n_splits=None):
+    """
+    :param arrays: Dict name -> array, or name -> path of a .npy file (or dict of the .npy files of a CSR
+        matrix) memory-mapped read-only, so all the workers read the same physical pages.
+    :param n_splits: Number of CV folds, recomputed here rather than pickling the fold indices.
+    """
+    for name, array in arrays.items():
+        _WORKER_DATA[name] = _load_shared(array)
+    if n_splits is not None:
+        _WORKER_DATA['folds'] = list(KFold(n_splits=n_splits).split(_WORKER_DATA['X']))
+
+
+def _rows(X, index, dense):
+    """Rows of X, densified for the estimators that do not accept sparse input."""
+    if hasattr(X, 'iloc'):
+        # raw_categorical features are a DataFrame
+        return X if index is None else X.iloc[index]
+    if index is not None:
+        rows = X[index]
+    else:
+        # Some Cython code paths reject the read-only buffers of a memory-mapped CSR matrix
+        rows = X.copy() if sparse.issparse(X) else X
+    return rows.toarray() if dense and sparse.issparse(rows) else rows
+
+
+def supports_early_stopping(estimator) -> bool:
+    """
+    Whether the early-stopping search can fit the estimator (CatBoost, XGBoost, GradientBoosting, staged_predict
+    ensembles).
+    """
+    return (hasattr(estimator, 'get_best_iteration') or 'early_stopping_rounds' in estimator.get_params()
+            or hasattr(estimator, 'staged_predict'))
+
+
+def _early_stopped_fit(model, X_train, y_train, X_val, y_val, rounds):
+    """
+    Fits a boosting model with its resource at the maximum, stopping once the validation score has not
+    improved for rounds iterations.
+
+    :return: Tuple (R2 score on the validation set at the best iteration, number of iterations up to it).
+    """
+    if hasattr(model, 'get_best_iteration'):
+        # CatBoost: predict() uses the trees up to the best iteration (use_best_model)
+        model.fit(X_train, y_train, eval_set=(X_val, y_val), early_stopping_rounds=rounds, use_best_model=True)
+        return r2_score(y_val, model.predict(X_val)), model.get_best_iteration() + 1
+    if 'early_stopping_rounds' in model.get_params():
+        # XGBoost: predict() uses the trees up to best_iteration
+        model.set_params(early_stopping_rounds=rounds)
+        model.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=False)
+        return r2_score(y_val, model.predict(X_val)), model.best_iteration + 1
+
+    if 'monitor' in inspect.signature(model.fit).parameters:
+        # GradientBoosting: the monitor scores the held-out part after each stage, adding the new tree to the
+        # running prediction, and stops the fit rounds stages after the best one, so the rest is never built
+        state = {'y_pred': None, 'best_score': -np.inf, 'best_iteration': 0}
+
+        def monitor(stage, fitted, _):
+            if state['y_pred'] is None:
+                # Regression losses have an identity link: the raw predictions are the predictions
+                state['y_pred'] = (np.zeros(X_val.shape[0]) if isinstance(fitted.init_, str)
+                                   else fitted.init_.predict(X_val).astype(np.float64))
+            state['y_pred'] += fitted.learning_rate * fitted.estimators_[stage, 0].predict(X_val)
+            score = r2_score(y_val, state['y_pred'])
+            if score > state['best_score']:
+                state['best_score'], state['best_iteration'] = score, stage + 1
+            return stage + 1 - state['best_iteration'] >= rounds
+
+        model.fit(X_train, y_train, monitor=monitor)
+        return state['best_score'], state['best_iteration']
+
+    # Other scikit-learn ensembles are fitted in full, the best iteration is found on their staged predictions
+    model.fit(X_train, y_train)
+    best_score, best_iteration = -np.inf, 0
+    for iteration, y_pred in enumerate(model.staged_predict(X_val), start=1):
+        score = r2_score(y_val, y_pred)
+        if score > best_score:
+            best_score, best_iteration = score, iteration
+        elif iteration - best_iteration >= rounds:
+            break
+    return best_score, best_iteration
+
+
+def _fit_and_score(estimator, params, fold, dense=False, features='X', early_stopping_rounds=None,
+                   return_predictions=False):
+    """
+    Fits one candidate on one CV fold and scores it on the held-out part (runs inside a worker process).
+
+    :param estimator: Unfitted base estimator.
+    :param params: Hyperparameters of the candidate.
+    :param fold: Index of the fold in the worker's fold list.
+    :param dense: Densify sparse features for estimators that need dense input.
+    :param features: Worker array holding the features of the candidate's input mode (X or X_raw).
+    :param early_stopping_rounds: Stop the boosting iterations on the held-out part of the fold (None: plain fit).
+    :param return_predictions: Also return the predictions on the held-out part (out-of-fold predictions).
+    :return: Tuple (R2 score on the validation part of the fold, NaN if the fit failed; fit measurements;
+        best iteration of the early-stopped fit, None without early stopping), followed by the held-out
+        predictions (None if the fit failed) with return_predictions.
+    """
+    X, y = _WORKER_DATA[features], _WORKER_DATA['y']
+    train_idx, val_idx = _WORKER_DATA['folds'][fold]
+    best_iteration, predictions = None, None
+    with measure() as stats:
+        try:
+            model = clone(estimator).set_params(**params)
+            X_val = _rows(X, val_idx, dense)
+            if early_stopping_rounds is not None:
+                score, best_iteration = _early_stopped_fit(model, _rows(X, train_idx, dense), y[train_idx],
+                                                           X_val, y[val_idx], early_stopping_rounds)
+                if return_predictions:
+                    predictions = model.predict(X_val)
+            else:
+                model.fit(_rows(X, train_idx, dense), y[train_idx])
+                predictions = model.predict(X_val)
+                score = r2_score(y[val_idx], predictions)
+        except Exception as e:
+            # Same behaviour as GridSearchCV(error_score=np.nan): a failing candidate must not stop the search
+            logger.warning(f"Fit failed for {type(estimator).__name__} with {params}: {e}")
+            score, predictions = np.nan, None
+    if return_predictions:
+        return score, stats, best_iteration, predictions
+    return score, stats, best_iteration
+
+
+def _warm_start_fit_and_score(estimator, params, fold, resource, checkpoints, dense=False, features='X',
+                              return_predictions=False):
+    """
+    Fits the candidates that differ only in their resource on one CV fold with a single warm-started model,
+    growing it through the increasing checkpoints and scoring it at each of them (runs inside a worker process).
+
+    :param params: Hyperparameters shared by the candidates.
+    :param resource: Hyperparameter grown between the checkpoints (e.g. n_estimators).
+    :param checkpoints: Increasing resource values of the candidates.
+    :param return_predictions: Also return the held-out predictions at each checkpoint.
+    :return: Tuple (R2 scores at each checkpoint, NaN from a failed fit on; fit measurements; None), followed
+        by the held-out predictions at each checkpoint (None from a failed fit on) with return_predictions.
+    """
+    X, y = _WORKER_DATA[features], _WORKER_DATA['y']
+    train_idx, val_idx = _WORKER_DATA['folds'][fold]
+    scores, predictions = [], []
+    with measure() as stats:
+        try:
+            # Inside the try as in _fit_and_score: invalid params fail the group, not the search
+            X_train, X_val = _rows(X, train_idx, dense), _rows(X, val_idx, dense)
+            model = clone(estimator).set_params(**params, warm_start=True)
+            for value in checkpoints:
+                # With warm_start only the trees/stages beyond the previous checkpoint are built
+                model.set_params(**{resource: value})
+                model.fit(X_train, y[train_idx])
+                predictions.append(model.predict(X_val))
+                scores.append(r2_score(y[val_idx], predictions[-1]))
+        except Exception as e:
+            logger.warning(f"Fit failed for {type(estimator).__name__} with {params}, "
+                           f"{resource}={checkpoints[len(scores)]}: {e}")
+            scores.extend([np.nan] * (len(checkpoints) - len(scores)))
+            predictions.extend([None] * (len(checkpoints) - len(predictions)))
+    if return_predictions:
+        return scores, stats, None, predictions
+    return scores, stats, None
+
+
+def _fit_and_predict(estimator, params, fold, dense=False, features='X'):
+    """Fits a candidate on one CV fold and returns its held-out predictions and fit measurements."""
+    X, y = _WORKER_DATA[features], _WORKER_DATA['y']
+    train_idx, val_idx = _WORKER_DATA['folds'][fold]
+    with measure() as stats:
+        model = clone(estimator).set_params(**params)
+        model.fit(_rows(X, train_idx, dense), y[train_idx])
+        predictions = model.predict(_rows(X, val_idx, dense))
+    return predictions, stats
+
+
+def _refit_and_score(estimator, params, dense=False, features='X'):
+    """Fits the best candidate once on the full training set and scores it on the test set."""
+    with measure() as stats:
+        model = clone(estimator).set_params(**params)
+        model.fit(_rows(_WORKER_DATA[features], None, dense), _WORKER_DATA['y'])
+        score = r2_score(_WORKER_DATA['y_test'], model.predict(_rows(_WORKER_DATA[f'{features}_test'], None, dense)))
+    return score, model, stats
+
+
+class ModelSearch:
+    """
+    Search state of a single model: hands out (candidate, fold, resource) fit tasks and collects their scores.
+
+    Candidates come from the exhaustive grid or from random sampling of it. The halving strategies evaluate
+    the candidates in rounds: each round keeps the best 1/factor of the candidates and multiplies the
+    resource (a hyperparameter such as n_estimators or iterations) by factor, so most of the budget is
+    spent on the promising candidates at full size.
+
+    With early_stopping_rounds, the resource is instead fitted once per fold at its maximum and stopped on
+    the held-out part of the fold, so the resource values are not searched; the best candidate is refitted
+    with the median of its best iterations over the folds.
+
+    The grid and random strategies with a resource group the candidates that differ only in the resource:
+    each group is fitted once per fold with warm_start, scored at every resource value on the way (the
+    random strategy samples n_iter settings of the other hyperparameters, each tried at every value).
+    Warm-started ensembles equal the cold-fitted ones, so the scores do not change, only the work.
+    """
+
+    def __init__(self, model_name, estimator, hyperparams, n_folds, strategy: SearchStrategyConfig = None,
+                 input_mode='encoded'):
+        self.model_name = model_name
+        self.estimator = estimator
+        self.n_folds = n_folds
+        self.strategy = strategy or SearchStrategyConfig()
+        self.input_mode = input_mode
+        # Worker array with the features of the input mode
+        self.features = 'X_raw' if input_mode == 'raw_categorical' else 'X'
+
+        if self.strategy.method not in SEARCH_METHODS:
+            raise ValueError(f"Unknown search strategy '{self.strategy.method}' for {model_name}, "
+                             f"expected one of {SEARCH_METHODS}")
+
+        hyperparams = dict(hyperparams)
+        self.resource = None
+        # warm_start_groups[group_id] = candidate ids in increasing resource order
+        self.warm_start_resource, self.warm_start_groups = None, None
+        self.early_stopping_rounds = self.strategy.early_stopping_rounds
+        min_resources, max_resources = self.strategy.min_resources, self.strategy.max_resources
+        if self.early_stopping_rounds is not None:
+            if self.strategy.method.startswith('halving'):
+                raise ValueError(f"early_stopping_rounds of {model_name} requires the grid or random strategy")
+            if not supports_early_stopping(estimator):
+                raise ValueError(f"{model_name} does not support the early-stopping search")
+        if self.strategy.method.startswith('halving') or self.early_stopping_rounds is not None:
+            self.resource = self.strategy.resource
+            if self.resource is None:
+                raise ValueError(f"Search strategy '{self.strategy.method}' of {model_name} requires a resource")
+            # The resource is driven by the search, so it is removed from the searched grid
+            resource_values = hyperparams.pop(self.resource, None)
+            if resource_values is not None:
+                resource_values = resource_values if isinstance(resource_values, list) else [resource_values]
+                min_resources = min_resources or min(resource_values)
+                max_resources = max_resources or max(resource_values)
+            if max_resources is None:
+                raise ValueError(f"max_resources of {model_name} is neither configured nor in its hyperparams")
+        elif self.strategy.resource is not None:
+            if 'warm_start' not in estimator.get_params():
+                raise ValueError(f"{model_name} has no warm_start, which the resource of the "
+                                 f"'{self.strategy.method}' strategy requires")
+            self.warm_start_resource = self.strategy.resource
+            resource_values = hyperparams.pop(self.warm_start_resource, None)
+            if resource_values is None:
+                raise ValueError(f"{self.warm_start_resource} of {model_name} is not in its hyperparams")
+            resource_values = resource_values if isinstance(resource_values, list) else [resource_values]
+
+        if self.strategy.method in ('random', 'halving_random'):
+            self.candidates = list(ParameterSampler(hyperparams, n_iter=self.strategy.n_iter,
+                                                    random_state=self.strategy.random_state))
+        else:
+            self.candidates = list(ParameterGrid(hyperparams))
+
+        if self.warm_start_resource is not None:
+            checkpoints = sorted(set(resource_values))
+            self.warm_start_groups = [list(range(i * len(checkpoints), (i + 1) * len(checkpoints)))
+                                      for i in range(len(self.candidates))]
+            self.candidates = [{**candidate, self.warm_start_resource: value}
+                               for candidate in self.candidates for value in checkpoints]
+
+        if self.early_stopping_rounds is not None:
+            # A single round at the maximum resource, the fits stop early on their own
+            min_resources = max_resources
+        elif self.resource is not None:
+            n_rounds = int(np.ceil(np.log(len(self.candidates)) / np.log(self.strategy.factor))) + 1
+            if min_resources is None:
+                min_resources = max(1, max_resources // self.strategy.factor ** (n_rounds - 1))
+        self.min_resources, self.max_resources = min_resources, max_resources
+
+        # rounds[i] = (resource, {candidate_id: {fold: score}}); a plain search has a single round
+        self.rounds = []
+        # best_iterations[candidate_id][fold] of the early-stopped fits
+        self.best_iterations = {}
+        # Held-out predictions {(round_index, candidate_id): {fold: predictions}} when the engine returns them
+        self._fold_predictions = {}
+        self._leader = None
+        self._pending = deque()
+        self._outstanding = 0
+        self._start_round(list(range(len(self.candidates))), self.min_resources)
+
+    def _start_round(self, candidate_ids, resource):
+        self.rounds.append((resource, {candidate_id: {} for candidate_id in candidate_ids}))
+        if self.warm_start_groups is not None:
+            # One (group_id, fold, None) task fits all the candidates of a group
+            self._pending.extend((group_id, fold, None) for group_id in range(len(self.warm_start_groups))
+                                 for fold in range(self.n_folds))
+            self._outstanding = len(self.warm_start_groups) * self.n_folds
+            return
+        self._pending.extend((candidate_id, fold, resource) for candidate_id in candidate_ids
+                             for fold in range(self.n_folds))
+        self._outstanding = len(candidate_ids) * self.n_folds
+
+    def params(self, candidate_id, resource):
+        params = dict(self.candidates[candidate_id])
+        if self.resource is not None:
+            params[self.resource] = resource
+        return params
+
+    def task_candidates(self, task):
+        """:return: List of (candidate_id, params) fitted by a task, the whole group for a warm-start task."""
+        candidate_id, fold, resource = task
+        if self.warm_start_groups is not None:
+            return [(group_candidate_id, self.candidates[group_candidate_id])
+                    for group_candidate_id in self.warm_start_groups[candidate_id]]
+        return [(candidate_id, self.params(candidate_id, resource))]
+
+    def group_params(self, group_id):
+        """:return: Tuple (hyperparameters shared by a warm-start group, its increasing resource values)."""
+        candidate_ids = self.warm_start_groups[group_id]
+        params = {name: value for name, value in self.candidates[candidate_ids[0]].items()
+                  if name != self.warm_start_resource}
+        return params, [self.candidates[candidate_id][self.warm_start_resource] for candidate_id in candidate_ids]
+
+    def pop_task(self):
+        """:return: Next (candidate_id, fold, resource) task of the current round, or None."""
+        return self._pending.popleft() if self._pending else None
+
+    @property
+    def n_pending(self):
+        return len(self._pending)
+
+    def tell(self, task, score, best_iteration=None, predictions=None):
+        """
+        :param score: Score of the task's candidate, or list of the scores of a warm-start group.
+        :param predictions: Held-out predictions of the task (list of them for a warm-start group), if any.
+        """
+        candidate_id, fold, resource = task
+        round_index = len(self.rounds) - 1
+        if self.warm_start_groups is not None:
+            group = self.warm_start_groups[candidate_id]
+            predictions = predictions or [None] * len(group)
+            for group_candidate_id, group_score, group_predictions in zip(group, score, predictions):
+                self.rounds[-1][1][group_candidate_id][fold] = group_score
+                self._keep_predictions(round_index, group_candidate_id, fold, group_predictions)
+        else:
+            self.rounds[-1][1][candidate_id][fold] = score
+            self._keep_predictions(round_index, candidate_id, fold, predictions)
+        if best_iteration is not None:
+            self.best_iterations.setdefault(candidate_id, {})[fold] = best_iteration
+        self._outstanding -= 1
+        if self._outstanding == 0 and self.resource is not None:
+            self._next_round()
+
+    def _next_round(self):
+        resource, scores = self.rounds[-1]
+        if len(scores) <= 1 or resource >= self.max_resources or self.early_stopping_rounds is not None:
+            return
+        ranked = sorted(scores, key=lambda candidate_id: self._mean_score(scores[candidate_id]), reverse=True)
+        n_kept = max(1, int(np.ceil(len(ranked) / self.strategy.factor)))
+        next_resource = min(resource * self.strategy.factor, self.max_resources)
+        logger.info(f"{self.model_name}: halving round {len(self.rounds)}, "
+                    f"{n_kept} candidates with {self.resource}={next_resource}")
+        self._start_round(ranked[:n_kept], next_resource)
+
+    def _keep_predictions(self, round_index, candidate_id, fold, predictions):
+        """
+        Keeps held-out predictions until their candidate has all its folds, then only if it leads its round,
+        so at most the candidates in flight and one leader hold predictions.
+        """
+        if predictions is None:
+            return
+        key = (round_index, candidate_id)
+        self._fold_predictions.setdefault(key, {})[fold] = predictions
+        scores = self.rounds[round_index][1]
+        if len(scores[candidate_id]) < self.n_folds:
+            return
+        leader = self._leader
+        if leader is None or leader[0] < round_index or \
+                self._mean_score(scores[candidate_id]) > self._mean_score(scores[leader[1]]):
+            if leader is not None:
+                self._fold_predictions.pop(leader, None)
+            self._leader = key
+        else:
+            self._fold_predictions.pop(key)
+
+    @staticmethod
+    def _mean_score(fold_scores):
+        mean_score = np.mean(list(fold_scores.values())) if fold_scores else np.nan
+        return -np.inf if np.isnan(mean_score) else mean_score
+
+    def best_candidate(self):
+        """
+        Picks the candidate with the highest mean CV score in the last round that has candidates with all
+        folds completed (a round may be cut short by the time budget).
+
+        :return: Tuple (params, mean_score), or (None, nan) if no candidate finished within the budget.
+        """
+        best = self._best()
+        if best is None:
+            return None, np.nan
+        round_index, best_id = best
+        resource, scores = self.rounds[round_index]
+        if self.best_iterations.get(best_id):
+            resource = int(np.median(list(self.best_iterations[best_id].values())))
+        return self.params(best_id, resource), np.mean(list(scores[best_id].values()))
+
+    def _best(self):
+        """:return: Tuple (round_index, candidate_id) of the best candidate, None if none finished."""
+        for round_index in reversed(range(len(self.rounds))):
+            complete = {candidate_id: fold_scores for candidate_id, fold_scores in self.rounds[round_index][1].items()
+                        if len(fold_scores) == self.n_folds}
+            if not complete:
+                continue
+            # If every candidate failed on some fold, this falls back to the first one like GridSearchCV does
+            return round_index, max(complete, key=lambda candidate_id: self._mean_score(complete[candidate_id]))
+        return None
+
+    def fold_predictions(self):
+        """
+        :return: Dict fold -> held-out predictions of the best candidate, None if the search did not keep them
+            (predictions not requested, trials answered from the trial store, failed folds).
+        """
+        best = self._best()
+        predictions = self._fold_predictions.get(best) if best is not None else None
+        return predictions if predictions is not None and len(predictions) == self.n_folds else None
+
+
+class ParallelSearchEngine:
+    """
+    Runs the cross-validated search of all models on a single process pool.
+
+    Every (model, candidate, fold) fit is an independent task, so a slow model does not leave the other
+    cores idle. Tasks of the different models are interleaved, so when the wall-clock budget runs out every
+    model has had a fair share of it.
+
+    With a trial store, the tasks whose trials are already stored for the same training data are answered
+    from it without being fitted, and every fitted trial is stored as soon as it finishes.
+
+    With keep_predictions, the fits also return their held-out predictions, from which out_of_fold()
+    assembles the out-of-fold predictions of the best candidates without fitting them again.
+    """
+
+    def __init__(self, n_jobs=-1, time_budget=None, cv=3, share_arrays=True, shared_dir=None, trial_store=None,
+                 keep_predictions=False):
+        self.n_jobs = os.cpu_count() if n_jobs in (None, -1) else max(1, n_jobs)
+        self.time_budget = time_budget
+        self.cv = cv
+        self.share_arrays = share_arrays
+        self.shared_dir = shared_dir
+        self.trial_store = trial_store
+        self.keep_predictions = keep_predictions
+        # Fingerprint of the training data of each input mode ('X', 'X_raw'), set by search()
+        self.fingerprints = {}
+
+    def _trial_keys(self, search, task):
+        """Keys of the trials of a task in the trial store, one per candidate it fits."""
+        candidate_id, fold, resource = task
+        return [dict(model_class=model_class_name(search.estimator), params=params_key(search.estimator, params),
+                     fold=fold, n_folds=self.cv, data_fingerprint=self.fingerprints[search.features],
+                     early_stopping_rounds=search.early_stopping_rounds)
+                for _, params in search.task_candidates(task)]
+
+    def _stored_result(self, search, task):
+        """:return: (score, best_iteration) of a task as search.tell() takes them, None unless all are stored."""
+        stored = [self.trial_store.get(**key) for key in self._trial_keys(search, task)]
+        if any(result is None for result in stored):
+            return None
+        if search.warm_start_groups is not None:
+            return [score for score, _ in stored], None
+        return stored[0]
+
+    @contextmanager
+    def _worker_arrays(self, **arrays):
+        """
+        Yields the arrays as the pool initializer receives them. When sharing, each array is written once
+        to a .npy file that every worker memory-maps, so memory stays flat as n_jobs grows (a fit still
+        copies the rows of its fold). Otherwise each worker unpickles its own copy, as do DataFrames.
+        """
+        if not self.share_arrays:
+            yield arrays
+            return
+
+        if self.shared_dir is not None:
+            Path(self.shared_dir).mkdir(parents=True, exist_ok=True)
+        directory = tempfile.mkdtemp(prefix='search_arrays_', dir=self.shared_dir)
+        try:
+            paths = {}
+            for name, array in arrays.items():
+                if array is None:
+                    continue
+                if sparse.issparse(array):
+                    array = array.tocsr()
+                    paths[name] = {'shape': array.shape}
+                    for part in ('data', 'indices', 'indptr'):
+                        paths[name][part] = os.path.join(directory, f'{name}.{part}.npy')
+                        np.save(paths[name][part], getattr(array, part))
+                elif isinstance(array, np.ndarray):
+                    paths[name] = os.path.join(directory, f'{name}.npy')
+                    np.save(paths[name], array)
+                else:
+                    # DataFrames (raw_categorical features) are pickled to the workers
+                    paths[name] = array
+            yield paths
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    @staticmethod
+    def _next_task(searches, turn):
+        """Round-robin over the searches that currently have tasks to hand out."""
+        for offset in range(len(searches)):
+            search = searches[(turn + offset) % len(searches)]
+            task = search.pop_task()
+            if task is not None:
+                return search, task
+        return None
+
+    def search(self, searches, X, y, X_raw=None):
+        """
+        Cross-validates the candidates of every search on the process pool.
+
+        :param searches: List of ModelSearch objects.
+        :param X: Training features.
+        :param y: Training target.
+        :param X_raw: Training features of the raw_categorical input mode (same rows as X).
+        :return: Dict model_name -> (best_params, best_cv_score).
+        """
+        deadline = None if self.time_budget is None else time.monotonic() + self.time_budget
+        in_flight = {}
+        turn = 0
+        budget_exhausted = False
+        n_stored = 0
+        if self.trial_store is not None:
+            self.fingerprints = {'X': fingerprint_data(X, y)}
+            if X_raw is not None:
+                self.fingerprints['X_raw'] = fingerprint_data(X_raw, y)
+
+        with self._worker_arrays(X=X, y=y, X_raw=X_raw) as arrays, \
+                ProcessPoolExecutor(max_workers=self.n_jobs, initializer=_init_worker,
+                                    initargs=(arrays, self.cv)) as executor:
+            while True:
+                # Keep the pool saturated but bounded, so the budget can stop submission at any time
+                while len(in_flight) < 2 * self.n_jobs and not budget_exhausted:
+                    if deadline is not None and time.monotonic() > deadline:
+                        budget_exhausted = True
+                        break
+                    next_task = self._next_task(searches, turn)
+                    if next_task is None:
+                        break
+                    turn += 1
+                    search, task = next_task
+                    if self.trial_store is not None:
+                        stored = self._stored_result(search, task)
+                        if stored is not None:
+                            search.tell(task, *stored)
+                            n_stored += 1
+                            continue
+                    candidate_id, fold, resource = task
+                    dense = sparse.issparse(X) and not accepts_sparse(search.estimator)
+                    if search.warm_start_groups is not None:
+                        params, checkpoints = search.group_params(candidate_id)
+                        future = executor.submit(_warm_start_fit_and_score, search.estimator, params, fold,
+                                                 search.warm_start_resource, checkpoints, dense=dense,
+                                                 features=search.features, return_predictions=self.keep_predictions)
+                    else:
+                        future = executor.submit(_fit_and_score, search.estimator,
+                                                 search.params(candidate_id, resource), fold, dense=dense,
+                                                 features=search.features,
+                                                 early_stopping_rounds=search.early_stopping_rounds,
+                                                 return_predictions=self.keep_predictions)
+                    in_flight[future] = (search, task)
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    search, task = in_flight.pop(future)
+                    candidate_id, fold, resource = task
+                    try:
+                        score, stats, best_iteration, *predictions = future.result()
+                    except Exception as e:
+                        # The task itself failed (e.g. its result could not be sent back): NaN like a failed
+                        # fit, and nothing to store or profile
+                        logger.warning(f"Fit task {task} of {search.model_name} failed: {e}")
+                        search.tell(task, [np.nan] * len(search.group_params(candidate_id)[1])
+                                    if search.warm_start_groups is not None else np.nan)
+                        continue
+                    search.tell(task, score, best_iteration, *predictions)
+                    if self.trial_store is not None:
+                        scores = score if search.warm_start_groups is not None else [score]
+                        self.trial_store.put(dict(key, score=trial_score, best_iteration=best_iteration,
+                                                  wall_s=stats['wall_s'] / len(scores))
+                                             for key, trial_score in zip(self._trial_keys(search, task), scores))
+                    if search.warm_start_groups is not None:
+                        profiler.record('cv_fit', stats, model=search.model_name, warm_start_group=candidate_id,
+                                        fold=fold, resource=search.group_params(candidate_id)[1],
+                                        score=[None if np.isnan(value) else value for value in score])
+                    else:
+                        profiler.record('cv_fit', stats, model=search.model_name, candidate=candidate_id, fold=fold,
+                                        resource=resource, score=None if np.isnan(score) else score,
+                                        best_iteration=best_iteration)
+
+        if n_stored:
+            logger.info(f"{n_stored} fit tasks answered from the trial store")
+        if budget_exhausted:
+            n_skipped = sum(search.n_pending for search in searches)
+            logger.warning(f"Time budget of {self.time_budget}s exhausted, {n_skipped} fit tasks were skipped")
+
+        return {search.model_name: search.best_candidate() for search in searches}
+
+    def out_of_fold(self, searches, best_candidates, X, y, X_raw=None):
+        """
+        Out-of-fold predictions of the best candidate of each search, on the folds of the search. They are
+        assembled from the held-out predictions kept during the search; the candidates without them are
+        fitted again on each fold, all in parallel.
+
+        :return: Dict model_name -> predictions for every training row.
+        """
+        fold_predictions, missing = {}, []
+        for search in searches:
+            if best_candidates[search.model_name][0] is None:
+                continue
+            kept = search.fold_predictions()
+            if kept is None:
+                missing.append(search)
+            else:
+                fold_predictions[search.model_name] = kept
+
+        if missing:
+            logger.info(f"Fitting {[search.model_name for search in missing]} on the CV folds for their "
+                        f"out-of-fold predictions")
+            with self._worker_arrays(X=X, y=y, X_raw=X_raw) as arrays, \
+                    ProcessPoolExecutor(max_workers=max(1, min(self.n_jobs, len(missing) * self.cv)),
+                                        initializer=_init_worker, initargs=(arrays, self.cv)) as executor:
+                futures = {}
+                for search in missing:
+                    dense = sparse.issparse(X) and not accepts_sparse(search.estimator)
+                    for fold in range(self.cv):
+                        futures[search.model_name, fold] = executor.submit(
+                            _fit_and_predict, search.estimator, best_candidates[search.model_name][0], fold,
+                            dense, search.features)
+                for (model_name, fold), future in futures.items():
+                    try:
+                        predictions, stats = future.result()
+                    except Exception as e:
+                        raise CustomException(e, sys)
+                    profiler.record('oof_fit', stats, model=model_name, fold=fold)
+                    fold_predictions.setdefault(model_name, {})[fold] = predictions
+
+        folds = list(KFold(n_splits=self.cv).split(X))
+        out_of_fold = {}
+        for model_name, predictions in fold_predictions.items():
+            out_of_fold[model_name] = np.empty(np.shape(y), dtype=np.float64)
+            for fold, (_, val_idx) in enumerate(folds):
+                out_of_fold[model_name][val_idx] = predictions[fold]
+        return out_of_fold
+
+    def refit(self, searches, best_candidates, X_train, y_train, X_test, y_test, X_raw_train=None, X_raw_test=None):
+        """
+        Fits the best candidate of each model on the full training set, all models in parallel.
+
+        :return: Dict model_name -> (test_score, fitted_model).
+        """
+        report_score = {}
+        with self._worker_arrays(X=X_train, y=y_train, X_test=X_test, y_test=y_test, X_raw=X_raw_train,
+                                 X_raw_test=X_raw_test) as arrays, \
+                ProcessPoolExecutor(max_workers=max(1, min(self.n_jobs, len(searches))), initializer=_init_worker,
+                                    initargs=(arrays,)) as executor:
+            futures = {}
+            for search in searches:
+                best_params, _ = best_candidates[search.model_name]
+                if best_params is None:
+                    logger.warning(f"No candidate of {search.model_name} finished within the time budget")
+                    continue
+                dense = sparse.issparse(X_train) and not accepts_sparse(search.estimator)
+                futures[search.model_name] = executor.submit(_refit_and_score, search.estimator, best_params, dense,
+                                                             search.features)
+            for model_name, future in futures.items():
+                try:
+                    test_score, model, stats = future.result()
+                except Exception as e:
+                    raise CustomException(e, sys)
+                profiler.record('refit', stats, model=model_name, score=test_score)
+                report_score[model_name] = (test_score, model)
+        return report_score
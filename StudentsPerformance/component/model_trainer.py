@@ -1,27 +1,35 @@
-import time
-
 import sys
+import json
+import numpy as np
+from scipy import sparse
 from pathlib import Path
 from importlib import import_module
+from sklearn.base import clone
 from sklearn.metrics import r2_score
-from sklearn.model_selection import GridSearchCV
-from StudentsPerformance.utils import save_object
+from StudentsPerformance.utils import save_object, split_features_target, accepts_sparse
 from StudentsPerformance.logger import logger
+from StudentsPerformance.profiler import profiler
 from StudentsPerformance.exception import CustomException
 from StudentsPerformance.entity import ModelTrainerConfig
-
-from StudentsPerformance.config import ConfigurationManager
-from StudentsPerformance.component.data_ingestion import DataIngestion
-from StudentsPerformance.component.data_transformation import DataTransformation
+from StudentsPerformance.component.model_search import ModelSearch, ParallelSearchEngine
+from StudentsPerformance.artifact_store import ArtifactRegistry
+from StudentsPerformance.component.trial_store import TrialStore, model_class_name, fingerprint_data
+from StudentsPerformance.component.categorical import INPUT_MODES, native_categorical_params
+from StudentsPerformance.component.ensemble import EnsembleRegressor, predict_latency_ms
+from StudentsPerformance.component.multi_output import multi_output_search
 
 class ModelTraining:
     def __init__(self, config: ModelTrainerConfig):
         self.config = config
+        self.input_modes = {}
+        # Members of the ensemble with their weight, scores and predict latency, set by build_ensemble
+        self.ensemble_report = None
 
     def initialize_model_class(self):
         list_of_models = self.config.list_trained_models
         classes = []
         params = []
+        strategies = []
         for model in list_of_models:
             module_name, class_name = model.model_class.rsplit('.', 1)
             module = import_module(module_name)
@@ -33,98 +41,216 @@ class ModelTraining:
             # print(class_instance, '  ', type(class_instance))
             classes.append({class_name: class_instance})
             params.append({class_name: model.hyperparams})
-        return classes, params
+            strategies.append({class_name: model.search_strategy})
+            if model.input_mode not in INPUT_MODES:
+                raise ValueError(f"Unknown input_mode '{model.input_mode}' for {class_name}, expected one of {INPUT_MODES}")
+            self.input_modes[class_name] = model.input_mode
+        return classes, params, strategies
 
-    def evaluate_model(self, X_train, y_train, X_test, y_test, models, hyperparams):
+    def evaluate_model(self, X_train, y_train, X_test, y_test, models, hyperparams, strategies=None,
+                       X_raw_train=None, X_raw_test=None):
+        """
+        :param X_raw_train: Training features of the raw_categorical input mode (DataFrame), None to train
+            every model on the encoded features.
+        :param X_raw_test: Test features of the raw_categorical input mode.
+        :return: Dict model_name -> (test_score, fitted_model).
+        """
+        trial_store = TrialStore(self.config.trial_store_path) if self.config.trial_store_path else None
         try:
-            report_score = {}
-            trained_models = {}
+            searches = []
             for i in range(len(models)):
                 model_name = list(models[i].keys())[0]
                 model_cls = list(models[i].values())[0]
                 params = list(hyperparams[i].values())[0]
-                print(f'\n\n--------- Train {model_name} -----------')
-                print()
-                gs = GridSearchCV(model_cls, params, cv=3)
-                gs.fit(X_train, y_train)
-                print(f'--- GS for {model_name} Done ---')
-                model_cls.set_params(**gs.best_params_)
-                model_cls.fit(X_train, y_train)
-                y_pred = model_cls.predict(X_test)
-                test_model_score = r2_score(y_test, y_pred)
-                print('-->score: ', test_model_score)
-                # report_score[model_name] = test_model_score
-                # trained_models[model_name] = model_cls
-                report_score[model_name] = (test_model_score, model_cls)
-            return report_score # , trained_models
-        except Exception as e:
-            raise CustomException(e, sys)
+                strategy = list(strategies[i].values())[0] if strategies else None
+                input_mode = self.input_modes.get(model_name, 'encoded')
+                if input_mode == 'raw_categorical':
+                    if X_raw_train is None:
+                        logger.warning(f"No raw categorical features, {model_name} is trained on the encoded features")
+                        input_mode = 'encoded'
+                    else:
+                        categorical_columns = X_raw_train.select_dtypes(include='category').columns
+                        model_cls = clone(model_cls).set_params(**native_categorical_params(model_cls, categorical_columns))
+                self.input_modes[model_name] = input_mode
+                if np.ndim(y_train) > 1:
+                    # Native multi-output fit, or one model per target behind MultiOutputRegressor
+                    model_cls, params, strategy = multi_output_search(model_name, model_cls, params, strategy)
+                searches.append(ModelSearch(model_name, model_cls, params, n_folds=self.config.cv, strategy=strategy,
+                                            input_mode=input_mode))
 
+            # All (model, candidate, fold) fits share one process pool and one wall-clock budget
+            engine = ParallelSearchEngine(n_jobs=self.config.n_jobs, time_budget=self.config.time_budget,
+                                          cv=self.config.cv, share_arrays=self.config.share_arrays,
+                                          shared_dir=self.config.shared_dir, trial_store=trial_store,
+                                          keep_predictions=self.config.ensemble.method is not None)
+            with profiler.span('search', models=[search.model_name for search in searches]):
+                best_candidates = engine.search(searches, X_train, y_train, X_raw=X_raw_train)
+            for model_name, (best_params, best_cv_score) in best_candidates.items():
+                print(f'--- Search for {model_name} Done --- cv score: {best_cv_score}, params: {best_params}')
 
-    def modeling(self, train_array, test_array):
-        X_train = train_array[:, : -1]
-        y_train = train_array[:, -1]
-        X_test = test_array[:, : -1]
-        y_test = test_array[:, -1]
+            # The best candidate of each model is fitted once on the full training set (no second refit)
+            with profiler.span('refit_all'):
+                report_score = engine.refit(searches, best_candidates, X_train, y_train, X_test, y_test,
+                                            X_raw_train=X_raw_train, X_raw_test=X_raw_test)
+            for model_name, (test_model_score, _) in report_score.items():
+                print(f'{model_name} -->score: ', test_model_score)
 
-        instantiated_models, hyperparams = self.initialize_model_class()
-        start_time = time.time()
-        model_report = self.evaluate_model(X_train=X_train, y_train=y_train, X_test=X_test, y_test=y_test, models=instantiated_models, hyperparams=hyperparams)
-        print("--- %s seconds ---" % (time.time() - start_time))
+            if trial_store is not None:
+                trial_store.add_results(
+                    dict(model_name=search.model_name, model_class=model_class_name(search.estimator),
+                         input_mode=search.input_mode,
+                         params=json.dumps(best_candidates[search.model_name][0], sort_keys=True, default=repr),
+                         data_fingerprint=engine.fingerprints[search.features],
+                         cv_score=best_candidates[search.model_name][1],
+                         test_score=report_score[search.model_name][0])
+                    for search in searches if search.model_name in report_score)
 
-        best_model_score, (best_model_name, best_model_cls) = max(model_report.items(), key=lambda item: item[1][0])    # apply max on first element[0] of the second variable(tupele)[1}
+            if self.config.ensemble.method is not None:
+                with profiler.span('ensemble', method=self.config.ensemble.method):
+                    ensemble = self.build_ensemble(engine, searches, best_candidates, report_score,
+                                                   X_train, y_train, X_test, y_test)
+                if ensemble is not None:
+                    report_score['Ensemble'] = ensemble
+                    self.input_modes['Ensemble'] = 'encoded'
+                    print('Ensemble -->score: ', ensemble[0])
+            return report_score
+        except Exception as e:
+            raise CustomException(e, sys)
+        finally:
+            if trial_store is not None:
+                trial_store.close()
 
-        print('---> best_model_score: ', best_model_score)
-        print('---> best_model_name: ', best_model_name)
-        print('---> best_model_cls: ', best_model_cls)
-        save_object(file_path=Path(self.config.model_output_pkl), object=best_model_cls)
+    def build_ensemble(self, engine, searches, best_candidates, report_score, X_train, y_train, X_test, y_test):
+        """
+        Combines the top_k encoded-input models by CV score (they share one transformed batch at inference).
+        The combination is fitted on their out-of-fold predictions; the models it gives a zero weight are
+        dropped, then the others are added in CV score order while their summed predict latency on the test
+        set stays within the latency budget, and the combination is refitted on the members kept.
 
+        :return: Tuple (test_score, EnsembleRegressor), None with fewer than two members.
+        """
+        config = self.config.ensemble
+        ranked = sorted((search for search in searches if search.input_mode == 'encoded'
+                         and search.model_name in report_score and not np.isnan(best_candidates[search.model_name][1])),
+                        key=lambda search: best_candidates[search.model_name][1], reverse=True)[:config.top_k]
+        if len(ranked) < 2:
+            logger.info(f"No ensemble: {len(ranked)} encoded-input model(s) within top_k")
+            return None
 
+        predictions = engine.out_of_fold(ranked, best_candidates, X_train, y_train)
 
-if __name__ == '__main__':
-    try:
-        # Configuration setup
-        config = ConfigurationManager()
+        def fit(members):
+            # (rows x members), or (rows x targets x members) with several targets
+            out_of_fold = np.stack([predictions[search.model_name] for search in members], axis=-1)
+            ensemble = EnsembleRegressor([(search.model_name, report_score[search.model_name][1]) for search in members],
+                                         method=config.method, n_threads=config.n_threads)
+            return out_of_fold, ensemble.fit(out_of_fold, y_train)
 
-        # Data ingestion process
-        data_ingestion_config = config.get_data_ingestion_config()
-        data_ingestion = DataIngestion(data_ingestion_config)
-        data_ingestion.initiate_data_ingestion()
+        # Zero-weight members would only add their predict latency, they do not count toward the budget
+        # (NaN weights, of a meta-model without coef_, are kept)
+        _, ensemble = fit(ranked)
+        members, latencies = [], {}
+        for search, weight in zip(ranked, ensemble.weights_):
+            if weight == 0:
+                logger.info(f"{search.model_name} left out of the ensemble: zero weight")
+                continue
+            latency = predict_latency_ms(report_score[search.model_name][1], X_test)
+            if config.latency_budget_ms is not None and members and \
+                    sum(latencies.values()) + latency > config.latency_budget_ms:
+                logger.info(f"{search.model_name} left out of the ensemble: {latency:.2f} ms would exceed the "
+                            f"latency budget of {config.latency_budget_ms} ms")
+                continue
+            members.append(search)
+            latencies[search.model_name] = latency
 
-        # Data transformation process
-        data_transformation_config = config.get_data_transformation_config()
-        data_transformation = DataTransformation(data_transformation_config)
-        train_arr, test_arr = data_transformation.data_transformation()
+        while True:
+            if len(members) < 2:
+                logger.info(f"No ensemble: {len(members)} member(s) with a non-zero weight within the latency budget")
+                return None
+            out_of_fold, ensemble = fit(members)
+            if not np.any(ensemble.weights_ == 0):
+                break
+            # Leaving members out for the latency budget can zero the weight of others
+            members = [search for search, weight in zip(members, ensemble.weights_) if weight != 0]
+        test_score = r2_score(y_test, ensemble.predict(X_test))
 
-        # Model training process
+        self.ensemble_report = {
+            'method': config.method, 'test_score': test_score,
+            'oof_score': r2_score(y_train, ensemble.combine(out_of_fold)),
+            'latency_ms': sum(latencies.values()),
+            'members': [{'model_name': search.model_name, 'weight': float(weight),
+                         'cv_score': best_candidates[search.model_name][1],
+                         'oof_score': r2_score(y_train, out_of_fold[..., i]),
+                         'test_score': report_score[search.model_name][0],
+                         'latency_ms': latencies[search.model_name]}
+                        for i, (search, weight) in enumerate(zip(members, ensemble.weights_))]}
+        for member in self.ensemble_report['members']:
+            logger.info(f"Ensemble member {member['model_name']}: weight {member['weight']:.3f}, "
+                        f"oof score {member['oof_score']:.4f}, test score {member['test_score']:.4f}, "
+                        f"{member['latency_ms']:.2f} ms")
+        logger.info(f"Ensemble ({config.method}, {len(members)} members): test score {test_score:.4f}, "
+                    f"{self.ensemble_report['latency_ms']:.2f} ms summed member latency")
+        return test_score, ensemble
 
-        model_trainer_config = config.get_model_trainer_config()
-        model_trainer = ModelTraining(model_trainer_config)
-        model_trainer.modeling(train_arr, test_arr)
+    def target_scores(self, model, X_test, y_test) -> dict:
+        """:return: Test score of each target variable."""
+        if sparse.issparse(X_test) and not accepts_sparse(model):
+            X_test = X_test.toarray()
+        scores = r2_score(y_test, model.predict(X_test), multioutput='raw_values')
+        return dict(zip(self.config.target_variables, scores.tolist()))
 
-        # Model evaluation process
-        #...
+    def modeling(self, train_array, test_array, raw_features=None):
+        """
+        :param raw_features: Tuple (train, test) of raw_categorical features for the models using that input
+            mode, rows in the same order as the arrays.
+        """
+        # With several target variables y has one column per target and the scores average over them
+        n_targets = max(len(self.config.target_variables), 1)
+        X_train, y_train = split_features_target(train_array, n_targets)
+        X_test, y_test = split_features_target(test_array, n_targets)
+        X_raw_train, X_raw_test = raw_features if raw_features is not None else (None, None)
 
-        # Model deployment process
-        #...
+        instantiated_models, hyperparams, strategies = self.initialize_model_class()
+        with profiler.span('evaluate_model', rows=X_train.shape[0]) as span:
+            model_report = self.evaluate_model(X_train=X_train, y_train=y_train, X_test=X_test, y_test=y_test, models=instantiated_models, hyperparams=hyperparams, strategies=strategies,
+                                               X_raw_train=X_raw_train, X_raw_test=X_raw_test)
+        logger.info(f"Model evaluation took {span['wall_s']:.1f}s wall, {span['cpu_s']:.1f}s CPU in the main process")
 
-        # Model monitoring process
-        #...
+        best_model_name, (best_model_score, best_model_cls) = max(model_report.items(), key=lambda item: item[1][0])    # apply max on first element[0] of the second variable(tupele)[1}
 
-        # Model maintenance process
-        #...
+        print('---> best_model_score: ', best_model_score)
+        print('---> best_model_name: ', best_model_name)
+        print('---> best_model_cls: ', best_model_cls)
+
+        best_input_mode = self.input_modes[best_model_name]
+        target_scores = None
+        if n_targets > 1:
+            target_scores = self.target_scores(best_model_cls, X_raw_test if best_input_mode == 'raw_categorical'
+                                               else X_test, y_test)
+            logger.info(f"Test score per target of {best_model_name}: {target_scores}")
 
-        # Reporting process
-        #...
+        # The inference side picks the preprocessing variant of the saved model from its metadata sidecar
+        metadata = {'model_name': best_model_name, 'model_class': model_class_name(best_model_cls),
+                    'input_mode': best_input_mode, 'test_score': best_model_score,
+                    'target_variables': self.config.target_variables, 'target_scores': target_scores,
+                    'params': best_model_cls.get_params(deep=False),
+                    'data_hash': fingerprint_data(X_raw_train if best_input_mode == 'raw_categorical'
+                                                  else X_train, y_train),
+                    'models': {model_name: {'input_mode': self.input_modes[model_name], 'test_score': test_score}
+                               for model_name, (test_score, _) in model_report.items()},
+                    'ensemble': self.ensemble_report}
+        artifact_store = self.config.artifact_store
+        save_object(file_path=Path(self.config.model_output_pkl), object=best_model_cls, metadata=metadata,
+                    compress=artifact_store.compress)
+        if artifact_store.registry_dir is not None:
+            ArtifactRegistry(artifact_store.registry_dir).register(Path(self.config.model_output_pkl).stem,
+                                                                   Path(self.config.model_output_pkl),
+                                                                   score=best_model_score)
 
-        # Logging and error handling process
-        #...
 
-        # Final message
-        print("Model training pipeline completed successfully.")
 
-        logger.info("Pipeline completed successfully.")
+if __name__ == '__main__':
+    from StudentsPerformance.pipeline.training_pipeline import main
 
-    except Exception as e:
-        logger.error(f"Error in the main pipeline: {str(e)}")
-        raise CustomException(e, sys)
+    # Ingestion -> transformation -> training, skipping the stages that are up to date
+    main()
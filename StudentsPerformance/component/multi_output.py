@@ -0,0 +1,57 @@
+from dataclasses import replace
+from typing import Optional
+from sklearn.base import clone
+from sklearn.multioutput import MultiOutputRegressor
+from StudentsPerformance.entity import SearchStrategyConfig
+from StudentsPerformance.logger import logger
+
+
+# Prefix of the parameters of the model wrapped by MultiOutputRegressor
+WRAPPED_PREFIX = 'estimator__'
+
+
+def native_multi_output_params(estimator) -> Optional[dict]:
+    """
+    Parameters making an estimator fit a 2-D target (one column per target) natively.
+
+    :param estimator: scikit-learn compatible regressor.
+    :return: Parameters to set on the estimator ({} when its tags declare multi-output support),
+        None when it can only fit a single target.
+    """
+    if type(estimator).__module__.startswith('catboost'):
+        # CatBoost's default RMSE is single-target, MultiRMSE fits all the targets with one set of trees
+        return {'loss_function': 'MultiRMSE'}
+    try:
+        from sklearn.utils import get_tags
+        multi_output = get_tags(estimator).target_tags.multi_output
+    except (ImportError, AttributeError):   # scikit-learn < 1.6, or an estimator without tags
+        multi_output = bool(getattr(estimator, '_get_tags', lambda: {})().get('multioutput', False))
+    return {} if multi_output else None
+
+
+def multi_output_search(model_name: str, estimator, hyperparams: dict, strategy: Optional[SearchStrategyConfig],
+                        n_jobs: int = None):
+    """
+    Adapts the search of a model to several targets. Models with native multi-output support get their
+    multi-output parameters; the others are wrapped in MultiOutputRegressor (one model per target), with
+    their hyperparameters and search resource renamed for the wrapper. n_jobs is left to None by the search:
+    its fits already run in parallel processes, nested per-target jobs would oversubscribe the CPUs.
+
+    Early stopping and warm-started resources need the boosting model itself, so the wrapped models fall
+    back to a plain search of their grid.
+
+    :return: Tuple (estimator, hyperparams, strategy).
+    """
+    params = native_multi_output_params(estimator)
+    if params is not None:
+        return clone(estimator).set_params(**params), hyperparams, strategy
+
+    hyperparams = {f'{WRAPPED_PREFIX}{name}': values for name, values in hyperparams.items()}
+    if strategy is not None and strategy.resource is not None:
+        if strategy.method.startswith('halving'):
+            strategy = replace(strategy, resource=f'{WRAPPED_PREFIX}{strategy.resource}')
+        else:
+            logger.info(f"{model_name} is fitted per target: no early stopping or warm start, "
+                        f"{strategy.resource} is searched as a plain hyperparameter")
+            strategy = replace(strategy, resource=None, early_stopping_rounds=None)
+    return MultiOutputRegressor(estimator, n_jobs=n_jobs), hyperparams, strategy
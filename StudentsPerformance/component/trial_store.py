@@ -0,0 +1,154 @@
+"""
+Persistent store of the search trials: one row per (model, hyperparameters, CV fold, training data) with its
+score, so an interrupted or extended search only fits the trials it has not seen yet. The refitted models
+of each run are kept in a leaderboard table.
+
+    python -m StudentsPerformance.component.trial_store artifacts/model_trainer/trials.sqlite
+"""
+import sys
+import json
+import sqlite3
+import hashlib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+from sklearn.base import clone
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    model_class TEXT NOT NULL,
+    params TEXT NOT NULL,
+    fold INTEGER NOT NULL,
+    n_folds INTEGER NOT NULL,
+    data_fingerprint TEXT NOT NULL,
+    early_stopping_rounds INTEGER NOT NULL,     -- 0: no early stopping
+    score REAL,                                 -- NULL: the fit failed
+    best_iteration INTEGER,
+    wall_s REAL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (model_class, params, fold, n_folds, data_fingerprint, early_stopping_rounds)
+);
+CREATE TABLE IF NOT EXISTS leaderboard (
+    run_at TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    model_class TEXT NOT NULL,
+    input_mode TEXT NOT NULL,
+    params TEXT NOT NULL,
+    data_fingerprint TEXT NOT NULL,
+    cv_score REAL,
+    test_score REAL
+);
+"""
+
+
+def fingerprint_data(*arrays) -> str:
+    """SHA-256 of the content of the arrays (ndarray, CSR matrix or DataFrame), None entries included."""
+    digest = hashlib.sha256()
+    for array in arrays:
+        if array is None:
+            digest.update(b'none')
+        elif isinstance(array, pd.DataFrame):
+            digest.update(json.dumps([list(map(str, array.columns)), list(map(str, array.dtypes))]).encode())
+            digest.update(pd.util.hash_pandas_object(array, index=False).values.tobytes())
+        elif sparse.issparse(array):
+            array = array.tocsr()
+            digest.update(f'csr{array.shape}'.encode())
+            for part in (array.data, array.indices, array.indptr):
+                digest.update(np.ascontiguousarray(part).data)
+        else:
+            array = np.ascontiguousarray(array)
+            digest.update(f'{array.dtype}{array.shape}'.encode())
+            digest.update(array.data)
+    return digest.hexdigest()
+
+
+def model_class_name(estimator) -> str:
+    return f'{type(estimator).__module__}.{type(estimator).__qualname__}'
+
+
+def params_key(estimator, params: Dict) -> str:
+    """
+    Canonical JSON of all the parameters of the candidate, defaults and parameters set on the base estimator
+    (e.g. native categorical settings) included, so a trial only matches the exact same model.
+    """
+    resolved = clone(estimator).set_params(**params).get_params(deep=False)
+    return json.dumps(resolved, sort_keys=True, default=repr)
+
+
+class TrialStore:
+    """SQLite file of the search trials and of the leaderboard of the refitted models."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, model_class: str, params: str, fold: int, n_folds: int, data_fingerprint: str,
+            early_stopping_rounds: Optional[int]) -> Optional[Tuple[float, Optional[int]]]:
+        """
+        :return: Tuple (score, best_iteration) of a stored trial, None if unknown. Failed fits (NULL score)
+            are kept for the trial leaderboard but are misses here: the failure may be transient (memory,
+            a killed worker, a library upgrade), so the trial is fitted again.
+        """
+        row = self.connection.execute(
+            'SELECT score, best_iteration FROM trials WHERE model_class = ? AND params = ? AND fold = ? '
+            'AND n_folds = ? AND data_fingerprint = ? AND early_stopping_rounds = ? AND score IS NOT NULL',
+            (model_class, params, fold, n_folds, data_fingerprint, early_stopping_rounds or 0)).fetchone()
+        return None if row is None else tuple(row)
+
+    def put(self, trials: Iterable[Dict]):
+        """
+        Stores trials and commits them, so the finished trials survive a crash of the run.
+
+        :param trials: Dicts with the columns of the trials table (created_at is filled in).
+        """
+        created_at = datetime.now().isoformat(timespec='seconds')
+        rows = [(trial['model_class'], trial['params'], trial['fold'], trial['n_folds'], trial['data_fingerprint'],
+                 trial['early_stopping_rounds'] or 0,
+                 None if trial['score'] is None or np.isnan(trial['score']) else float(trial['score']),
+                 trial.get('best_iteration'), trial.get('wall_s'), created_at) for trial in trials]
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def add_results(self, results: Iterable[Dict]):
+        """:param results: Dicts with the columns of the leaderboard table except run_at."""
+        run_at = datetime.now().isoformat(timespec='seconds')
+        rows = [(run_at, result['model_name'], result['model_class'], result['input_mode'], result['params'],
+                 result['data_fingerprint'], result['cv_score'], result['test_score']) for result in results]
+        with self.connection:
+            self.connection.executemany('INSERT INTO leaderboard VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def leaderboard(self, latest_run: bool = True) -> pd.DataFrame:
+        """Refitted models sorted by test score, of the latest run or of all runs."""
+        query = 'SELECT * FROM leaderboard'
+        if latest_run:
+            query += ' WHERE run_at = (SELECT MAX(run_at) FROM leaderboard)'
+        return pd.read_sql_query(query + ' ORDER BY test_score DESC', self.connection)
+
+    def trial_leaderboard(self, data_fingerprint: Optional[str] = None) -> pd.DataFrame:
+        """Mean CV score of every stored candidate (all folds), best first."""
+        query = ('SELECT model_class, params, data_fingerprint, early_stopping_rounds, COUNT(*) AS folds, '
+                 'CASE WHEN COUNT(score) < COUNT(*) THEN NULL ELSE AVG(score) END AS cv_score, '
+                 'SUM(wall_s) AS wall_s FROM trials')
+        args = ()
+        if data_fingerprint is not None:
+            query += ' WHERE data_fingerprint = ?'
+            args = (data_fingerprint,)
+        query += (' GROUP BY model_class, params, data_fingerprint, n_folds, early_stopping_rounds '
+                  'HAVING COUNT(*) = MAX(n_folds) ORDER BY cv_score DESC')
+        return pd.read_sql_query(query, self.connection, params=args)
+
+
+if __name__ == '__main__':
+    store = TrialStore(sys.argv[1] if len(sys.argv) > 1 else 'artifacts/model_trainer/trials.sqlite')
+    with pd.option_context('display.max_columns', None, 'display.max_colwidth', 80, 'display.width', 200):
+        print(store.leaderboard()[['model_name', 'input_mode', 'cv_score', 'test_score', 'params']])
+    store.close()
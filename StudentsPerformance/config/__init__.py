@@ -1,37 +1,157 @@
-from typing import Dict, List, Any
+import os
+import copy
+import functools
+from typing import Dict, List, Any, Iterable, Optional
 from pathlib import Path
-from StudentsPerformance.utils import read_yaml, create_directories
+import yaml
+from box import ConfigBox
+from StudentsPerformance.utils import read_yaml, create_directories, artifact_path
+from StudentsPerformance.config.validation import ConfigValidationError, validate_config, validate_hyperparameters
 from StudentsPerformance.entity import (DataIngestionConfig,
+                                        DataSourceConfig,
+                                        SplitConfig,
                                         DataTransformationConfig,
                                         PipelineStepsTransformation,
                                         PipelineDataTransformation,
                                         FeaturesDataTransformation,
                                         ModelTrainerConfig,
-                                        RegressorConfig)
+                                        EnsembleConfig,
+                                        RegressorConfig,
+                                        SearchStrategyConfig,
+                                        PredictionServiceConfig,
+                                        BatchPredictionConfig,
+                                        ProfilingConfig,
+                                        ArtifactStoreConfig,
+                                        TrainingJobConfig,
+                                        SchedulerConfig,
+                                        IncrementalUpdateConfig)
 
 
 CONFIG_FILE_PATH = Path('config/config.yaml')
 
+# Environment overrides: SP_CONFIG__MODEL_TRAINER__N_JOBS=4 sets model_trainer.n_jobs
+ENV_PREFIX = 'SP_CONFIG__'
+
+# Parsed config files of the process: resolved path -> (modification time, content)
+_PARSED_FILES: Dict[Path, tuple] = {}
+# Directories already created by this process
+_CREATED_DIRECTORIES = set()
+
+
+def load_config_file(config_filepath: Path) -> Dict[str, Any]:
+    """
+    Parses a config file once per process (again only when the file is modified).
+
+    :return: The shared parsed content, which callers must not modify.
+    """
+    path = Path(config_filepath).resolve()
+    mtime = path.stat().st_mtime_ns if path.exists() else None
+    cached = _PARSED_FILES.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, read_yaml(Path(config_filepath)).to_dict())
+        _PARSED_FILES[path] = cached
+    return cached[1]
+
+
+def parse_overrides(items: Iterable[str]) -> Dict[str, Any]:
+    """
+    Parses 'dotted.key=value' overrides (CLI --set), the values as YAML: 'model_trainer.cv=5',
+    'artifact_store.compress=null'. List items are addressed by their index:
+    'training_hyperparameters.list_trained_models.0.LinearRegression.hyperparams.n_jobs=[1]'.
+    """
+    overrides = {}
+    for item in items:
+        key, separator, value = item.partition('=')
+        if not separator or not key:
+            raise ValueError(f"Invalid override '{item}', expected key.subkey=value")
+        overrides[key.strip()] = yaml.safe_load(value)
+    return overrides
+
+
+def env_overrides(environ: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Overrides from the SP_CONFIG__<SECTION>__<KEY> environment variables, the values parsed as YAML."""
+    environ = os.environ if environ is None else environ
+    return {name[len(ENV_PREFIX):].lower().replace('__', '.'): yaml.safe_load(value)
+            for name, value in environ.items() if name.startswith(ENV_PREFIX)}
+
+
+def apply_overrides(config: Dict[str, Any], overrides: Dict[str, Any]):
+    """Sets each dotted key of overrides in config (in place); list items are addressed by their index."""
+    for key, value in overrides.items():
+        node = config
+        parts = key.split('.')
+        for part in parts[:-1]:
+            if isinstance(node, list) and part.isdigit() and int(part) < len(node):
+                node = node[int(part)]
+            elif isinstance(node, dict):
+                node = node.setdefault(part, {})
+            else:
+                raise ConfigValidationError([f"{key}: cannot override, '{part}' is not a section"])
+        if isinstance(node, list) and parts[-1].isdigit() and int(parts[-1]) < len(node):
+            node[int(parts[-1])] = value
+        elif isinstance(node, dict):
+            node[parts[-1]] = value
+        else:
+            raise ConfigValidationError([f"{key}: cannot override, its parent is not a section"])
+
+
+def _memoized(method):
+    """Builds the config object once per manager; the frozen dataclasses are shared by the callers."""
+    @functools.wraps(method)
+    def wrapper(self):
+        if method.__name__ not in self._configs:
+            self._configs[method.__name__] = method(self)
+        return self._configs[method.__name__]
+    return wrapper
+
 
 class ConfigurationManager:
-    def __init__(self, config_filepath: Path = CONFIG_FILE_PATH):
-        self.config = read_yaml(config_filepath)
-        create_directories([Path(self.config.artifact_root)])
+    """
+    Typed view of config/config.yaml. The file is parsed once per process and validated (with the overrides
+    applied) when the manager is built, and each get_*_config result is built once per manager.
+    """
+
+    def __init__(self, config_filepath: Path = CONFIG_FILE_PATH, overrides: Optional[Dict[str, Any]] = None,
+                 use_env: bool = True):
+        """
+        :param config_filepath: YAML config file.
+        :param overrides: Dotted key -> value, applied after the environment overrides.
+        :param use_env: Apply the SP_CONFIG__ environment overrides.
+        """
+        config = copy.deepcopy(load_config_file(config_filepath))
+        self.overrides = {**(env_overrides() if use_env else {}), **(overrides or {})}
+        apply_overrides(config, self.overrides)
+        validate_config(config)
+        self.config = ConfigBox(config)
+        self._configs = {}
+        self._create_directories([Path(self.config.artifact_root)])
+
+    @staticmethod
+    def _create_directories(paths: List[Path]):
+        paths = [path for path in paths if path not in _CREATED_DIRECTORIES]
+        create_directories(paths)
+        _CREATED_DIRECTORIES.update(paths)
 
     # ====================================================================
     # -------------------------- Data Ingestion --------------------------
     # ====================================================================
 
+    @_memoized
     def get_data_ingestion_config(self) -> DataIngestionConfig:
         config = self.config.data_ingestion
-        create_directories([Path(config.root_dir)])
+        self._create_directories([Path(config.root_dir)])
+        artifact_format = config.get('artifact_format', 'csv')
 
         data_ingestion_config = DataIngestionConfig(
             root_dir=config.root_dir,
             kaggle_dataset_id=config.kaggle_dataset_id,
             dataset_path=config.dataset_path,
-            train_data_path=config.train_data_path,
-            test_data_path=config.test_data_path
+            train_data_path=artifact_path(config.train_data_path, artifact_format),
+            test_data_path=artifact_path(config.test_data_path, artifact_format),
+            artifact_format=artifact_format,
+            source=DataSourceConfig(**config.get('source', {})),
+            cache_dir=config.get('cache_dir'),
+            split=SplitConfig(**config.get('split', {}))
         )
 
         return data_ingestion_config
@@ -40,10 +160,12 @@ class ConfigurationManager:
     # ----------------------- Data Transformation ------------------------
     # ====================================================================
 
+    @_memoized
     def get_features_data_transformation(self) -> FeaturesDataTransformation:
         config = self.config.features_data_transformation
         features_data_transformation = FeaturesDataTransformation(
-            target_variable=config.target_variable,
+            target_variable=config.target_variable if isinstance(config.target_variable, str)
+            else list(config.target_variable),
             numerical_features=config.numerical_features,
             categorical_features=config.categorical_features
         )
@@ -60,6 +182,7 @@ class ConfigurationManager:
 
         return steps
 
+    @_memoized
     def get_pipeline_data_transformation(self) -> PipelineDataTransformation:
         config = self.config.pipeline_data_transformation
 
@@ -68,17 +191,26 @@ class ConfigurationManager:
             categorical_pipeline=self.get_pipeline_steps_transformation(config.categorical_pipeline)
         )
 
+    @_memoized
     def get_data_transformation_config(self) -> DataTransformationConfig:
         config = self.config.data_transformation
-        create_directories([Path(config.root_dir)])
+        self._create_directories([Path(config.root_dir)])
+        # The splits are the ones the ingestion writes, so the two stages cannot disagree on their format
+        ingestion_config = self.get_data_ingestion_config()
 
         data_transformation_config = DataTransformationConfig(
             root_dir=config.root_dir,
-            train_data_path=config.train_data_path,
-            test_data_path=config.test_data_path,
+            train_data_path=ingestion_config.train_data_path,
+            test_data_path=ingestion_config.test_data_path,
             features_output_path=config.features_output_path,
             features_data_transformation=self.get_features_data_transformation(),
-            pipeline_data_transformation=self.get_pipeline_data_transformation()
+            pipeline_data_transformation=self.get_pipeline_data_transformation(),
+            cache_dir=config.get('cache_dir'),
+            artifact_format=ingestion_config.artifact_format,
+            array_dtype=config.get('array_dtype', 'float64'),
+            matrix_format=config.get('matrix_format', 'dense'),
+            raw_features_output_path=config.get('raw_features_output_path'),
+            artifact_store=self.get_artifact_store_config()
         )
 
         return data_transformation_config
@@ -86,6 +218,7 @@ class ConfigurationManager:
     # ====================================================================
     # ----------------------- Model Training ------------------------
     # ====================================================================
+    @_memoized
     def get_list_models(self):
         list_of_models = self.config.training_hyperparameters.list_trained_models
 
@@ -95,20 +228,153 @@ class ConfigurationManager:
             # {'LinearRegression': {'model_class': 'sklearn...LinearRegression', 'hyperparams': {'alpha': [0.01, 0.1]}}}
             for class_name, model_details in model.items():
                 model_configs.append(
-                    RegressorConfig(model_class=model_details.model_class, hyperparams=model_details.hyperparams)
+                    RegressorConfig(model_class=model_details.model_class,
+                                    hyperparams=model_details.hyperparams,
+                                    search_strategy=SearchStrategyConfig(**model_details.get('search_strategy', {})),
+                                    input_mode=model_details.get('input_mode', 'encoded'))
                 )
 
         return model_configs
 
+    @_memoized
     def get_model_trainer_config(self) -> ModelTrainerConfig:
         config = self.config.model_trainer
-        create_directories([Path(config.root_dir)])
+        self.validate_models()
+        self._create_directories([Path(config.root_dir)])
 
         model_trainer_config = ModelTrainerConfig(
             root_dir=config.root_dir,
             transformed_data_pkl=config.transformed_data_pkl,
             model_output_pkl=config.model_output_pkl,
-            list_trained_models=self.get_list_models()
+            n_jobs=config.get('n_jobs', -1),
+            time_budget=config.get('time_budget'),
+            cv=config.get('cv', 3),
+            share_arrays=config.get('share_arrays', True),
+            shared_dir=config.get('shared_dir'),
+            trial_store_path=config.get('trial_store_path'),
+            artifact_store=self.get_artifact_store_config(),
+            ensemble=EnsembleConfig(**config.get('ensemble', {})),
+            list_trained_models=self.get_list_models(),
+            target_variables=self.get_features_data_transformation().target_variables
         )
 
         return model_trainer_config
+
+    @_memoized
+    def validate_models(self):
+        """
+        Imports the model classes and checks their hyperparameters and search strategies; called before the
+        pipeline runs when training may run, so a bad grid fails before the expensive stages.
+        """
+        validate_hyperparameters(self.get_list_models(), n_folds=self.config.model_trainer.get('cv', 3),
+                                 n_targets=len(self.get_features_data_transformation().target_variables))
+
+    # ====================================================================
+    # ------------------------ Prediction Service ------------------------
+    # ====================================================================
+    @_memoized
+    def get_prediction_service_config(self) -> PredictionServiceConfig:
+        config = self.config.prediction_service
+
+        prediction_service_config = PredictionServiceConfig(
+            processor_path=config.processor_path,
+            model_path=config.model_path,
+            features_data_transformation=self.get_features_data_transformation(),
+            compiled_path=config.get('compiled_path'),
+            use_compiled=config.get('use_compiled', False),
+            raw_processor_path=config.get('raw_processor_path'),
+            host=config.host,
+            port=config.port,
+            max_batch_size=config.max_batch_size,
+            max_wait_ms=config.max_wait_ms,
+            artifact_store=self.get_artifact_store_config()
+        )
+
+        return prediction_service_config
+
+    # ====================================================================
+    # ------------------------- Batch Prediction -------------------------
+    # ====================================================================
+    @_memoized
+    def get_batch_prediction_config(self) -> BatchPredictionConfig:
+        config = self.config.batch_prediction
+
+        batch_prediction_config = BatchPredictionConfig(
+            prediction_service=self.get_prediction_service_config(),
+            chunksize=config.chunksize,
+            workers=config.workers,
+            engine=config.engine,
+            prediction_column=config.prediction_column,
+            prediction_prefix=config.get('prediction_prefix', 'predicted')
+        )
+
+        return batch_prediction_config
+
+    # ====================================================================
+    # ---------------------------- Profiling -----------------------------
+    # ====================================================================
+    @_memoized
+    def get_profiling_config(self) -> ProfilingConfig:
+        config = self.config.get('profiling', {})
+
+        profiling_config = ProfilingConfig(
+            report_path=config.get('report_path'),
+            trace_memory=config.get('trace_memory', False),
+            profile_dir=config.get('profile_dir'),
+            profile_spans=list(config.get('profile_spans') or [])
+        )
+
+        return profiling_config
+
+    # ====================================================================
+    # -------------------------- Artifact Store --------------------------
+    # ====================================================================
+    @_memoized
+    def get_artifact_store_config(self) -> ArtifactStoreConfig:
+        config = self.config.get('artifact_store', {})
+
+        artifact_store_config = ArtifactStoreConfig(
+            compress=config.get('compress'),
+            mmap_mode=config.get('mmap_mode', 'r'),
+            verify=config.get('verify', False),
+            registry_dir=config.get('registry_dir')
+        )
+
+        return artifact_store_config
+
+    # ====================================================================
+    # ---------------------------- Scheduler -----------------------------
+    # ====================================================================
+    @_memoized
+    def get_scheduler_config(self) -> SchedulerConfig:
+        config = self.config.get('scheduler', {})
+
+        scheduler_config = SchedulerConfig(
+            max_parallel_jobs=config.get('max_parallel_jobs', 2),
+            report_path=config.get('report_path'),
+            jobs=[TrainingJobConfig(name=job.name,
+                                    target_variable=job.get('target_variable'),
+                                    overrides=dict(job.get('overrides') or {}))
+                  for job in config.get('jobs') or []]
+        )
+
+        return scheduler_config
+
+    # ====================================================================
+    # ------------------------ Incremental Update ------------------------
+    # ====================================================================
+    @_memoized
+    def get_incremental_update_config(self) -> IncrementalUpdateConfig:
+        config = self.config.get('incremental_update', {})
+
+        incremental_update_config = IncrementalUpdateConfig(
+            prediction_service=self.get_prediction_service_config(),
+            data_ingestion=self.get_data_ingestion_config(),
+            max_score_drop=config.get('max_score_drop', 0.05),
+            validation_fraction=config.get('validation_fraction', 0.2),
+            extra_estimators=config.get('extra_estimators', 50),
+            random_state=config.get('random_state', 42),
+            history_path=config.get('history_path')
+        )
+
+        return incremental_update_config
@@ -0,0 +1,292 @@
+"""
+Validation of the parsed configuration against the config dataclasses of StudentsPerformance.entity.
+
+validate_config checks the structure without importing any model library (it runs every time a
+ConfigurationManager is built, the prediction service included): unknown and missing keys, value types
+and the allowed values of the enumerated settings. validate_hyperparameters imports the model classes and
+checks the searched hyperparameters against their signatures and a tiny fit of the scikit-learn models, and
+the search strategies against the search itself, so a bad grid fails before any stage runs.
+"""
+import inspect
+import warnings
+import dataclasses
+import numpy as np
+from pathlib import Path
+from importlib import import_module
+from typing import Any, Dict, List, Optional, Union, get_args, get_origin
+from StudentsPerformance.utils import ARTIFACT_FORMATS
+from StudentsPerformance.entity import (DataIngestionConfig,
+                                        DataSourceConfig,
+                                        SplitConfig,
+                                        DataTransformationConfig,
+                                        FeaturesDataTransformation,
+                                        ModelTrainerConfig,
+                                        EnsembleConfig,
+                                        RegressorConfig,
+                                        SearchStrategyConfig,
+                                        PredictionServiceConfig,
+                                        BatchPredictionConfig,
+                                        ProfilingConfig,
+                                        ArtifactStoreConfig,
+                                        SchedulerConfig,
+                                        IncrementalUpdateConfig)
+
+
+class ConfigValidationError(ValueError):
+    """All the problems found in a configuration, one per line."""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__('Invalid configuration:\n  ' + '\n  '.join(errors))
+
+
+# Top-level section -> dataclass its keys are checked against
+SECTIONS = {
+    'data_ingestion': DataIngestionConfig,
+    'data_transformation': DataTransformationConfig,
+    'features_data_transformation': FeaturesDataTransformation,
+    'model_trainer': ModelTrainerConfig,
+    'prediction_service': PredictionServiceConfig,
+    'batch_prediction': BatchPredictionConfig,
+    'profiling': ProfilingConfig,
+    'artifact_store': ArtifactStoreConfig,
+    'scheduler': SchedulerConfig,
+    'incremental_update': IncrementalUpdateConfig,
+}
+OTHER_SECTIONS = ('artifact_root', 'pipeline_data_transformation', 'training_hyperparameters',
+                  'common_hyperparameters')
+OPTIONAL_SECTIONS = ('profiling', 'artifact_store', 'scheduler', 'incremental_update', 'common_hyperparameters')
+
+# Fields built from other sections by the ConfigurationManager, not read from the section itself (in every
+# section, or in the section of one dataclass)
+DERIVED_FIELDS = ('artifact_store', 'features_data_transformation', 'pipeline_data_transformation',
+                  'list_trained_models', 'prediction_service', 'target_variables', 'data_ingestion',
+                  'DataTransformationConfig.train_data_path', 'DataTransformationConfig.test_data_path',
+                  'DataTransformationConfig.artifact_format')
+
+# Allowed values of the enumerated settings
+CHOICES = {
+    DataSourceConfig: {'type': ('kaggle', 'local', 'mirror')},
+    SplitConfig: {'mode': ('memory', 'streaming')},
+    DataIngestionConfig: {'artifact_format': ARTIFACT_FORMATS},
+    DataTransformationConfig: {'array_dtype': ('float64', 'float32'), 'matrix_format': ('dense', 'sparse', 'auto')},
+    SearchStrategyConfig: {'method': ('grid', 'random', 'halving_grid', 'halving_random')},
+    RegressorConfig: {'input_mode': ('encoded', 'raw_categorical')},
+    EnsembleConfig: {'method': (None, 'blend', 'stack')},
+    BatchPredictionConfig: {'engine': ('pandas', 'pyarrow')},
+    ArtifactStoreConfig: {'compress': (None, 'zlib', 'bz2', 'lzma'), 'mmap_mode': (None, 'r')},
+}
+
+
+def _is_dataclass_type(annotation) -> bool:
+    return isinstance(annotation, type) and dataclasses.is_dataclass(annotation)
+
+
+def _matches(value, annotation) -> bool:
+    if annotation is Any:
+        return True
+    origin = get_origin(annotation)
+    if origin is Union:
+        return any(_matches(value, arg) for arg in get_args(annotation))
+    if origin is list:
+        args = get_args(annotation)
+        return isinstance(value, list) and (not args or all(_matches(item, args[0]) for item in value))
+    if origin is dict:
+        return isinstance(value, dict)
+    if annotation is type(None):
+        return value is None
+    if annotation is Path:
+        return isinstance(value, (str, Path))
+    if annotation is bool:
+        return isinstance(value, bool)
+    if annotation is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    if annotation is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if annotation is str:
+        return isinstance(value, str)
+    return True
+
+
+def _type_name(annotation) -> str:
+    return getattr(annotation, '__name__', None) or str(annotation).replace('typing.', '')
+
+
+def _check_section(values, schema, path: str, errors: List[str]):
+    """Checks the keys of a mapping against the fields of schema, recursing into the nested dataclasses."""
+    if not isinstance(values, dict):
+        errors.append(f"{path}: expected a mapping, got {type(values).__name__}")
+        return
+    fields = {field.name: field for field in dataclasses.fields(schema)
+              if field.name not in DERIVED_FIELDS and f'{schema.__name__}.{field.name}' not in DERIVED_FIELDS}
+    for key in values:
+        if key not in fields:
+            errors.append(f"{path}.{key}: unknown key, expected one of {sorted(fields)}")
+
+    for name, field in fields.items():
+        key_path = f'{path}.{name}'
+        if name not in values:
+            required = field.default is dataclasses.MISSING and field.default_factory is dataclasses.MISSING
+            if required:
+                errors.append(f"{key_path}: missing required key")
+            continue
+        value = values[name]
+        if _is_dataclass_type(field.type):
+            _check_section(value, field.type, key_path, errors)
+        elif get_origin(field.type) is list and _is_dataclass_type(get_args(field.type)[0]) and isinstance(value, list):
+            for i, item in enumerate(value):
+                _check_section(item, get_args(field.type)[0], f'{key_path}[{i}]', errors)
+        elif not _matches(value, field.type):
+            errors.append(f"{key_path}: expected {_type_name(field.type)}, got {value!r}")
+        elif name in CHOICES.get(schema, {}) and value not in CHOICES[schema][name]:
+            errors.append(f"{key_path}: {value!r} is not one of {list(CHOICES[schema][name])}")
+
+
+def _check_pipeline_steps(steps, path: str, errors: List[str]):
+    if not isinstance(steps, list):
+        errors.append(f"{path}: expected a list of steps, got {steps!r}")
+        return
+    for i, step in enumerate(steps):
+        if not (isinstance(step, dict) and len(step) == 1):
+            errors.append(f"{path}[{i}]: expected a single 'module.Class: {{params}}' mapping, got {step!r}")
+            continue
+        method_class, params = next(iter(step.items()))
+        if '.' not in method_class:
+            errors.append(f"{path}[{i}]: '{method_class}' is not a dotted class path")
+        if params is not None and not isinstance(params, dict):
+            errors.append(f"{path}[{i}].{method_class}: expected a mapping of parameters, got {params!r}")
+
+
+def _check_models(models, path: str, errors: List[str]):
+    if not isinstance(models, list):
+        errors.append(f"{path}: expected a list of models, got {models!r}")
+        return
+    names = set()
+    for i, model in enumerate(models):
+        if not (isinstance(model, dict) and len(model) == 1):
+            errors.append(f"{path}[{i}]: expected a single 'ModelName: {{model_class, hyperparams}}' mapping")
+            continue
+        name, details = next(iter(model.items()))
+        if name in names:
+            errors.append(f"{path}.{name}: duplicate model name")
+        names.add(name)
+        _check_section(details, RegressorConfig, f'{path}.{name}', errors)
+        if isinstance(details, dict) and isinstance(details.get('hyperparams'), dict):
+            for param, values in details['hyperparams'].items():
+                if isinstance(values, list) and not values:
+                    errors.append(f"{path}.{name}.hyperparams.{param}: empty list of values")
+
+
+def _check_targets(features: Dict[str, Any], path: str, errors: List[str]):
+    targets = features.get('target_variable')
+    targets = [targets] if isinstance(targets, str) else targets
+    if not isinstance(targets, list):
+        return
+    if not targets:
+        errors.append(f"{path}.target_variable: empty list of targets")
+    if len(set(targets)) < len(targets):
+        errors.append(f"{path}.target_variable: duplicate targets in {targets}")
+    for key in ('numerical_features', 'categorical_features'):
+        overlap = [target for target in targets if target in (features.get(key) or [])]
+        if overlap:
+            errors.append(f"{path}.{key}: {overlap} cannot be both a feature and a target")
+
+
+def validate_config(config: Dict[str, Any]):
+    """
+    Checks the structure of a parsed configuration.
+
+    :param config: Configuration as plain dicts and lists (overrides applied).
+    :raises ConfigValidationError: Listing every problem found.
+    """
+    errors = []
+    known = set(SECTIONS) | set(OTHER_SECTIONS)
+    for key in config:
+        if key not in known:
+            errors.append(f"{key}: unknown section, expected one of {sorted(known)}")
+    for key in known:
+        if key not in config and key not in OPTIONAL_SECTIONS:
+            errors.append(f"{key}: missing section")
+
+    for section, schema in SECTIONS.items():
+        if config.get(section) is not None:
+            _check_section(config[section], schema, section, errors)
+
+    if isinstance(config.get('features_data_transformation'), dict):
+        _check_targets(config['features_data_transformation'], 'features_data_transformation', errors)
+    pipeline = config.get('pipeline_data_transformation')
+    if isinstance(pipeline, dict):
+        for name in ('numerical_pipeline', 'categorical_pipeline'):
+            _check_pipeline_steps(pipeline.get(name, []), f'pipeline_data_transformation.{name}', errors)
+    training = config.get('training_hyperparameters')
+    if isinstance(training, dict):
+        _check_models(training.get('list_trained_models'), 'training_hyperparameters.list_trained_models', errors)
+
+    if errors:
+        raise ConfigValidationError(errors)
+
+
+def validate_hyperparameters(model_configs: List[RegressorConfig], n_folds: int = 3, n_targets: int = 1):
+    """
+    Checks the searched hyperparameters of each model: the model class must import, every name must be a
+    parameter of it, every value of a scikit-learn model must fit (e.g. not the removed max_features='auto',
+    nor a deprecated value) and the search strategy must be valid for the estimator (adapted to several
+    targets when n_targets > 1, as the trainer does).
+
+    :raises ConfigValidationError: Listing every problem found.
+    """
+    from sklearn.base import clone
+    from StudentsPerformance.component.model_search import ModelSearch
+    from StudentsPerformance.component.multi_output import multi_output_search
+
+    def fit_error(estimator) -> Optional[str]:
+        try:
+            with warnings.catch_warnings():
+                # Deprecated values still fit: reported, they break on the next scikit-learn upgrade
+                warnings.simplefilter('error', FutureWarning)
+                estimator.fit(X_dummy, y_dummy)
+        except (ValueError, TypeError, FutureWarning) as e:
+            return str(e)
+        return None
+
+    # scikit-learn estimators validate their parameters first thing in fit: a value failing a tiny fit that
+    # the defaults pass is invalid. Other libraries' fits cost more and are left to the search
+    X_dummy, y_dummy = np.arange(8, dtype=np.float64).reshape(4, 2), np.array([1.0, 2.0, 3.0, 4.0])
+    errors = []
+    for model in model_configs:
+        module_name, class_name = model.model_class.rsplit('.', 1)
+        path = f'training_hyperparameters.{class_name}'
+        try:
+            cls = getattr(import_module(module_name), class_name)
+            estimator = cls()
+        except Exception as e:
+            errors.append(f"{path}.model_class: cannot instantiate {model.model_class}: {e}")
+            continue
+
+        # CatBoost only reports the parameters that were set in get_params, its signature lists them all
+        accepted = set(estimator.get_params()) | set(inspect.signature(cls.__init__).parameters) - {'self', 'kwargs'}
+        # Ensembles fit a couple of trees for the check, the searched n_estimators values still set their own
+        tiny = clone(estimator).set_params(**({'n_estimators': 2} if 'n_estimators' in estimator.get_params() else {}))
+        check_values = module_name.startswith('sklearn') and fit_error(clone(tiny)) is None
+        for param, values in model.hyperparams.items():
+            if param not in accepted:
+                errors.append(f"{path}.hyperparams.{param}: not a parameter of {class_name}")
+                continue
+            if not check_values:
+                continue
+            for value in (values if isinstance(values, list) else [values]):
+                error = fit_error(clone(tiny).set_params(**{param: value}))
+                if error is not None:
+                    errors.append(f"{path}.hyperparams.{param}: {error}")
+
+        try:
+            hyperparams, strategy = model.hyperparams, model.search_strategy
+            if n_targets > 1:
+                estimator, hyperparams, strategy = multi_output_search(class_name, estimator, hyperparams, strategy)
+            ModelSearch(class_name, estimator, hyperparams, n_folds=n_folds, strategy=strategy,
+                        input_mode=model.input_mode)
+        except Exception as e:
+            errors.append(f"{path}.search_strategy: {e}")
+
+    if errors:
+        raise ConfigValidationError(errors)
@@ -1,6 +1,26 @@
 from pathlib import Path
 from dataclasses import dataclass, field
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Union, Optional
+
+@dataclass(frozen=True)
+class DataSourceConfig:
+    type: str = 'kaggle'                    # kaggle | local | mirror
+    uri: Optional[str] = None               # local path or file:// mirror URL
+    file_name: Optional[str] = None         # dataset file inside the downloaded/mirrored dataset
+    sha256: Optional[str] = None            # pinned checksum of the dataset file
+    refresh: bool = False                   # bypass the download cache
+
+
+@dataclass(frozen=True)
+class SplitConfig:
+    mode: str = 'memory'                    # memory | streaming
+    test_size: float = 0.2
+    random_state: int = 42
+    chunksize: int = 100_000                # streaming: rows read and written at a time
+    key_column: Optional[str] = None        # streaming: rows are assigned by a hash of this column (row number if None)
+    stratify_column: Optional[str] = None   # streaming: column binned for a stratified split
+    stratify_bins: int = 10
+
 
 @dataclass(frozen=True)
 class DataIngestionConfig:
@@ -9,14 +29,22 @@ class DataIngestionConfig:
     dataset_path: Path
     train_data_path: Path
     test_data_path: Path
+    artifact_format: str = 'csv'
+    source: DataSourceConfig = field(default_factory=DataSourceConfig)
+    cache_dir: Optional[Path] = None
+    split: SplitConfig = field(default_factory=SplitConfig)
 
 
 @dataclass(frozen=True)
 class FeaturesDataTransformation:
-    target_variable: str
+    target_variable: Union[str, List[str]]   # one target, or a list of targets predicted together
     numerical_features: List[str]
     categorical_features: List[str]
 
+    @property
+    def target_variables(self) -> List[str]:
+        return [self.target_variable] if isinstance(self.target_variable, str) else list(self.target_variable)
+
 @dataclass(frozen=True)
 class PipelineStepsTransformation:
     method_class: str
@@ -29,6 +57,14 @@ class PipelineDataTransformation:
     categorical_pipeline: List[PipelineStepsTransformation] = field(default_factory=list)
 
 
+@dataclass(frozen=True)
+class ArtifactStoreConfig:
+    compress: Optional[str] = None          # None (memory-mappable) | zlib | bz2 | lzma
+    mmap_mode: Optional[str] = 'r'          # serving maps the artifacts read-only ('r') or reads them (None)
+    verify: bool = False                    # check the artifact checksums when serving loads them
+    registry_dir: Optional[Path] = None     # versioned registry of the trained models (None: disabled)
+
+
 @dataclass(frozen=True)
 class DataTransformationConfig:
     root_dir: Path
@@ -37,12 +73,40 @@ class DataTransformationConfig:
     features_output_path: Path
     features_data_transformation: FeaturesDataTransformation
     pipeline_data_transformation: PipelineDataTransformation
+    cache_dir: Optional[Path] = None
+    artifact_format: str = 'csv'
+    array_dtype: str = 'float64'            # dtype of the transformed train/test arrays (float32 halves them)
+    matrix_format: str = 'dense'            # dense | sparse (CSR end-to-end) | auto (sparse below 30% density)
+    raw_features_output_path: Optional[Path] = None     # processor of the raw_categorical input mode
+    artifact_store: ArtifactStoreConfig = field(default_factory=ArtifactStoreConfig)
+
+
+@dataclass(frozen=True)
+class SearchStrategyConfig:
+    method: str = 'grid'                    # grid | random | halving_grid | halving_random
+    n_iter: int = 10                        # sampled candidates of the random strategies
+    resource: Optional[str] = None          # hyperparameter grown by the halving strategies
+    early_stopping_rounds: Optional[int] = None   # grid/random: fit resource at its max, stop on validation
+    factor: int = 3
+    min_resources: Optional[int] = None
+    max_resources: Optional[int] = None
+    random_state: Optional[int] = 42
 
 
 @dataclass(frozen=True)
 class RegressorConfig:
     model_class: str
     hyperparams: Dict[str, Union[float, int, str, List[Union[float, int, str]]]]
+    search_strategy: SearchStrategyConfig = field(default_factory=SearchStrategyConfig)
+    input_mode: str = 'encoded'             # encoded | raw_categorical (native categorical support)
+
+
+@dataclass(frozen=True)
+class EnsembleConfig:
+    method: Optional[str] = None            # None (best single model) | blend | stack
+    top_k: int = 3                          # members: the best encoded-input models by CV score
+    n_threads: int = 0                      # threads predicting the members in parallel (0: sequentially)
+    latency_budget_ms: Optional[float] = None   # summed member predict latency on the test set (None: no limit)
 
 
 @dataclass(frozen=True)
@@ -50,4 +114,71 @@ class ModelTrainerConfig:
     root_dir: Path
     model_output_pkl: Path
     transformed_data_pkl: Path
+    n_jobs: int = -1
+    time_budget: Optional[float] = None
+    cv: int = 3
+    share_arrays: bool = True               # workers memory-map one .npy copy of the arrays instead of unpickling their own
+    shared_dir: Optional[Path] = None       # where the shared .npy files live (None: system temp dir, /dev/shm: RAM)
+    trial_store_path: Optional[Path] = None # SQLite store of the search trials and leaderboard (None: disabled)
+    artifact_store: ArtifactStoreConfig = field(default_factory=ArtifactStoreConfig)
+    ensemble: EnsembleConfig = field(default_factory=EnsembleConfig)
     list_trained_models: List[RegressorConfig] = field(default_factory=dict)
+    target_variables: List[str] = field(default_factory=list)   # columns at the end of the transformed arrays
+
+
+@dataclass(frozen=True)
+class PredictionServiceConfig:
+    processor_path: Path
+    model_path: Path
+    features_data_transformation: FeaturesDataTransformation
+    compiled_path: Optional[Path] = None
+    use_compiled: bool = False
+    raw_processor_path: Optional[Path] = None
+    host: str = '0.0.0.0'
+    port: int = 8080
+    max_batch_size: int = 256
+    max_wait_ms: float = 2.0
+    artifact_store: ArtifactStoreConfig = field(default_factory=ArtifactStoreConfig)
+
+
+@dataclass(frozen=True)
+class BatchPredictionConfig:
+    prediction_service: PredictionServiceConfig
+    chunksize: int = 100_000
+    workers: int = 0
+    engine: str = 'pandas'
+    prediction_column: str = 'prediction'
+    prediction_prefix: str = 'predicted'     # with several targets: one '<prefix> <target>' column each
+
+
+@dataclass(frozen=True)
+class ProfilingConfig:
+    report_path: Optional[Path] = None      # JSON run report (None disables it)
+    trace_memory: bool = False              # tracemalloc peak of each span (slower)
+    profile_dir: Optional[Path] = None      # cProfile dumps of profile_spans (None disables them)
+    profile_spans: List[str] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class TrainingJobConfig:
+    name: str                               # artifacts under <artifact_root>/jobs/<name>
+    target_variable: Optional[Union[str, List[str]]] = None   # None: features_data_transformation.target_variable
+    overrides: Dict[str, Any] = field(default_factory=dict)   # dotted key -> value, e.g. data_ingestion.source.uri
+
+
+@dataclass(frozen=True)
+class SchedulerConfig:
+    max_parallel_jobs: int = 2              # worker processes shared by the stages of all jobs
+    report_path: Optional[Path] = None      # JSON summary of the jobs of a run
+    jobs: List[TrainingJobConfig] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class IncrementalUpdateConfig:
+    prediction_service: PredictionServiceConfig
+    data_ingestion: DataIngestionConfig
+    max_score_drop: float = 0.05            # drop of the score below the last full search that triggers a new one
+    validation_fraction: float = 0.2        # rows of a batch held out to accept or reject the update
+    extra_estimators: int = 50              # boosting rounds / trees added by continued and warm-started models
+    random_state: Optional[int] = 42
+    history_path: Optional[Path] = None     # JSON log of the applied batches (a batch is applied once)
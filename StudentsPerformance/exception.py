@@ -22,6 +22,13 @@ def error_message_detail(error: Exception, error_detail: sys) -> str:
     return error_message
 
 
+def _restore_custom_exception(cls, error_message: str, detailed_message: str):
+    exception = cls.__new__(cls)
+    Exception.__init__(exception, error_message)
+    exception.error_message = detailed_message
+    return exception
+
+
 class CustomException(Exception):
     def __init__(self, error_message: Exception, error_details: sys):
         """
@@ -43,3 +50,9 @@ class CustomException(Exception):
         """
         return self.error_message
 
+    def __reduce__(self):
+        """
+        Pickles the exception from its messages (the traceback it was built from stays in the raising
+        process), so errors of worker processes reach the parent instead of breaking the pool.
+        """
+        return _restore_custom_exception, (type(self), str(self.args[0]) if self.args else '', self.error_message)
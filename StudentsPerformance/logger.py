@@ -6,23 +6,37 @@ from datetime import datetime
 # Logging format
 LOGGING_FORMAT = '[%(asctime)s]: %(levelname)s: %(module)s: %(message)s:'
 
-# Log directory and file setup paths
+# Log directory; the timestamped log file is only created by configure_logging()
 LOG_DIR = Path('logs')
-LOG_FILE = f"{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}.log"
-LOG_FILEPATH = LOG_DIR / LOG_FILE
-
-# Create log directory if it does not exist
-LOG_DIR.mkdir(parents=True, exist_ok=True)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format=LOGGING_FORMAT,
-    handlers=[
-        logging.FileHandler(LOG_FILEPATH),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
 
 # Logger name
 LOGGER_NAME = 'StudentPerformance'
 logger = logging.getLogger(LOGGER_NAME)
+
+# Importing the package has no side effect beyond this stdout handler: no log directory or file is created,
+# so prediction workers and the search worker processes start without touching the disk
+if not logger.handlers:
+    _stream_handler = logging.StreamHandler(sys.stdout)
+    _stream_handler.setFormatter(logging.Formatter(LOGGING_FORMAT))
+    logger.addHandler(_stream_handler)
+    logger.setLevel(logging.INFO)
+
+
+def configure_logging(log_dir: Path = LOG_DIR) -> Path:
+    """
+    Adds the timestamped log file of a run; called once by the entry points (training pipeline, prediction
+    service, batch scoring CLI).
+
+    :param log_dir: Directory of the log files, created if needed.
+    :return: Path of the log file.
+    """
+    for handler in logger.handlers:
+        if isinstance(handler, logging.FileHandler):
+            return Path(handler.baseFilename)
+    log_dir = Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    log_filepath = log_dir / f"{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}.log"
+    file_handler = logging.FileHandler(log_filepath)
+    file_handler.setFormatter(logging.Formatter(LOGGING_FORMAT))
+    logger.addHandler(file_handler)
+    return log_filepath
@@ -0,0 +1,166 @@
+"""
+Batch scoring of arbitrarily large files.
+
+The input is read in chunks, each chunk is transformed and predicted with the saved artifacts (optionally
+on a pool of worker processes) and the predictions are streamed to CSV or Parquet in input order. At most
+2 chunks per worker are in flight, so peak memory depends on the chunk size, not on the file size:
+
+    python -m StudentsPerformance.pipeline.batch_predict --input students.csv --output scores.parquet
+"""
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from dataclasses import replace
+from collections import deque
+from typing import Iterator, List
+from concurrent.futures import ProcessPoolExecutor
+from StudentsPerformance.logger import logger, configure_logging
+from StudentsPerformance.utils import DataFrameChunkWriter
+from StudentsPerformance.profiler import peak_rss_mb
+from StudentsPerformance.exception import CustomException
+from StudentsPerformance.config import ConfigurationManager, parse_overrides
+from StudentsPerformance.entity import BatchPredictionConfig, PredictionServiceConfig
+from StudentsPerformance.pipeline.predict_pipeline import PredictPipeline
+
+# Prediction pipeline of a worker process, loaded once by the pool initializer
+_WORKER_PIPELINE = None
+
+
+def _init_worker(service_config: PredictionServiceConfig):
+    global _WORKER_PIPELINE
+    _WORKER_PIPELINE = PredictPipeline(service_config)
+
+
+def _predict_chunk(features: pd.DataFrame):
+    return _WORKER_PIPELINE.predict(features)
+
+
+class BatchPredictor:
+    def __init__(self, config: BatchPredictionConfig):
+        self.config = config
+        features = config.prediction_service.features_data_transformation
+        self.feature_columns = list(features.numerical_features) + list(features.categorical_features)
+        self.target_variables = features.target_variables
+
+    def _block_size(self, input_path: Path, sample_bytes: int = 1 << 16) -> int:
+        """:return: Bytes of about chunksize rows of a CSV file, estimated on its first sample_bytes."""
+        with open(input_path, 'rb') as file:
+            sample = file.read(sample_bytes)
+        row_bytes = len(sample) / max(sample.count(b'\n'), 1)
+        return max(int(self.config.chunksize * row_bytes), 1 << 12)
+
+    def read_chunks(self, input_path: Path, columns: List[str]) -> Iterator[pd.DataFrame]:
+        """
+        Yields the requested columns of the input file chunk by chunk.
+
+        :param input_path: CSV or Parquet file.
+        :param columns: Columns to read.
+        """
+        chunksize = self.config.chunksize
+        if input_path.suffix == '.parquet':
+            import pyarrow.parquet as pq
+
+            for batch in pq.ParquetFile(input_path).iter_batches(batch_size=chunksize, columns=columns):
+                yield batch.to_pandas()
+        elif self.config.engine == 'pyarrow':
+            import pyarrow.csv as pv
+
+            # Arrow parses blocks of bytes: the block size is the chunk size times the row size of the file's head.
+            # Empty fields are nulls, not '' categories, and NaN as read by pandas (arrow gives None for strings)
+            reader = pv.open_csv(input_path, read_options=pv.ReadOptions(block_size=self._block_size(input_path)),
+                                 convert_options=pv.ConvertOptions(include_columns=columns, strings_can_be_null=True))
+            for batch in reader:
+                chunk = batch.to_pandas()
+                text_columns = chunk.columns[chunk.dtypes == object]
+                chunk[text_columns] = chunk[text_columns].where(chunk[text_columns].notna(), np.nan)
+                yield chunk
+        else:
+            yield from pd.read_csv(input_path, usecols=columns, chunksize=chunksize)
+
+    def _predictions(self, chunks: Iterator[pd.DataFrame]):
+        """Yields (chunk, predictions) in input order."""
+        if self.config.workers <= 0:
+            pipeline = PredictPipeline(self.config.prediction_service)
+            for chunk in chunks:
+                yield chunk, pipeline.predict(chunk[self.feature_columns])
+            return
+
+        with ProcessPoolExecutor(max_workers=self.config.workers, initializer=_init_worker,
+                                 initargs=(self.config.prediction_service,)) as executor:
+            in_flight = deque()
+            for chunk in chunks:
+                in_flight.append((chunk, executor.submit(_predict_chunk, chunk[self.feature_columns])))
+                # Bounded read-ahead keeps memory O(workers x chunk)
+                if len(in_flight) >= 2 * self.config.workers:
+                    chunk, future = in_flight.popleft()
+                    yield chunk, future.result()
+            while in_flight:
+                chunk, future = in_flight.popleft()
+                yield chunk, future.result()
+
+    def predict(self, input_path: Path, output_path: Path, keep_columns: List[str] = None) -> dict:
+        """
+        Scores input_path and streams the predictions (plus keep_columns) to output_path.
+
+        :return: Run statistics: rows, seconds, rows_per_second and peak_rss_mb.
+        """
+        keep_columns = keep_columns or []
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        columns = list(dict.fromkeys(self.feature_columns + keep_columns))
+        start = time.perf_counter()
+        n_rows = 0
+
+        try:
+            with DataFrameChunkWriter(output_path, 'parquet' if output_path.suffix == '.parquet' else 'csv') as writer:
+                for chunk, predictions in self._predictions(self.read_chunks(input_path, columns)):
+                    output = chunk[keep_columns].reset_index(drop=True)
+                    if predictions.ndim > 1:
+                        # One column per target variable, e.g. 'predicted reading score'
+                        for i, target in enumerate(self.target_variables):
+                            output[f'{self.config.prediction_prefix} {target}'] = predictions[:, i]
+                    else:
+                        output[self.config.prediction_column] = predictions
+                    writer.write(output)
+
+                    n_rows += len(output)
+                    logger.info(f"Scored {n_rows} rows")
+        except Exception as e:
+            logger.error(f"Batch prediction failed: {e}")
+            raise CustomException(e, sys)
+
+        elapsed = time.perf_counter() - start
+        stats = {'rows': n_rows, 'seconds': elapsed, 'rows_per_second': n_rows / elapsed if elapsed else 0.0,
+                 'peak_rss_mb': peak_rss_mb()}
+        logger.info(f"Batch prediction: {n_rows} rows in {elapsed:.1f}s ({stats['rows_per_second']:.0f} rows/s), "
+                    f"peak RSS {stats['peak_rss_mb']:.0f} MB")
+        return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score a CSV/Parquet file in chunks with the saved model.')
+    parser.add_argument('--input', type=Path, required=True, help='CSV or Parquet file to score')
+    parser.add_argument('--output', type=Path, required=True, help='CSV or Parquet (.parquet) output file')
+    parser.add_argument('--chunksize', type=int, help='rows per chunk (default: batch_prediction.chunksize)')
+    parser.add_argument('--workers', type=int, help='worker processes (default: batch_prediction.workers)')
+    parser.add_argument('--engine', choices=['pandas', 'pyarrow'], help='CSV reader')
+    parser.add_argument('--keep-columns', nargs='*', default=[], help='input columns copied to the output')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='config override, e.g. prediction_service.use_compiled=false (repeatable)')
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    config = ConfigurationManager(overrides=parse_overrides(args.set)).get_batch_prediction_config()
+    overrides = {key: value for key, value in
+                 (('chunksize', args.chunksize), ('workers', args.workers), ('engine', args.engine))
+                 if value is not None}
+    config = replace(config, **overrides)
+
+    stats = BatchPredictor(config).predict(args.input, args.output, keep_columns=args.keep_columns)
+    print(f"{stats['rows']} rows, {stats['rows_per_second']:.0f} rows/s, peak RSS {stats['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
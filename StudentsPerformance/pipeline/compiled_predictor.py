@@ -0,0 +1,366 @@
+"""
+Pickle-free, sklearn-free inference path.
+
+The exporter compiles the fitted ColumnTransformer built by DataTransformation into a flat NumPy plan:
+
+* numerical blocks: per-column imputation values followed by the (subtract, divide) pairs of the scalers,
+  applied in the same order as sklearn so the result is bit-for-bit identical;
+* categorical blocks: per-column imputation value, the sorted categories of the OneHotEncoder and a lookup
+  table whose row k is the already scaled one-hot block of category k (the last row is the block of an
+  unknown category when the encoder ignores unknown categories).
+
+Linear models and sklearn tree ensembles are compiled as well (coefficients, or flattened tree arrays
+traversed for all trees at once). Any other model is kept in its pickle and loaded lazily at runtime.
+
+Neither the exporter nor the runtime imports sklearn or pandas: the exporter dispatches on class names.
+The plan is an uncompressed artifact (see StudentsPerformance.artifact_store): loading maps its arrays
+read-only, so the serving processes share them instead of each holding a decompressed copy.
+"""
+import sys
+import json
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, List, Mapping
+from StudentsPerformance.logger import logger, configure_logging
+from StudentsPerformance.utils import load_object, load_dataframe
+from StudentsPerformance.artifact_store import save_artifact, load_artifact
+from StudentsPerformance.exception import CustomException
+from StudentsPerformance.config import ConfigurationManager
+
+
+PLAN_VERSION = 2
+
+LINEAR_MODELS = ('LinearRegression', 'Ridge', 'Lasso', 'ElasticNet', 'SGDRegressor', 'HuberRegressor',
+                 'BayesianRidge', 'LassoLars', 'Lars')
+FOREST_MODELS = ('RandomForestRegressor', 'ExtraTreesRegressor')
+
+
+# ====================================================================
+# ----------------------------- Exporter -----------------------------
+# ====================================================================
+
+def _class_name(obj) -> str:
+    return type(obj).__name__
+
+
+def _is_missing(values: np.ndarray) -> np.ndarray:
+    """NaN mask that also works on object arrays (same rule as SimpleImputer: x != x)."""
+    return values != values
+
+
+def _pipeline_steps(transformer) -> List:
+    if _class_name(transformer) == 'Pipeline':
+        return [step for _, step in transformer.steps if step not in (None, 'passthrough')]
+    return [transformer]
+
+
+def _scaler_ops(scaler, n_columns: int):
+    if _class_name(scaler) != 'StandardScaler':
+        raise ValueError(f'Unsupported numerical step {_class_name(scaler)}')
+    subtract = scaler.mean_ if scaler.with_mean else np.zeros(n_columns)
+    divide = scaler.scale_ if scaler.with_std and scaler.scale_ is not None else np.ones(n_columns)
+    return np.asarray(subtract, dtype=np.float64), np.asarray(divide, dtype=np.float64)
+
+
+def _to_dense(array) -> np.ndarray:
+    return array.toarray() if hasattr(array, 'toarray') else np.asarray(array)
+
+
+def _compile_numerical(steps, columns, arrays, prefix) -> Dict[str, Any]:
+    block = {'kind': 'numerical', 'columns': list(columns), 'width': len(columns), 'n_ops': 0}
+    fill = np.full(len(columns), np.nan)
+    for position, step in enumerate(steps):
+        if _class_name(step) == 'SimpleImputer':
+            if position != 0:
+                raise ValueError('SimpleImputer must be the first numerical step')
+            fill = np.asarray(step.statistics_, dtype=np.float64)
+            continue
+        subtract, divide = _scaler_ops(step, len(columns))
+        arrays[f'{prefix}_subtract_{block["n_ops"]}'] = subtract
+        arrays[f'{prefix}_divide_{block["n_ops"]}'] = divide
+        block['n_ops'] += 1
+    arrays[f'{prefix}_fill'] = fill
+    return block
+
+
+def _compile_categorical(steps, columns, arrays, prefix) -> Dict[str, Any]:
+    names = [_class_name(step) for step in steps]
+    if 'OneHotEncoder' not in names:
+        raise ValueError('A categorical block needs a OneHotEncoder')
+    encoder_position = names.index('OneHotEncoder')
+    encoder = steps[encoder_position]
+    if encoder.drop is not None or getattr(encoder, 'infrequent_categories_', None) is not None \
+            and any(categories is not None for categories in encoder.infrequent_categories_):
+        raise ValueError('OneHotEncoder with drop or infrequent categories is not supported')
+
+    fill = np.full(len(columns), None, dtype=object)
+    for step in steps[:encoder_position]:
+        if _class_name(step) != 'SimpleImputer':
+            raise ValueError(f'Unsupported categorical step {_class_name(step)} before the OneHotEncoder')
+        fill = np.asarray(step.statistics_, dtype=object)
+
+    # Run the post-encoding steps on a row where every one-hot column is active and on one where none is:
+    # the steps are column-wise, so these two rows give the exact value of every output cell.
+    width = sum(len(categories) for categories in encoder.categories_)
+    probe = np.vstack([np.ones(width), np.zeros(width)])
+    if encoder.sparse_output:
+        probe = _sparse_like(encoder, probe)
+    for step in steps[encoder_position + 1:]:
+        probe = step.transform(probe)
+    active, inactive = _to_dense(probe)
+
+    offset = 0
+    for i, categories in enumerate(encoder.categories_):
+        n_categories = len(categories)
+        table = np.tile(inactive[offset: offset + n_categories], (n_categories + 1, 1))
+        table[np.arange(n_categories), np.arange(n_categories)] = active[offset: offset + n_categories]
+        # Categories are matched as strings with a binary search, so they are stored in string order
+        categories = np.asarray(categories).astype(str)
+        order = np.argsort(categories)
+        arrays[f'{prefix}_categories_{i}'] = categories[order]
+        arrays[f'{prefix}_table_{i}'] = np.vstack([table[order], table[-1:]])
+        offset += n_categories
+
+    has_fill = [value is not None and not (isinstance(value, float) and np.isnan(value)) for value in fill]
+    arrays[f'{prefix}_fill'] = np.array([str(value) for value in fill])
+    arrays[f'{prefix}_has_fill'] = np.array(has_fill)
+    return {'kind': 'categorical', 'columns': list(columns), 'width': width,
+            'handle_unknown': encoder.handle_unknown}
+
+
+def _sparse_like(encoder, dense: np.ndarray):
+    """Builds the probe in the sparse format the encoder emits, so sparse-only code paths are exercised."""
+    sparse_probe = encoder.transform(np.array([[categories[0] for categories in encoder.categories_]], dtype=object))
+    return type(sparse_probe)(dense)
+
+
+def _compile_model(model, arrays) -> Dict[str, Any]:
+    name = _class_name(model)
+    if name in LINEAR_MODELS:
+        coef = np.asarray(model.coef_, dtype=np.float64)
+        # Several targets: (features x targets) coefficients and one intercept per target
+        arrays['model_coef'] = coef.T if coef.ndim == 2 and coef.shape[0] > 1 else coef.ravel()
+        arrays['model_intercept'] = np.atleast_1d(np.asarray(model.intercept_, dtype=np.float64))
+        return {'kind': 'linear', 'class': name}
+
+    if getattr(model, 'n_outputs_', 1) > 1:
+        # The flattened node arrays hold a single output per leaf
+        return {'kind': 'pickle', 'class': name}
+    if name == 'DecisionTreeRegressor':
+        trees, scale, base, average = [model], 1.0, 0.0, False
+    elif name in FOREST_MODELS:
+        trees, scale, base, average = list(model.estimators_), 1.0, 0.0, True
+    elif name == 'GradientBoostingRegressor':
+        trees, scale, average = [tree for tree in model.estimators_[:, 0]], model.learning_rate, False
+        base = 0.0 if isinstance(model.init_, str) else \
+            float(np.ravel(model.init_.predict(np.zeros((1, model.n_features_in_))))[0])
+    else:
+        return {'kind': 'pickle', 'class': name}
+
+    # Flatten all trees into global node arrays; a leaf has left == -1
+    left, right, feature, threshold, value, roots = [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        structure = tree.tree_
+        roots.append(offset)
+        is_leaf = structure.children_left == -1
+        left.append(np.where(is_leaf, -1, structure.children_left + offset))
+        right.append(np.where(is_leaf, -1, structure.children_right + offset))
+        feature.append(np.where(is_leaf, 0, structure.feature))
+        threshold.append(structure.threshold)
+        value.append(structure.value[:, 0, 0])
+        offset += structure.node_count
+
+    arrays['tree_left'] = np.concatenate(left).astype(np.int64)
+    arrays['tree_right'] = np.concatenate(right).astype(np.int64)
+    arrays['tree_feature'] = np.concatenate(feature).astype(np.int64)
+    arrays['tree_threshold'] = np.concatenate(threshold).astype(np.float64)
+    arrays['tree_value'] = np.concatenate(value).astype(np.float64)
+    arrays['tree_roots'] = np.array(roots, dtype=np.int64)
+    return {'kind': 'trees', 'class': name, 'scale': scale, 'base': base, 'average': average}
+
+
+def compile_predictor(processor, model, output_path: Path, verify_features, model_path: Path = None) -> Path:
+    """
+    Compiles the fitted features processor (and the model when supported) into a plan and verifies
+    that the compiled transform is bit-for-bit equal to processor.transform on verify_features.
+
+    :param processor: Fitted ColumnTransformer.
+    :param model: Fitted model.
+    :param output_path: Path of the plan artifact.
+    :param verify_features: DataFrame with the feature columns used for the equality check.
+    :param model_path: Pickle loaded at runtime when the model itself cannot be compiled.
+    :return: output_path.
+    """
+    try:
+        if processor.remainder != 'drop':
+            raise ValueError('Only ColumnTransformer(remainder="drop") can be compiled')
+
+        arrays = {}
+        blocks = []
+        for i, (name, transformer, columns) in enumerate(processor.transformers_):
+            if isinstance(transformer, str) or len(columns) == 0:
+                continue
+            steps = _pipeline_steps(transformer)
+            if any(_class_name(step) == 'OneHotEncoder' for step in steps):
+                block = _compile_categorical(steps, columns, arrays, f'block{len(blocks)}')
+            else:
+                block = _compile_numerical(steps, columns, arrays, f'block{len(blocks)}')
+            blocks.append(block)
+
+        spec = {'version': PLAN_VERSION, 'blocks': blocks, 'model': _compile_model(model, arrays),
+                'model_path': None if model_path is None else str(model_path)}
+
+        output_path = Path(output_path)
+        save_artifact(output_path, {'spec': json.dumps(spec), 'arrays': arrays})
+
+        compiled = CompiledPredictor.load(output_path)
+        expected = _to_dense(processor.transform(verify_features))
+        actual = compiled.transform(verify_features)
+        if expected.dtype != actual.dtype or expected.tobytes() != actual.tobytes():
+            raise ValueError('Compiled transform differs from processor.transform')
+        if spec['model']['kind'] != 'pickle' and \
+                not np.allclose(compiled.predict(verify_features), model.predict(expected), rtol=1e-9, atol=1e-9):
+            raise ValueError('Compiled model predictions differ from model.predict')
+
+        logger.info(f"Compiled predictor ({spec['model']['kind']} model) saved at {output_path}")
+        return output_path
+
+    except Exception as e:
+        logger.error(f"Failed to compile the predictor: {e}")
+        raise CustomException(e, sys)
+
+
+# ====================================================================
+# ----------------------------- Runtime ------------------------------
+# ====================================================================
+
+class CompiledPredictor:
+    """Runs a compiled plan with NumPy only."""
+
+    def __init__(self, spec: Dict[str, Any], arrays: Mapping[str, np.ndarray]):
+        self.spec = spec
+        self.blocks = spec['blocks']
+        self.arrays = arrays
+        self.n_features_out = sum(block['width'] for block in self.blocks)
+        self.feature_columns = [column for block in self.blocks for column in block['columns']]
+        self._model = None
+
+    @classmethod
+    def load(cls, path: Path, verify: bool = False) -> 'CompiledPredictor':
+        """
+        :param path: Plan artifact.
+        :param verify: Check the SHA-256 of the artifact.
+        """
+        plan = load_artifact(path, mmap_mode='r', verify=verify)
+        spec, arrays = json.loads(plan['spec']), plan['arrays']
+        if spec['version'] != PLAN_VERSION:
+            raise ValueError(f"Unsupported compiled plan version {spec['version']}")
+        return cls(spec, arrays)
+
+    def _transform_numerical(self, block, prefix, columns, out):
+        values = np.column_stack([np.asarray(columns[column], dtype=np.float64) for column in block['columns']])
+        missing = _is_missing(values)
+        if missing.any():
+            values[missing] = np.broadcast_to(self.arrays[f'{prefix}_fill'], values.shape)[missing]
+        for op in range(block['n_ops']):
+            values -= self.arrays[f'{prefix}_subtract_{op}']
+            values /= self.arrays[f'{prefix}_divide_{op}']
+        out[:] = values
+
+    def _transform_categorical(self, block, prefix, columns, out):
+        fill = self.arrays[f'{prefix}_fill']
+        has_fill = self.arrays[f'{prefix}_has_fill']
+        start = 0
+        for i, column in enumerate(block['columns']):
+            values = np.asarray(columns[column], dtype=object)
+            missing = _is_missing(values)
+            if missing.any():
+                if not has_fill[i]:
+                    raise ValueError(f'Missing value in column {column!r}')
+                values = values.copy()
+                values[missing] = fill[i]
+            values = values.astype(str)
+
+            categories = self.arrays[f'{prefix}_categories_{i}']
+            table = self.arrays[f'{prefix}_table_{i}']
+            codes = np.minimum(np.searchsorted(categories, values), len(categories) - 1)
+            unknown = categories[codes] != values
+            if unknown.any():
+                if block['handle_unknown'] == 'error':
+                    raise ValueError(f'Unknown categories {sorted(set(values[unknown]))} in column {column!r}')
+                codes[unknown] = len(categories)
+
+            width = table.shape[1]
+            out[:, start: start + width] = table[codes]
+            start += width
+
+    def transform(self, columns: Mapping[str, Any]) -> np.ndarray:
+        """
+        :param columns: Mapping column name -> values (a DataFrame works as well).
+        :return: Transformed features, identical to the fitted processor's transform.
+        """
+        n_rows = len(columns[self.feature_columns[0]])
+        out = np.empty((n_rows, self.n_features_out), dtype=np.float64)
+        start = 0
+        for i, block in enumerate(self.blocks):
+            end = start + block['width']
+            if block['kind'] == 'numerical':
+                self._transform_numerical(block, f'block{i}', columns, out[:, start:end])
+            else:
+                self._transform_categorical(block, f'block{i}', columns, out[:, start:end])
+            start = end
+        return out
+
+    def _predict_trees(self, X: np.ndarray) -> np.ndarray:
+        left, right = self.arrays['tree_left'], self.arrays['tree_right']
+        feature, threshold = self.arrays['tree_feature'], self.arrays['tree_threshold']
+        roots = self.arrays['tree_roots']
+        # Trees compare float32 features like sklearn does
+        X = X.astype(np.float32)
+
+        # nodes[t, r]: current node of tree t for row r; all trees descend one level per iteration
+        nodes = np.repeat(roots[:, None], X.shape[0], axis=1)
+        rows = np.broadcast_to(np.arange(X.shape[0]), nodes.shape)
+        active = left[nodes] != -1
+        while active.any():
+            current, current_rows = nodes[active], rows[active]
+            go_left = X[current_rows, feature[current]] <= threshold[current]
+            nodes[active] = np.where(go_left, left[current], right[current])
+            active[active] = left[nodes[active]] != -1
+
+        leaf_values = self.arrays['tree_value'][nodes]
+        model = self.spec['model']
+        if model['average']:
+            return leaf_values.sum(axis=0) / leaf_values.shape[0]
+        return model['base'] + model['scale'] * leaf_values.sum(axis=0)
+
+    def predict(self, columns: Mapping[str, Any]) -> np.ndarray:
+        X = self.transform(columns)
+        kind = self.spec['model']['kind']
+        if kind == 'linear':
+            return X @ self.arrays['model_coef'] + self.arrays['model_intercept']
+        if kind == 'trees':
+            return self._predict_trees(X)
+
+        if self._model is None:
+            # Only models that could not be compiled need their library (and the pickle)
+            self._model = load_object(Path(self.spec['model_path']))
+        return self._model.predict(X)
+
+
+def main():
+    configure_logging()
+    config = ConfigurationManager()
+    service_config = config.get_prediction_service_config()
+    transformation_config = config.get_data_transformation_config()
+    compile_predictor(processor=load_object(Path(service_config.processor_path)),
+                      model=load_object(Path(service_config.model_path)),
+                      output_path=Path(service_config.compiled_path),
+                      verify_features=load_dataframe(transformation_config.test_data_path,
+                                                     transformation_config.artifact_format),
+                      model_path=Path(service_config.model_path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Incremental model updates from a new batch of results (e.g. a new term), without the full search:
+
+    python -m StudentsPerformance.pipeline.incremental_update --input new_term.csv
+
+1. Categories the preprocessing has never seen are added to its one-hot encoders as new columns, and the
+   model gets a zero coefficient for each of them (component.incremental.extend_categories). Models that
+   cannot take extra inputs (trees, boosting, neighbours, the raw_categorical input mode) go to a full search.
+2. Drift check: the current model scores the batch. A score more than max_score_drop below the test score
+   of the last full search triggers a full search.
+3. Otherwise the best model is updated with the batch minus a held-out validation part, see
+   component.incremental.update_model, and so are the preprocessing statistics (imputer medians, scaler
+   moments) of refitted models and of linear models, which are re-expressed on the updated scale. The other
+   continued models (trees, boosting) keep the statistics they were fitted on: the batch does not update them.
+4. The update is kept only if it does not score worse than the current model on the held-out rows, and a
+   full search still runs if the updated model falls below the drift threshold.
+
+Every batch is appended to the ingested training split, so the next full search (this one's or the nightly
+one's) trains on it too, and is recorded in history_path right away so it is never applied twice. A full
+search that fails is retried, without appending the batch again, by the next update with the same batch.
+"""
+import sys
+import copy
+import argparse
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from sklearn.metrics import r2_score
+from sklearn.model_selection import train_test_split
+from StudentsPerformance.logger import logger, configure_logging
+from StudentsPerformance.exception import CustomException
+from StudentsPerformance.config import ConfigurationManager, parse_overrides
+from StudentsPerformance.artifact_store import ArtifactRegistry
+from StudentsPerformance.utils import (load_object, save_object, load_json, save_json, load_dataframe, save_dataframe,
+                                       hash_file, model_metadata_path)
+from StudentsPerformance.component.incremental import (new_categories, extend_categories, pad_inputs, input_map,
+                                                       rescale_inputs, update_processor, update_mode, update_model,
+                                                       model_input)
+from StudentsPerformance.pipeline.training_pipeline import TrainingPipeline
+
+
+# Stages re-run by a full search; the ingestion is not, the batch is appended to its training split
+FULL_SEARCH_STAGES = ['data_transformation', 'model_training', 'compile_predictor']
+
+
+class IncrementalUpdater:
+    def __init__(self, config: ConfigurationManager = None):
+        self.config = config or ConfigurationManager()
+        self.update_config = self.config.get_incremental_update_config()
+        service_config = self.update_config.prediction_service
+        features = service_config.features_data_transformation
+        self.feature_columns = list(features.numerical_features) + list(features.categorical_features)
+        self.target_variables = features.target_variables
+
+    def _target(self, data: pd.DataFrame):
+        return data[self.target_variables[0]] if len(self.target_variables) == 1 else data[self.target_variables]
+
+    def _score(self, processor, model, data: pd.DataFrame) -> float:
+        X = processor.transform(data[self.feature_columns])
+        return r2_score(self._target(data), model.predict(model_input(model, X)))
+
+    def _history(self) -> list:
+        history_path = self.update_config.history_path
+        return load_json(Path(history_path))['batches'] if history_path and Path(history_path).exists() else []
+
+    def _record(self, entry: dict):
+        """Adds the entry of a batch to the history, or replaces the one with the same sha256."""
+        if self.update_config.history_path is not None:
+            history = [batch for batch in self._history() if batch['sha256'] != entry['sha256']]
+            save_json(Path(self.update_config.history_path), {'batches': history + [entry]})
+
+    def _full_search(self, report: dict) -> dict:
+        logger.info(f"Full search: {report['reason']}")
+        TrainingPipeline(self.config).run(only=FULL_SEARCH_STAGES)
+        report = {**report, 'search_pending': False}
+        self._record(report)
+        return report
+
+    def _append_to_training(self, batch: pd.DataFrame):
+        ingestion_config = self.update_config.data_ingestion
+        train_data = load_dataframe(ingestion_config.train_data_path, ingestion_config.artifact_format)
+        save_dataframe(pd.concat([train_data, batch[list(train_data.columns.intersection(batch.columns))]],
+                                 ignore_index=True),
+                       ingestion_config.train_data_path, ingestion_config.artifact_format)
+
+    def update(self, batch_path: Path) -> dict:
+        """
+        Applies a batch of new rows (features and targets) to the served model.
+
+        :param batch_path: CSV or Parquet (.parquet) file.
+        :return: Report of the update; 'action' is one of skipped, updated, rejected, full_search.
+        """
+        try:
+            batch_path = Path(batch_path)
+            batch_hash = hash_file(batch_path)
+            applied = next((entry for entry in self._history() if entry['sha256'] == batch_hash), None)
+            if applied is not None and applied.get('search_pending'):
+                logger.info(f"Batch {batch_path} is already in the training data, retrying its full search")
+                return self._full_search(applied)
+            if applied is not None:
+                logger.info(f"Batch {batch_path} was already applied, skipping")
+                return {'batch': str(batch_path), 'sha256': batch_hash, 'action': 'skipped'}
+
+            columns = self.feature_columns + self.target_variables
+            batch = load_dataframe(batch_path, 'parquet' if batch_path.suffix == '.parquet' else 'csv')
+            missing_columns = [column for column in columns if column not in batch.columns]
+            if missing_columns:
+                raise ValueError(f'Missing columns in {batch_path}: {missing_columns}')
+
+            service_config = self.update_config.prediction_service
+            metadata = load_json(model_metadata_path(service_config.model_path))
+            processor_path = Path(service_config.raw_processor_path if metadata['input_mode'] == 'raw_categorical'
+                                  else service_config.processor_path)
+            # Not memory-mapped: the update writes to the fitted arrays
+            processor = load_object(processor_path)
+            model = load_object(Path(service_config.model_path))
+            baseline = metadata['test_score']
+            report = {'batch': str(batch_path), 'sha256': batch_hash, 'rows': len(batch),
+                      'model_name': metadata['model_name'], 'baseline_score': baseline,
+                      'applied_at': datetime.now().isoformat(timespec='seconds')}
+
+            unseen = new_categories(processor, batch[self.feature_columns])
+            if unseen:
+                processor, model = copy.deepcopy(processor), copy.deepcopy(model)
+                inputs = extend_categories(processor, batch[self.feature_columns])
+                if inputs is None or not pad_inputs(model, *inputs):
+                    report.update(action='full_search', reason=f"unseen categories {unseen}, "
+                                                               f"{metadata['model_name']} cannot take new inputs")
+                else:
+                    report['new_categories'] = unseen
+            if 'action' not in report:
+                report['batch_score'] = self._score(processor, model, batch)
+                if baseline - report['batch_score'] > self.update_config.max_score_drop:
+                    report.update(action='full_search', reason=f"batch score {report['batch_score']:.4f} is more "
+                                                               f"than {self.update_config.max_score_drop} below "
+                                                               f"{baseline:.4f}")
+                else:
+                    report.update(self._incremental_update(batch, batch_hash, processor, processor_path, model,
+                                                           metadata, extended=bool(unseen)))
+
+            # Appended and recorded together, before the search: a retry after a failed search must not append
+            # the batch twice
+            if report['action'] == 'full_search':
+                report['search_pending'] = True
+            self._append_to_training(batch)
+            self._record(report)
+            return self._full_search(report) if report['action'] == 'full_search' else report
+        except Exception as e:
+            logger.error(f"Incremental update failed: {e}")
+            raise CustomException(e, sys)
+
+    def _incremental_update(self, batch, batch_hash, processor, processor_path, model, metadata,
+                            extended: bool = False) -> dict:
+        """
+        Updates copies of the processor and the model, and replaces the served ones if they score as well.
+
+        :param extended: The processor has new categories the served one lacks, it is saved with the model.
+        """
+        config = self.update_config
+        fit_rows, validation_rows = train_test_split(batch, test_size=config.validation_fraction,
+                                                     random_state=config.random_state)
+        ingestion_config = config.data_ingestion
+        train_data = load_dataframe(ingestion_config.train_data_path, ingestion_config.artifact_format,
+                                    columns=self.feature_columns + self.target_variables)
+
+        updated_processor = copy.deepcopy(processor)
+        processor_report = update_processor(updated_processor, fit_rows[self.feature_columns], n_seen=len(train_data))
+        updated_model = copy.deepcopy(model)
+        if update_mode(model) != 'refit':
+            # Continued models go on from what they fitted on the current statistics: the linear ones are
+            # re-expressed on the updated scale, the others (trees split on thresholds) keep the current ones
+            mapping = input_map(processor, updated_processor)
+            if mapping is None or not rescale_inputs(updated_model, *mapping):
+                updated_processor = processor
+
+        def refit_data():
+            data = pd.concat([train_data, fit_rows[train_data.columns]], ignore_index=True)
+            return updated_processor.transform(data[self.feature_columns]), self._target(data)
+
+        updated_model, mode = update_model(updated_model, updated_processor.transform(fit_rows[self.feature_columns]),
+                                           self._target(fit_rows), config.extra_estimators, refit_data)
+        current_score = self._score(processor, model, validation_rows)
+        updated_score = self._score(updated_processor, updated_model, validation_rows)
+        report = {'update_mode': mode, 'feature_shift': processor_report['feature_shift'],
+                  'processor_updated': updated_processor is not processor, 'validation_score': current_score,
+                  'updated_validation_score': updated_score}
+        logger.info(f"{metadata['model_name']} updated by {mode}: validation score {current_score:.4f} -> "
+                    f"{updated_score:.4f}, largest feature mean shift {processor_report['feature_shift']:.3f} std")
+
+        if metadata['test_score'] - max(current_score, updated_score) > config.max_score_drop:
+            return {**report, 'action': 'full_search',
+                    'reason': f"validation score {max(current_score, updated_score):.4f} is more than "
+                              f"{config.max_score_drop} below {metadata['test_score']:.4f}"}
+        if updated_score < current_score:
+            return {**report, 'action': 'rejected'}
+
+        service_config = config.prediction_service
+        artifact_store = service_config.artifact_store
+        if updated_processor is not processor or extended:
+            save_object(file_path=processor_path, object=updated_processor, compress=artifact_store.compress)
+        # test_score stays the one of the full search: it is the baseline of the drift check
+        update = {'sha256': batch_hash, 'update_mode': mode, 'rows': len(fit_rows), 'validation_score': updated_score}
+        metadata = {**metadata, 'updates': metadata.get('updates', []) + [update]}
+        save_object(file_path=Path(service_config.model_path), object=updated_model, metadata=metadata,
+                    compress=artifact_store.compress)
+        if artifact_store.registry_dir is not None:
+            ArtifactRegistry(artifact_store.registry_dir).register(Path(service_config.model_path).stem,
+                                                                   Path(service_config.model_path))
+        TrainingPipeline(self.config).run(only=['compile_predictor'])
+        return {**report, 'action': 'updated'}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Update the served model with a new batch of results.')
+    parser.add_argument('--input', type=Path, required=True, help='CSV or Parquet file with features and targets')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='config override, e.g. incremental_update.max_score_drop=0.1 (repeatable)')
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    report = IncrementalUpdater(ConfigurationManager(overrides=parse_overrides(args.set))).update(args.input)
+    print(f"{report['action']}: {report.get('reason') or report.get('update_mode') or ''}")
+
+
+if __name__ == '__main__':
+    main()
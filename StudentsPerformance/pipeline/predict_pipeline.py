@@ -0,0 +1,176 @@
+import sys
+import time
+import queue
+import threading
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import Future
+from typing import Dict, List, Union
+from StudentsPerformance.logger import logger
+from StudentsPerformance.utils import load_object, load_json, model_metadata_path, accepts_sparse
+from StudentsPerformance.exception import CustomException
+from StudentsPerformance.entity import PredictionServiceConfig
+from StudentsPerformance.pipeline.compiled_predictor import CompiledPredictor
+
+
+class PredictPipeline:
+    """
+    Keeps the fitted features processor and the best model resident and predicts the target score(s)
+    of student records.
+    """
+
+    def __init__(self, config: PredictionServiceConfig):
+        self.config = config
+        features = config.features_data_transformation
+        self.numerical_features = list(features.numerical_features)
+        self.categorical_features = list(features.categorical_features)
+        self.feature_columns = self.numerical_features + self.categorical_features
+        self.target_variables = features.target_variables
+
+        # Preprocessing variant the model was trained on, recorded next to it by the training
+        metadata_path = model_metadata_path(config.model_path)
+        self.input_mode = load_json(metadata_path)['input_mode'] if metadata_path.exists() else 'encoded'
+
+        # Loaded once, every request reuses them
+        self.compiled = None
+        if (self.input_mode == 'encoded' and config.use_compiled and config.compiled_path is not None
+                and Path(config.compiled_path).exists()):
+            self.compiled = CompiledPredictor.load(Path(config.compiled_path), verify=config.artifact_store.verify)
+            logger.info(f"Prediction pipeline loaded the compiled plan {config.compiled_path}")
+        else:
+            processor_path = config.raw_processor_path if self.input_mode == 'raw_categorical' else config.processor_path
+            # Memory-mapped, the arrays of the artifacts are shared by the processes serving them
+            artifact_store = config.artifact_store
+            self.processor = load_object(Path(processor_path), mmap_mode=artifact_store.mmap_mode,
+                                         verify=artifact_store.verify)
+            self.model = load_object(Path(config.model_path), mmap_mode=artifact_store.mmap_mode,
+                                     verify=artifact_store.verify)
+            # A sparse processor output is densified for models that were fitted on dense arrays
+            self.dense_input = not accepts_sparse(self.model)
+            logger.info(f"Prediction pipeline loaded {processor_path} and {config.model_path} ({self.input_mode} input)")
+
+    def to_frame(self, records: Union[Dict, List[Dict]]) -> pd.DataFrame:
+        """
+        Validates student records and returns them as a DataFrame with the feature columns: numerical
+        values (numbers or numeric strings) as float64, categorical values as strings, NaN for missing (null).
+
+        :param records: A single record or a list of records (column name -> value).
+        :return: DataFrame with one row per record.
+        :raises ValueError: On a missing column or a value of the wrong type.
+        """
+        if isinstance(records, dict):
+            records = [records]
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            raise ValueError('Expected a student record or a list of student records')
+
+        missing_columns = {column for record in records for column in self.feature_columns if column not in record}
+        if missing_columns:
+            raise ValueError(f'Missing feature columns: {sorted(missing_columns)}')
+        frame = pd.DataFrame.from_records(records, columns=self.feature_columns)
+
+        errors = []
+        for column in self.numerical_features:
+            values = frame[column]
+            numbers = pd.to_numeric(values.where(~values.map(lambda value: isinstance(value, bool))), errors='coerce')
+            invalid = values[numbers.isna() & values.notna()]
+            if len(invalid):
+                errors.append(f'{column!r} expects numbers, got {", ".join(sorted(set(map(repr, invalid))))}')
+            frame[column] = numbers.astype(np.float64)
+        for column in self.categorical_features:
+            invalid = [value for value in frame[column] if value is not None and not isinstance(value, str)]
+            if invalid:
+                errors.append(f'{column!r} expects strings, got {", ".join(sorted(set(map(repr, invalid))))}')
+            # NaN, not None: the imputers (and the compiled plan) only treat NaN as missing
+            frame[column] = frame[column].astype(object).where(frame[column].notna(), np.nan)
+        if errors:
+            raise ValueError('Invalid feature values: ' + '; '.join(errors))
+        return frame
+
+    def predict(self, features: pd.DataFrame) -> np.ndarray:
+        """
+        Transforms the features and predicts in one vectorized call.
+
+        :param features: DataFrame with the feature columns.
+        :return: Predicted scores, (rows x targets) when the model predicts several target variables.
+        """
+        try:
+            if self.compiled is not None:
+                return self.compiled.predict(features)
+            transformed = self.processor.transform(features)
+            if self.dense_input and hasattr(transformed, 'toarray'):
+                transformed = transformed.toarray()
+            return self.model.predict(transformed)
+        except ValueError as e:
+            # Input the preprocessing rejects (e.g. unknown categories): the caller's error, not the service's
+            logger.warning(f"Prediction rejected: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Prediction failed: {e}")
+            raise CustomException(e, sys)
+
+
+class MicroBatcher:
+    """
+    Combines concurrent prediction requests into a single transform+predict call.
+
+    A background thread takes the first waiting request, then gathers the requests arriving within
+    max_wait_ms (up to max_batch_size records) and predicts them together, so the per-call pandas/sklearn
+    dispatch overhead is paid once per batch instead of once per request. When a batch fails, its requests
+    are predicted one by one, so an error only fails the request that caused it.
+    """
+
+    def __init__(self, pipeline: PredictPipeline, max_batch_size: int = 256, max_wait_ms: float = 2.0):
+        self.pipeline = pipeline
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, features: pd.DataFrame) -> Future:
+        """:return: Future resolved with the predictions of the given rows."""
+        future = Future()
+        self._requests.put((features, future))
+        return future
+
+    def predict(self, features: pd.DataFrame) -> np.ndarray:
+        return self.submit(features).result()
+
+    def _collect_batch(self):
+        batch = [self._requests.get()]
+        n_rows = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while n_rows < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(request)
+            n_rows += len(request[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            frames = [features for features, _ in batch]
+            try:
+                predictions = self.pipeline.predict(pd.concat(frames, ignore_index=True))
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    continue
+                for features, future in batch:
+                    try:
+                        future.set_result(self.pipeline.predict(features))
+                    except Exception as request_error:
+                        future.set_exception(request_error)
+                continue
+
+            start = 0
+            for features, future in batch:
+                future.set_result(predictions[start: start + len(features)])
+                start += len(features)
@@ -0,0 +1,286 @@
+"""
+Concurrent training of many (dataset, target) jobs, e.g. every exam subject of every cohort.
+
+    python -m StudentsPerformance.pipeline.scheduler [--jobs math reading] [--max-parallel 3] [--set key=value]
+
+A job is the base config with its target and overrides (the scheduler section of config.yaml). The stages of
+all jobs run as an asyncio task graph on a single bounded process pool:
+
+* ingestion runs once per distinct data_ingestion section, under <artifact_root>/shared/ingestion-<key>/;
+* transformation runs once per distinct ingestion + features + preprocessing, under
+  <artifact_root>/shared/transformation-<key>/ (its cache makes the jobs' own reads of it free);
+* the training and the compiled predictor of a job start as soon as its transformation is done, under
+  <artifact_root>/jobs/<name>/.
+
+The cores are shared fairly between the concurrent jobs: each searches with cpu_count // max_parallel_jobs
+workers, so a nightly run takes about as long as its longest job instead of the sum of the jobs.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Union
+from StudentsPerformance.logger import logger, configure_logging
+from StudentsPerformance.profiler import measure
+from StudentsPerformance.config import ConfigurationManager, CONFIG_FILE_PATH, apply_overrides, parse_overrides
+from StudentsPerformance.entity import TrainingJobConfig
+from StudentsPerformance.utils import load_json, model_metadata_path
+
+
+SHARED_DIR = 'shared'
+JOBS_DIR = 'jobs'
+# Directories of <artifact_root> shared by all jobs: the download cache of the datasets, whose entries are keyed
+# by dataset id, source (type, uri, file name) and content hash, so jobs with different sources never share one
+GLOBAL_DIRS = ('cache',)
+# Sections without artifact paths
+UNRELOCATED_SECTIONS = ('artifact_root', 'training_hyperparameters', 'common_hyperparameters', 'scheduler')
+
+INGESTION_STAGES = ['data_ingestion']
+TRANSFORMATION_STAGES = ['data_transformation']
+TRAINING_STAGES = ['model_training', 'compile_predictor']
+
+
+def _key(*sections) -> str:
+    return hashlib.sha256(json.dumps(sections, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+def _as_list(target_variable) -> List[str]:
+    return [target_variable] if isinstance(target_variable, str) else list(target_variable)
+
+
+def target_overrides(config: Dict[str, Any], target_variable: Union[str, List[str]]) -> Dict[str, Any]:
+    """
+    Overrides training on target_variable (one target or a list of targets): the previous targets become
+    numerical features in their place and the new targets stop being features (the exam scores predict
+    each other).
+    """
+    features = config['features_data_transformation']
+    if _as_list(target_variable) == _as_list(features['target_variable']):
+        return {}
+    numerical_features = [feature for feature in dict.fromkeys(features['numerical_features'] +
+                                                               _as_list(features['target_variable']))
+                          if feature not in _as_list(target_variable)]
+    return {'features_data_transformation.target_variable': target_variable,
+            'features_data_transformation.numerical_features': numerical_features}
+
+
+def relocation_overrides(config: Dict[str, Any], ingestion_dir: Path, transformation_dir: Path,
+                         job_dir: Path) -> Dict[str, str]:
+    """
+    Overrides moving every artifact path of config from <artifact_root>/<dir>/... to the shared ingestion
+    directory (data_ingestion/...), the shared transformation directory (data_transformation/...) or the
+    job directory (everything else). Paths under the GLOBAL_DIRS stay where they are.
+    """
+    root = Path(config['artifact_root']).parts
+    directories = {'data_ingestion': ingestion_dir, 'data_transformation': transformation_dir}
+    overrides = {}
+
+    def visit(node, key):
+        if isinstance(node, dict):
+            for name, value in node.items():
+                visit(value, f'{key}.{name}')
+            return
+        if not isinstance(node, str):
+            return
+        parts = Path(node).parts
+        if len(parts) <= len(root) or parts[:len(root)] != root or parts[len(root)] in GLOBAL_DIRS:
+            return
+        overrides[key] = str(directories.get(parts[len(root)], job_dir) / Path(*parts[len(root):]))
+
+    for section, value in config.items():
+        if section not in UNRELOCATED_SECTIONS:
+            visit(value, section)
+    return overrides
+
+
+def _run_stages(config_filepath: Path, overrides: Dict[str, Any], stages: List[str], force: bool = False,
+                raw_categorical: bool = False) -> Dict[str, Any]:
+    """
+    Runs some stages of the training pipeline for one job (inside a worker process).
+
+    :param raw_categorical: Also fit and cache the raw_categorical preprocessing, so the jobs sharing the
+        transformation only load it.
+    :return: Measurements of the run.
+    """
+    from StudentsPerformance.pipeline.training_pipeline import TrainingPipeline
+
+    config = ConfigurationManager(config_filepath, overrides=overrides, use_env=False)
+    with measure() as stats:
+        TrainingPipeline(config).run(force=force, only=stages)
+        if raw_categorical:
+            from StudentsPerformance.component.data_transformation import DataTransformation
+
+            DataTransformation(config.get_data_transformation_config()).raw_categorical_transformation()
+    return stats
+
+
+class TrainingScheduler:
+    """Plans the jobs of the scheduler section and runs their stages concurrently."""
+
+    def __init__(self, config: ConfigurationManager = None, config_filepath: Path = CONFIG_FILE_PATH,
+                 max_parallel_jobs: Optional[int] = None):
+        """
+        :param config: Base configuration, with its CLI/env overrides (applied to every job).
+        :param config_filepath: Config file the worker processes read.
+        :param max_parallel_jobs: Worker processes (default: scheduler.max_parallel_jobs).
+        """
+        self.config = config or ConfigurationManager(config_filepath)
+        self.config_filepath = Path(config_filepath)
+        self.scheduler_config = self.config.get_scheduler_config()
+        self.max_parallel_jobs = max_parallel_jobs or self.scheduler_config.max_parallel_jobs
+
+    def plan(self, job: TrainingJobConfig) -> Dict[str, Any]:
+        """
+        :return: Dict with the overrides of the ingestion, transformation and training runs of a job and
+            the keys of its shared runs.
+        """
+        base = self.config.config.to_dict()
+        job_config = json.loads(json.dumps(base))
+        overrides = dict(job.overrides)
+        apply_overrides(job_config, overrides)
+        if job.target_variable is not None:
+            overrides.update(target_overrides(job_config, job.target_variable))
+            apply_overrides(job_config, overrides)
+        if 'model_trainer.n_jobs' not in overrides:
+            # Fair share of the cores between the concurrent jobs
+            overrides['model_trainer.n_jobs'] = max(1, (os.cpu_count() or 1) // self.max_parallel_jobs)
+
+        ingestion_key = _key(job_config['data_ingestion'])
+        transformation_key = _key(ingestion_key, *(job_config[section] for section in
+                                                   ('data_transformation', 'features_data_transformation',
+                                                    'pipeline_data_transformation')))
+        root = Path(job_config['artifact_root'])
+        ingestion_dir = root / SHARED_DIR / f'ingestion-{ingestion_key}'
+        transformation_dir = root / SHARED_DIR / f'transformation-{transformation_key}'
+        job_dir = root / JOBS_DIR / job.name
+        overrides = {**self.config.overrides, **overrides,
+                     **relocation_overrides(job_config, ingestion_dir, transformation_dir, job_dir)}
+
+        def run_overrides(directory):
+            # Each run keeps its stage manifest and run report in its own directory
+            return {**overrides, 'artifact_root': str(directory),
+                    'profiling.report_path': str(directory / 'run_report.json')}
+
+        models = job_config['training_hyperparameters']['list_trained_models']
+        return {'job': job, 'job_dir': job_dir,
+                'target_variable': job_config['features_data_transformation']['target_variable'],
+                'ingestion_key': ingestion_key, 'ingestion_overrides': run_overrides(ingestion_dir),
+                'transformation_key': transformation_key,
+                'transformation_overrides': run_overrides(transformation_dir),
+                'training_overrides': run_overrides(job_dir),
+                'raw_categorical': any(details.get('input_mode') == 'raw_categorical'
+                                       for model in models for details in model.values())}
+
+    async def _run(self, plans: List[Dict[str, Any]], executor: ProcessPoolExecutor, force: bool):
+        loop = asyncio.get_running_loop()
+        shared_runs, shared_stats = {}, {}
+        # A shared transformation prepares the raw_categorical input mode if any of its jobs needs it
+        raw_categorical = {plan['transformation_key'] for plan in plans if plan['raw_categorical']}
+
+        async def run_stages(label, overrides, stages, raw_categorical=False):
+            logger.info(f"Scheduler: starting {label}")
+            stats = await loop.run_in_executor(executor, _run_stages, self.config_filepath, overrides, stages,
+                                               force, raw_categorical)
+            logger.info(f"Scheduler: {label} done in {stats['wall_s']:.1f}s")
+            return stats
+
+        def shared_run(label, overrides, stages, after=None, raw_categorical=False):
+            # One task per shared key, awaited by every job that needs it
+            if label not in shared_runs:
+                async def run():
+                    if after is not None:
+                        await after
+                    shared_stats[label] = await run_stages(label, overrides, stages, raw_categorical)
+                shared_runs[label] = asyncio.ensure_future(run())
+            return shared_runs[label]
+
+        async def run_job(plan):
+            job = plan['job']
+            ingestion = shared_run(f"ingestion-{plan['ingestion_key']}", plan['ingestion_overrides'],
+                                   INGESTION_STAGES)
+            transformation = shared_run(f"transformation-{plan['transformation_key']}",
+                                        plan['transformation_overrides'], TRANSFORMATION_STAGES, after=ingestion,
+                                        raw_categorical=plan['transformation_key'] in raw_categorical)
+            await transformation
+            return await run_stages(f'job {job.name}', plan['training_overrides'], TRAINING_STAGES)
+
+        results = await asyncio.gather(*(run_job(plan) for plan in plans), return_exceptions=True)
+        return results, shared_stats
+
+    def run(self, job_names: Optional[List[str]] = None, force: bool = False) -> Dict[str, Any]:
+        """
+        :param job_names: Jobs to run (default: all the jobs of the scheduler section).
+        :param force: Run every stage even if it is up to date.
+        :return: The schedule report (also written to scheduler.report_path).
+        """
+        jobs = self.scheduler_config.jobs
+        if job_names:
+            unknown = set(job_names) - {job.name for job in jobs}
+            if unknown:
+                raise ValueError(f"Unknown jobs {sorted(unknown)}, expected some of {[job.name for job in jobs]}")
+            jobs = [job for job in jobs if job.name in job_names]
+        if not jobs:
+            raise ValueError('No training jobs in the scheduler section')
+        plans = [self.plan(job) for job in jobs]
+
+        logger.info(f"Scheduler: {len(plans)} jobs, {len({plan['ingestion_key'] for plan in plans})} ingestion and "
+                    f"{len({plan['transformation_key'] for plan in plans})} transformation runs, "
+                    f"{self.max_parallel_jobs} parallel jobs")
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.max_parallel_jobs) as executor:
+            results, shared_stats = asyncio.run(self._run(plans, executor, force))
+
+        report = {'wall_s': time.perf_counter() - start, 'max_parallel_jobs': self.max_parallel_jobs,
+                  'shared_runs': {label: stats['wall_s'] for label, stats in shared_stats.items()}, 'jobs': {}}
+        for plan, result in zip(plans, results):
+            job = plan['job']
+            entry = {'target_variable': plan['target_variable'], 'artifact_dir': str(plan['job_dir']),
+                     'ingestion': plan['ingestion_key'], 'transformation': plan['transformation_key']}
+            if isinstance(result, BaseException):
+                entry.update(status='failed', error=str(result))
+                logger.error(f"Scheduler: job {job.name} failed: {result}")
+            else:
+                entry.update(status='done', wall_s=result['wall_s'])
+                metadata_path = model_metadata_path(plan['training_overrides']['model_trainer.model_output_pkl'])
+                if metadata_path.exists():
+                    metadata = load_json(metadata_path)
+                    entry.update(model_name=metadata['model_name'], test_score=metadata['test_score'])
+            report['jobs'][job.name] = entry
+
+        if self.scheduler_config.report_path is not None:
+            report_path = Path(self.scheduler_config.report_path)
+            report_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(report_path, 'w') as file:
+                json.dump(report, file, indent=2, default=str)
+            logger.info(f"Schedule report written to {report_path}")
+        return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train the jobs of the scheduler config section concurrently.')
+    parser.add_argument('--jobs', nargs='*', help='names of the jobs to run (default: all)')
+    parser.add_argument('--max-parallel', type=int, help='worker processes (default: scheduler.max_parallel_jobs)')
+    parser.add_argument('--force', action='store_true', help='run every stage even if it is up to date')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='config override applied to every job (repeatable, value parsed as YAML)')
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    scheduler = TrainingScheduler(ConfigurationManager(overrides=parse_overrides(args.set)),
+                                  max_parallel_jobs=args.max_parallel)
+    report = scheduler.run(job_names=args.jobs, force=args.force)
+    for name, entry in report['jobs'].items():
+        result = (f"{entry['model_name']} {entry['test_score']:.4f} in {entry['wall_s']:.1f}s"
+                  if entry['status'] == 'done' and 'model_name' in entry else entry.get('error', entry['status']))
+        print(f"{name:30s} {entry['target_variable']!s:25s} {result}")
+    print(f"{len(report['jobs'])} jobs in {report['wall_s']:.1f}s")
+    return int(any(entry['status'] == 'failed' for entry in report['jobs'].values()))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
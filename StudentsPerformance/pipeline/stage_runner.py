@@ -0,0 +1,96 @@
+import sys
+import json
+import hashlib
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+from StudentsPerformance.logger import logger
+from StudentsPerformance.profiler import profiler
+from StudentsPerformance.utils import hash_file
+from StudentsPerformance.exception import CustomException
+
+
+@dataclass
+class Stage:
+    """
+    A pipeline stage and what its result depends on.
+
+    run receives the context dict shared by the stages of a run, so a stage that actually ran can hand its
+    in-memory results to the next one.
+    """
+    name: str
+    run: Callable[[Dict[str, Any]], None]
+    inputs: List[Path] = field(default_factory=list)
+    outputs: List[Path] = field(default_factory=list)
+    config_sections: List[str] = field(default_factory=list)
+
+
+class StageRunner:
+    """
+    Runs stages in order and skips those whose fingerprint (input file hashes plus config subsections) is
+    unchanged since their last successful run and whose outputs still exist.
+    """
+
+    def __init__(self, config, manifest_path: Path):
+        """
+        :param config: Parsed configuration (ConfigBox) the config subsections are read from.
+        :param manifest_path: JSON file recording the fingerprint of each stage's last successful run.
+        """
+        self.config = config
+        self.manifest_path = Path(manifest_path)
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        if not self.manifest_path.exists():
+            return {}
+        with open(self.manifest_path, 'r') as file:
+            return json.load(file)
+
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as file:
+            json.dump(manifest, file, indent=2, sort_keys=True)
+        tmp_path.replace(self.manifest_path)
+
+    def fingerprint(self, stage: Stage) -> str:
+        inputs = {}
+        for path in stage.inputs:
+            path = Path(path)
+            inputs[str(path)] = hash_file(path) if path.exists() else None
+        config = {section: self.config.get(section) for section in stage.config_sections}
+        payload = json.dumps({'inputs': inputs, 'config': config}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def is_up_to_date(self, stage: Stage) -> bool:
+        """Whether the stage would be skipped given the current state of its inputs."""
+        recorded = self._load_manifest().get(stage.name, {}).get('fingerprint')
+        return all(Path(path).exists() for path in stage.outputs) and recorded == self.fingerprint(stage)
+
+    def run(self, stages: List[Stage], force: bool = False) -> Dict[str, Any]:
+        """
+        :param stages: Stages in execution order.
+        :param force: Run every stage regardless of its recorded fingerprint.
+        :return: The context dict filled by the stages that ran.
+        """
+        manifest = self._load_manifest()
+        context = {}
+        for stage in stages:
+            fingerprint = self.fingerprint(stage)
+            outputs_exist = all(Path(path).exists() for path in stage.outputs)
+            if not force and outputs_exist and manifest.get(stage.name, {}).get('fingerprint') == fingerprint:
+                logger.info(f"Stage '{stage.name}' is up to date, skipping")
+                continue
+
+            logger.info(f"Running stage '{stage.name}'")
+            try:
+                with profiler.span(f'stage:{stage.name}'):
+                    stage.run(context)
+            except Exception as e:
+                logger.error(f"Stage '{stage.name}' failed: {e}")
+                raise CustomException(e, sys)
+
+            manifest[stage.name] = {'fingerprint': fingerprint,
+                                    'outputs': [str(path) for path in stage.outputs]}
+            self._save_manifest(manifest)
+
+        return context
@@ -0,0 +1,161 @@
+import sys
+import argparse
+from pathlib import Path
+from typing import List
+from StudentsPerformance.logger import logger, configure_logging
+from StudentsPerformance.profiler import profiler
+from StudentsPerformance.exception import CustomException
+from StudentsPerformance.config import ConfigurationManager, parse_overrides
+from StudentsPerformance.pipeline.stage_runner import Stage, StageRunner
+from StudentsPerformance.utils import load_object, load_dataframe, load_json, model_metadata_path
+
+
+MANIFEST_FILE = 'pipeline_manifest.json'
+
+
+class TrainingPipeline:
+    """
+    Ingestion -> transformation -> training, each stage skipped when its inputs and config are unchanged.
+
+    The components are imported by the stages that use them, so skipped stages do not load scikit-learn
+    and the model libraries.
+    """
+
+    def __init__(self, config: ConfigurationManager = None):
+        self.config = config or ConfigurationManager()
+
+    def _data_ingestion(self, context):
+        from StudentsPerformance.component.data_ingestion import DataIngestion
+
+        data_ingestion = DataIngestion(self.config.get_data_ingestion_config())
+        data_ingestion.initiate_data_ingestion()
+
+    def _data_transformation(self, context):
+        from StudentsPerformance.component.data_transformation import DataTransformation
+
+        data_transformation = DataTransformation(self.config.get_data_transformation_config())
+        context['train_arr'], context['test_arr'] = data_transformation.data_transformation()
+
+    def _model_training(self, context):
+        from StudentsPerformance.component.model_trainer import ModelTraining
+        from StudentsPerformance.component.data_transformation import DataTransformation
+
+        if 'train_arr' not in context:
+            # The transformation stage was skipped: its arrays come from the transformation cache
+            self._data_transformation(context)
+        trainer_config = self.config.get_model_trainer_config()
+        raw_features = None
+        if any(model.input_mode == 'raw_categorical' for model in trainer_config.list_trained_models):
+            data_transformation = DataTransformation(self.config.get_data_transformation_config())
+            raw_features = data_transformation.raw_categorical_transformation()
+        model_trainer = ModelTraining(trainer_config)
+        model_trainer.modeling(context['train_arr'], context['test_arr'], raw_features=raw_features)
+
+    def _compile_predictor(self, context):
+        from StudentsPerformance.pipeline.compiled_predictor import compile_predictor
+
+        service_config = self.config.get_prediction_service_config()
+        transformation_config = self.config.get_data_transformation_config()
+        metadata_path = model_metadata_path(service_config.model_path)
+        if metadata_path.exists() and load_json(metadata_path)['input_mode'] != 'encoded':
+            # Only the encoded preprocessing can be compiled; a stale plan must not be served
+            logger.info(f"The best model uses the {load_json(metadata_path)['input_mode']} input mode, "
+                        f"no compiled plan")
+            Path(service_config.compiled_path).unlink(missing_ok=True)
+            return
+        compile_predictor(processor=load_object(Path(service_config.processor_path)),
+                          model=load_object(Path(service_config.model_path)),
+                          output_path=Path(service_config.compiled_path),
+                          verify_features=load_dataframe(transformation_config.test_data_path,
+                                                         transformation_config.artifact_format),
+                          model_path=Path(service_config.model_path))
+
+    def stages(self):
+        from StudentsPerformance.component.data_sources import source_file
+
+        config = self.config.config
+        ingestion_config = self.config.get_data_ingestion_config()
+        # A local or mirror dataset file is an input: editing or replacing it re-runs the ingestion
+        dataset_file = source_file(ingestion_config.source, ingestion_config.kaggle_dataset_id)
+        transformation_config = self.config.get_data_transformation_config()
+        transformation_sections = ['data_transformation', 'features_data_transformation',
+                                   'pipeline_data_transformation']
+        transformation_inputs = [Path(transformation_config.train_data_path),
+                                 Path(transformation_config.test_data_path)]
+
+        return [
+            Stage(name='data_ingestion',
+                  run=self._data_ingestion,
+                  inputs=[dataset_file] if dataset_file is not None else [],
+                  outputs=[Path(ingestion_config.train_data_path), Path(ingestion_config.test_data_path)],
+                  config_sections=['data_ingestion']),
+            Stage(name='data_transformation',
+                  run=self._data_transformation,
+                  inputs=transformation_inputs,
+                  outputs=[Path(config.data_transformation.features_output_path)],
+                  config_sections=transformation_sections),
+            Stage(name='model_training',
+                  run=self._model_training,
+                  inputs=transformation_inputs,
+                  outputs=[Path(config.model_trainer.model_output_pkl),
+                           model_metadata_path(config.model_trainer.model_output_pkl)],
+                  config_sections=transformation_sections + ['model_trainer', 'training_hyperparameters']),
+            Stage(name='compile_predictor',
+                  run=self._compile_predictor,
+                  inputs=[Path(config.prediction_service.processor_path), Path(config.prediction_service.model_path),
+                          model_metadata_path(config.prediction_service.model_path)],
+                  outputs=[Path(config.prediction_service.compiled_path)],
+                  config_sections=['prediction_service']),
+        ]
+
+    def run(self, force: bool = False, until: str = None, only: List[str] = None):
+        """
+        :param force: Run every stage even if it is up to date.
+        :param until: Name of the last stage to run (default: all stages).
+        :param only: Names of the stages to consider, the others are left to another run (the scheduler
+            runs the shared ingestion and transformation separately from the training of each job).
+        """
+        stages = self.stages()
+        if until is not None:
+            names = [stage.name for stage in stages]
+            stages = stages[:names.index(until) + 1]
+        if only is not None:
+            stages = [stage for stage in stages if stage.name in only]
+        runner = StageRunner(self.config.config, Path(self.config.config.artifact_root, MANIFEST_FILE))
+        if any(stage.name == 'model_training' and (force or not runner.is_up_to_date(stage)) for stage in stages):
+            # Fail on a bad hyperparameter grid before ingestion and transformation run, not after
+            self.config.validate_models()
+
+        profiling_config = self.config.get_profiling_config()
+        profiler.configure(trace_memory=profiling_config.trace_memory, profile_dir=profiling_config.profile_dir,
+                           profile_spans=profiling_config.profile_spans)
+        profiler.reset()
+        try:
+            return runner.run(stages, force=force)
+        finally:
+            # Written for failed runs too, they are the ones worth looking at
+            if profiling_config.report_path is not None:
+                report_path = profiler.write_report(Path(profiling_config.report_path),
+                                                    stages=[stage.name for stage in stages], force=force)
+                logger.info(f"Run report written to {report_path}")
+
+
+def main(argv=None, until: str = None):
+    parser = argparse.ArgumentParser(description='Run the training pipeline, skipping up-to-date stages.')
+    parser.add_argument('--force', action='store_true', help='run every stage even if it is up to date')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='config override, e.g. model_trainer.cv=5 (repeatable, value parsed as YAML)')
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    try:
+        config = ConfigurationManager(overrides=parse_overrides(args.set))
+        TrainingPipeline(config).run(force=args.force, until=until)
+        logger.info("Pipeline completed successfully.")
+    except Exception as e:
+        logger.error(f"Error in the main pipeline: {str(e)}")
+        raise CustomException(e, sys)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Run instrumentation: wall time, CPU time and peak memory of named spans (pipeline stages, data loading,
+transformations, model fits, saves), collected in a JSON run report.
+
+    from StudentsPerformance.profiler import profiler
+
+    with profiler.span('fit_transform', rows=len(data)):
+        ...
+
+Spans nest: each span records the path of the spans it runs in. Work done in worker processes is measured
+there with measure() and added to the report with profiler.record(). Spans listed in profile_spans are
+also run under cProfile and dumped to profile_dir as .prof files (pstats format, e.g. for snakeviz).
+"""
+import os
+import re
+import sys
+import json
+import time
+import cProfile
+import threading
+import tracemalloc
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the process in MB (NaN where unavailable)."""
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+@contextmanager
+def measure():
+    """
+    Measures the enclosed block without recording it; the yielded dict is filled on exit with
+    wall_s, cpu_s, peak_rss_mb and pid. Used where the report is not reachable, e.g. in worker processes.
+    """
+    stats = {}
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield stats
+    finally:
+        stats.update(wall_s=time.perf_counter() - wall, cpu_s=time.process_time() - cpu,
+                     peak_rss_mb=peak_rss_mb(), pid=os.getpid())
+
+
+class Profiler:
+    """Collects the spans of a run. A single module-level instance (profiler) is shared by the package."""
+
+    def __init__(self):
+        self.spans: List[Dict[str, Any]] = []
+        self.trace_memory = False
+        self.profile_dir: Optional[Path] = None
+        self.profile_spans = set()
+        self._started = time.time()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def configure(self, trace_memory: bool = False, profile_dir: Optional[Path] = None,
+                  profile_spans: Iterable[str] = ()):
+        """
+        :param trace_memory: Also record the peak of Python allocations of each span (tracemalloc, slower).
+        :param profile_dir: Directory of the cProfile dumps (None disables them).
+        :param profile_spans: Names of the spans run under cProfile.
+        """
+        self.trace_memory = trace_memory
+        self.profile_dir = Path(profile_dir) if profile_dir is not None else None
+        self.profile_spans = set(profile_spans)
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def reset(self):
+        with self._lock:
+            self.spans = []
+        self._started = time.time()
+
+    @property
+    def _stack(self) -> List[Dict[str, Any]]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _append(self, span: Dict[str, Any]):
+        with self._lock:
+            self.spans.append(span)
+
+    def record(self, name: str, stats: Dict[str, Any], **attributes):
+        """
+        Adds a span measured elsewhere (see measure()) under the currently open span.
+
+        :param name: Span name.
+        :param stats: Measurements returned by measure().
+        :param attributes: Extra values stored with the span (model, fold, score, ...).
+        """
+        parent = self._stack[-1]['path'] if self._stack else None
+        self._append({'name': name, 'path': f'{parent}/{name}' if parent else name, 'parent': parent,
+                      **stats, 'attributes': attributes})
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Measures the enclosed block and records it in the report. Yields the span dict, whose
+        'attributes' may be completed inside the block and whose measurements are available after it.
+        """
+        stack = self._stack
+        parent = stack[-1]['path'] if stack else None
+        span = {'name': name, 'path': f'{parent}/{name}' if parent else name, 'parent': parent,
+                'start_s': time.time() - self._started, 'attributes': attributes}
+
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            # The tracemalloc peak is global: fold it into the open spans before restarting it for this one
+            current_peak = tracemalloc.get_traced_memory()[1]
+            for open_span in stack:
+                open_span['_traced_peak'] = max(open_span['_traced_peak'], current_peak)
+            tracemalloc.reset_peak()
+            span['_traced_peak'] = 0
+
+        profile = None
+        if self.profile_dir is not None and name in self.profile_spans and sys.getprofile() is None:
+            profile = cProfile.Profile()
+            profile.enable()
+
+        stack.append(span)
+        status = 'ok'
+        try:
+            with measure() as stats:
+                yield span
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            stack.pop()
+            if profile is not None:
+                profile.disable()
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                profile_path = self.profile_dir / f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', span['path'])}.prof"
+                profile.dump_stats(profile_path)
+                span['profile'] = str(profile_path)
+            span.update(stats, status=status)
+            if tracing:
+                traced_peak = max(span.pop('_traced_peak'), tracemalloc.get_traced_memory()[1])
+                span['traced_peak_mb'] = traced_peak / (1024 * 1024)
+                for open_span in stack:
+                    open_span['_traced_peak'] = max(open_span['_traced_peak'], traced_peak)
+            self._append(span)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Totals per span name, and per name and model for the spans of a model."""
+        summary = {}
+        for span in self.spans:
+            model = span['attributes'].get('model')
+            key = f"{span['name']}:{model}" if model is not None else span['name']
+            entry = summary.setdefault(key, {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_rss_mb': 0.0})
+            entry['count'] += 1
+            entry['wall_s'] += span['wall_s']
+            entry['cpu_s'] += span['cpu_s']
+            entry['peak_rss_mb'] = max(entry['peak_rss_mb'], span['peak_rss_mb'])
+        return summary
+
+    def write_report(self, report_path: Path, **metadata) -> Path:
+        """
+        Writes the spans and their summary to a JSON file.
+
+        :param report_path: JSON file of the run report.
+        :param metadata: Extra run information stored at the top of the report.
+        """
+        report_path = Path(report_path)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        report = {'started_at': datetime.fromtimestamp(self._started).isoformat(timespec='seconds'),
+                  'pid': os.getpid(), **metadata, 'summary': self.summary(), 'spans': self.spans}
+        tmp_path = report_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as file:
+            json.dump(report, file, indent=2, default=str)
+        tmp_path.replace(report_path)
+        return report_path
+
+
+profiler = Profiler()
@@ -1,5 +1,6 @@
+import json
 import yaml
-import pickle
+import hashlib
 from pathlib import Path
 from box import ConfigBox
 from box.exceptions import BoxValueError
@@ -8,6 +9,7 @@ from ensure import ensure_annotations
 import sys
 from StudentsPerformance.logger import logger
 from StudentsPerformance.exception import CustomException
+from StudentsPerformance.artifact_store import save_artifact, load_artifact, metadata_path
 
 
 @ensure_annotations
@@ -59,15 +61,264 @@ def create_directories(path_to_directories: list[Path], verbose: bool = True):
             logger.info(f'Created directory at {path}')
 
 
-def save_object(file_path: Path, object):
-    try:
-        file_path.parent.mkdir(parents=True, exist_ok=True)
+def save_object(file_path: Path, object, metadata: dict = None, compress: str = None):
+    """
+    Saves an object as an artifact file (pickle protocol 5 with memory-mappable arrays, see artifact_store).
 
-        with open(file_path, 'wb') as file_obj:
-            pickle.dump(object, file_obj)
+    Args:
+        file_path (Path): Destination file.
+        object: Picklable object.
+        metadata (dict): Information written to the JSON sidecar of the artifact (None: no sidecar).
+        compress (str): None, 'zlib', 'bz2' or 'lzma'.
+    """
+    try:
+        save_artifact(Path(file_path), object, metadata=metadata, compress=compress)
         logger.info(f'Object saved successfully at {file_path}')
 
     except Exception as e:
         logger.error(f'Failed to save object at {file_path}: {e}')
         raise CustomException(e, sys)
 
+
+def load_object(file_path: Path, mmap_mode: str = None, verify: bool = False):
+    """
+    Loads an artifact file, or a plain pickle.
+
+    Args:
+        file_path (Path): Artifact file.
+        mmap_mode (str): 'r' backs the arrays with a read-only mapping of the file, shared between processes.
+        verify (bool): Check the SHA-256 of the artifact payload.
+    """
+    try:
+        return load_artifact(Path(file_path), mmap_mode=mmap_mode, verify=verify)
+
+    except Exception as e:
+        logger.error(f'Failed to load object from {file_path}: {e}')
+        raise CustomException(e, sys)
+
+
+def save_json(path: Path, data: dict):
+    """
+    Saves a dict as a JSON file.
+
+    Args:
+        path (Path): Destination file.
+        data (dict): JSON-serializable data.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(data, file, indent=2, default=str)
+    logger.info(f'JSON file saved at {path}')
+
+
+def load_json(path: Path) -> dict:
+    """
+    Loads a JSON file.
+
+    Args:
+        path (Path): JSON file.
+
+    Returns:
+        dict: Parsed content.
+    """
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def model_metadata_path(model_path: Path) -> Path:
+    """JSON sidecar of a saved model recording how it was trained (e.g. its input mode)."""
+    return metadata_path(model_path)
+
+
+def hash_file(file_path: Path, chunk_size: int = 1 << 20) -> str:
+    """
+    Computes the SHA-256 digest of a file, reading it in chunks.
+
+    Args:
+        file_path (Path): Path of the file to hash.
+        chunk_size (int): Number of bytes read at a time.
+
+    Returns:
+        str: Hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file_obj:
+        for chunk in iter(lambda: file_obj.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def split_features_target(data_array, n_targets: int = 1):
+    """
+    Splits a transformed array, whose last n_targets columns are the targets, into features and target.
+
+    Args:
+        data_array: Dense array or scipy CSR matrix.
+        n_targets: Number of target columns.
+
+    Returns:
+        tuple: Features (same format as data_array) and the target as a dense array, 1-D for a single
+        target and (rows x n_targets) otherwise.
+    """
+    features, target = data_array[:, :-n_targets], data_array[:, -n_targets:]
+    if hasattr(target, 'toarray'):
+        target = target.toarray()
+    return features, target.ravel() if n_targets == 1 else target
+
+
+def accepts_sparse(estimator) -> bool:
+    """
+    Tells whether an estimator can be fitted on scipy sparse matrices, from its scikit-learn tags.
+
+    Args:
+        estimator: scikit-learn compatible estimator.
+
+    Returns:
+        bool: False when the estimator has no tags (it then receives dense arrays).
+    """
+    try:
+        return bool(estimator.__sklearn_tags__().input_tags.sparse)
+    except AttributeError:
+        return False
+
+
+ARTIFACT_FORMATS = ('csv', 'parquet', 'feather')
+
+
+def artifact_path(path: Path, artifact_format: str) -> Path:
+    """
+    Returns the path of a dataset artifact with the file extension of its format.
+
+    Args:
+        path (Path): Configured artifact path (its extension is replaced).
+        artifact_format (str): One of csv, parquet or feather.
+
+    Returns:
+        Path: Path with the extension of the format.
+    """
+    if artifact_format not in ARTIFACT_FORMATS:
+        raise ValueError(f"Unknown artifact format '{artifact_format}', expected one of {ARTIFACT_FORMATS}")
+    return Path(path).with_suffix(f'.{artifact_format}')
+
+
+def save_dataframe(dataframe, file_path: Path, artifact_format: str = 'csv'):
+    """
+    Saves a DataFrame as csv, parquet or feather. For the columnar formats, text columns are stored as
+    dictionary-encoded categoricals.
+
+    Args:
+        dataframe (pd.DataFrame): Data to save.
+        file_path (Path): Destination file.
+        artifact_format (str): One of csv, parquet or feather.
+    """
+    try:
+        file_path = Path(file_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        if artifact_format == 'csv':
+            dataframe.to_csv(file_path, index=False, header=True)
+            return
+
+        text_columns = dataframe.select_dtypes(include=['object', 'string']).columns
+        dataframe = dataframe.astype({column: 'category' for column in text_columns})
+        if artifact_format == 'parquet':
+            dataframe.to_parquet(file_path, index=False)
+        elif artifact_format == 'feather':
+            dataframe.reset_index(drop=True).to_feather(file_path)
+        else:
+            raise ValueError(f"Unknown artifact format '{artifact_format}', expected one of {ARTIFACT_FORMATS}")
+
+    except Exception as e:
+        logger.error(f'Failed to save dataframe at {file_path}: {e}')
+        raise CustomException(e, sys)
+
+
+def load_dataframe(file_path: Path, artifact_format: str = 'csv', columns: list = None):
+    """
+    Loads a DataFrame saved by save_dataframe, reading only the given columns.
+
+    Args:
+        file_path (Path): File to load.
+        artifact_format (str): One of csv, parquet or feather.
+        columns (list): Columns to read (all columns if None).
+
+    Returns:
+        pd.DataFrame: Loaded data.
+    """
+    # pandas is only needed by the callers handling datasets, not by every importer of utils
+    import pandas as pd
+
+    try:
+        if artifact_format == 'csv':
+            return pd.read_csv(file_path, usecols=columns)
+        if artifact_format == 'parquet':
+            return pd.read_parquet(file_path, columns=columns)
+        if artifact_format == 'feather':
+            return pd.read_feather(file_path, columns=columns)
+        raise ValueError(f"Unknown artifact format '{artifact_format}', expected one of {ARTIFACT_FORMATS}")
+
+    except Exception as e:
+        logger.error(f'Failed to load dataframe from {file_path}: {e}')
+        raise CustomException(e, sys)
+
+
+class DataFrameChunkWriter:
+    """
+    Appends DataFrame chunks to a single csv, parquet or feather file without holding the whole dataset.
+
+    For parquet, text columns are written dictionary-encoded with a schema fixed by the first chunk, where
+    all-null columns are taken as text. The Arrow IPC (feather) file format cannot change dictionaries
+    between batches, so feather chunks keep text columns as plain strings.
+    """
+
+    def __init__(self, file_path: Path, artifact_format: str = 'csv'):
+        if artifact_format not in ARTIFACT_FORMATS:
+            raise ValueError(f"Unknown artifact format '{artifact_format}', expected one of {ARTIFACT_FORMATS}")
+        self.file_path = Path(file_path)
+        self.artifact_format = artifact_format
+        self.n_rows = 0
+        self._schema = None
+        self._writer = None
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _arrow_table(self, chunk):
+        import pyarrow as pa
+
+        if self._schema is None:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            text_type = pa.dictionary(pa.int32(), pa.string()) if self.artifact_format == 'parquet' else pa.string()
+            # Columns empty or all-null in the first chunk have the null type: they are text columns (the
+            # numerical ones are float NaN), typed as such so that the values of the later chunks fit
+            self._schema = pa.schema([
+                pa.field(f.name, text_type if pa.types.is_string(f.type) or pa.types.is_large_string(f.type)
+                         or pa.types.is_dictionary(f.type) or pa.types.is_null(f.type) else f.type)
+                for f in table.schema
+            ])
+        return pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False)
+
+    def write(self, chunk):
+        if self.artifact_format == 'csv':
+            chunk.to_csv(self.file_path, mode='a' if self.n_rows else 'w', header=not self.n_rows, index=False)
+        else:
+            table = self._arrow_table(chunk)
+            if self._writer is None:
+                if self.artifact_format == 'parquet':
+                    import pyarrow.parquet as pq
+                    self._writer = pq.ParquetWriter(self.file_path, self._schema)
+                else:
+                    import pyarrow as pa
+                    self._writer = pa.ipc.new_file(str(self.file_path), self._schema)
+            self._writer.write_table(table)
+        self.n_rows += len(chunk)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
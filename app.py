@@ -0,0 +1,61 @@
+from flask import Flask, jsonify, render_template, request
+from StudentsPerformance.logger import logger, configure_logging
+from StudentsPerformance.config import ConfigurationManager
+from StudentsPerformance.pipeline.predict_pipeline import PredictPipeline, MicroBatcher
+
+
+def create_app(config: ConfigurationManager = None) -> Flask:
+    """
+    Creates the prediction service. The features processor and the model are loaded once here and stay
+    resident for the lifetime of the process.
+    """
+    configure_logging()
+    config = config or ConfigurationManager()
+    service_config = config.get_prediction_service_config()
+    pipeline = PredictPipeline(service_config)
+    batcher = MicroBatcher(pipeline, max_batch_size=service_config.max_batch_size,
+                           max_wait_ms=service_config.max_wait_ms)
+
+    app = Flask(__name__)
+    app.config['SERVICE_CONFIG'] = service_config
+
+    @app.route('/')
+    def index():
+        return render_template('index.html')
+
+    @app.route('/health')
+    def health():
+        return jsonify(status='ok')
+
+    @app.route('/predict', methods=['POST'])
+    def predict():
+        """
+        Accepts a single student record, a JSON list of records or {"records": [...]} and returns the
+        predicted scores in the same order: one score per student, or with several target variables one
+        score vector per student in the order of "targets".
+        """
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict) and 'records' in payload:
+            payload = payload['records']
+        try:
+            features = pipeline.to_frame(payload)
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+
+        try:
+            predictions = batcher.predict(features)
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        except Exception as e:
+            logger.error(f"Prediction failed: {e}")
+            return jsonify(error='Prediction failed'), 500
+        return jsonify(predictions=predictions.tolist(), targets=pipeline.target_variables)
+
+    return app
+
+
+if __name__ == '__main__':
+    app = create_app()
+    service_config = app.config['SERVICE_CONFIG']
+    logger.info(f"Prediction service listening on {service_config.host}:{service_config.port}")
+    app.run(host=service_config.host, port=service_config.port, threaded=True)
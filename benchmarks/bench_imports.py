@@ -0,0 +1,104 @@
+"""
+Cold import time of the entry points, each measured in a fresh interpreter with python -X importtime.
+
+    python -m benchmarks.bench_imports --output bench/imports.json --target-ms 1000
+
+Fails (exit status 1) when an entry point imports slower than the target or loads a module it must not
+(the prediction side never needs scikit-learn, the model libraries or the Kaggle client). The results file
+has the format of benchmarks.bench_pipeline, so two runs can be compared with its compare command.
+"""
+import os
+import sys
+import json
+import platform
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+from datetime import datetime
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+# Entry point -> top-level packages it must not import
+ENTRY_POINTS = {
+    'StudentsPerformance.pipeline.predict_pipeline': ('sklearn', 'xgboost', 'catboost', 'kaggle', 'dotenv'),
+    'StudentsPerformance.pipeline.batch_predict': ('sklearn', 'xgboost', 'catboost', 'kaggle', 'dotenv'),
+    'app': ('sklearn', 'xgboost', 'catboost', 'kaggle', 'dotenv'),
+    'StudentsPerformance.pipeline.training_pipeline': ('sklearn', 'xgboost', 'catboost', 'kaggle', 'dotenv'),
+}
+
+DEFAULT_TARGET_MS = 1000
+
+
+def import_profile(module: str) -> dict:
+    """
+    Imports module in a new interpreter.
+
+    :return: Dict with the cumulative import time of the module in seconds (interpreter startup excluded)
+        and the top-level packages it loaded.
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=REPO_ROOT,
+                             env={**os.environ, 'PYTHONPATH': str(REPO_ROOT)}, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{process.stderr[-2000:]}')
+
+    cumulative_us, packages = None, set()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue    # header line
+        packages.add(name.strip().split('.')[0])
+        if name.strip() == module:
+            cumulative_us = int(cumulative)
+    return {'import_s': cumulative_us / 1e6, 'packages': packages}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the cold import time of the entry points.')
+    parser.add_argument('--output', type=Path, help='JSON results file')
+    parser.add_argument('--repeat', type=int, default=5, help='imports of each entry point (median is kept)')
+    parser.add_argument('--target-ms', type=float, default=DEFAULT_TARGET_MS, help='import time budget')
+    parser.add_argument('--modules', nargs='*', help='entry points to measure (default: all)')
+    args = parser.parse_args(argv)
+
+    from benchmarks.bench_pipeline import git_commit
+
+    report = {'meta': {'created_at': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+                       'python': platform.python_version(), 'platform': platform.platform(),
+                       'machine': platform.machine(), 'repeat': args.repeat, 'target_ms': args.target_ms},
+              'results': {}}
+    failures = []
+    for module in args.modules or ENTRY_POINTS:
+        profiles = [import_profile(module) for _ in range(args.repeat)]
+        times = [profile['import_s'] for profile in profiles]
+        forbidden = sorted(set(ENTRY_POINTS.get(module, ())) & profiles[0]['packages'])
+        result = {'median_s': statistics.median(times), 'min_s': min(times), 'repeat': args.repeat,
+                  'forbidden_imports': forbidden}
+        report['results'][f'import/{module}'] = result
+
+        status = ''
+        if result['median_s'] * 1000 > args.target_ms:
+            status = f'  OVER {args.target_ms:.0f} ms'
+        if forbidden:
+            status += f"  imports {', '.join(forbidden)}"
+        if status:
+            failures.append(module)
+        print(f"{module:50s} {result['median_s'] * 1000:10.1f} ms{status}")
+
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f'Results written to {args.output}')
+
+    if failures:
+        print(f'{len(failures)} entry point(s) over the import budget or loading forbidden modules')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
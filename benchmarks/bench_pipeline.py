@@ -0,0 +1,238 @@
+"""
+Benchmarks of the ingestion -> transformation -> training -> inference hot paths on synthetic data.
+
+Each benchmark is run --repeat times on datasets of the requested sizes and its median wall time is stored
+in a JSON file. Two result files can then be compared, flagging the benchmarks that got slower:
+
+    python -m benchmarks.bench_pipeline run --sizes 1k 100k --output bench/baseline.json
+    python -m benchmarks.bench_pipeline run --sizes 1k 100k --output bench/candidate.json
+    python -m benchmarks.bench_pipeline compare bench/baseline.json bench/candidate.json --threshold 0.1
+
+compare exits with status 1 when a benchmark is slower than the threshold, so it can gate a deploy.
+Training is benchmarked on at most --train-rows rows with the first value of every hyperparameter
+(one candidate per model family), so that 10M-row runs stay tractable.
+"""
+import sys
+import json
+import platform
+import argparse
+import tempfile
+import subprocess
+import statistics
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+from dataclasses import replace
+from StudentsPerformance.profiler import measure
+from StudentsPerformance.config import ConfigurationManager
+from StudentsPerformance.entity import RegressorConfig, SearchStrategyConfig
+from StudentsPerformance.utils import save_object, load_object, save_dataframe, load_dataframe, split_features_target
+from StudentsPerformance.component.data_transformation import DataTransformation
+from StudentsPerformance.component.model_trainer import ModelTraining
+from StudentsPerformance.pipeline.predict_pipeline import PredictPipeline
+from StudentsPerformance.pipeline.compiled_predictor import compile_predictor
+from benchmarks.synthetic import make_students
+
+
+SIZE_SUFFIXES = {'k': 1_000, 'M': 1_000_000}
+
+# Benchmarks whose duration is below this are considered noise by compare
+DEFAULT_NOISE_FLOOR_S = 0.001
+
+
+def parse_size(size: str) -> int:
+    """'1k' -> 1000, '10M' -> 10000000, '500' -> 500."""
+    if size[-1] in SIZE_SUFFIXES:
+        return int(float(size[:-1]) * SIZE_SUFFIXES[size[-1]])
+    return int(size)
+
+
+def time_call(function, repeat: int) -> dict:
+    """Runs function repeat times and returns the median/min wall time plus the CPU time and peak RSS."""
+    runs = []
+    for _ in range(repeat):
+        with measure() as stats:
+            function()
+        runs.append(stats)
+    wall = [run['wall_s'] for run in runs]
+    return {'median_s': statistics.median(wall), 'min_s': min(wall), 'repeat': repeat,
+            'cpu_s': statistics.median(run['cpu_s'] for run in runs),
+            'peak_rss_mb': max(run['peak_rss_mb'] for run in runs)}
+
+
+def single_candidate(model: RegressorConfig) -> RegressorConfig:
+    """The model with the first value of each hyperparameter, evaluated as a one-candidate grid."""
+    hyperparams = {name: [values[0] if isinstance(values, list) else values]
+                   for name, values in model.hyperparams.items()}
+    return RegressorConfig(model_class=model.model_class, hyperparams=hyperparams,
+                           search_strategy=SearchStrategyConfig())
+
+
+def bench_size(config: ConfigurationManager, n_rows: int, args, work_dir: Path) -> dict:
+    results = {}
+    transformation_config = config.get_data_transformation_config()
+    features = transformation_config.features_data_transformation
+    artifact_format = transformation_config.artifact_format
+
+    dataset = make_students(n_rows, features, seed=args.seed)
+    n_test = max(1, int(n_rows * 0.2))
+    train_data, test_data = dataset.iloc[n_test:], dataset.iloc[:n_test]
+
+    # Artifact save/load
+    train_path = work_dir / f'train.{artifact_format}'
+    results['save_dataframe'] = time_call(lambda: save_dataframe(train_data, train_path, artifact_format), args.repeat)
+    results['load_dataframe'] = time_call(lambda: load_dataframe(train_path, artifact_format), args.repeat)
+    test_path = work_dir / f'test.{artifact_format}'
+    save_dataframe(test_data, test_path, artifact_format)
+
+    # Transformation (without the transformation cache, which would turn repeats into cache hits)
+    transformation_config = replace(transformation_config, train_data_path=train_path, test_data_path=test_path,
+                                    features_output_path=work_dir / 'processor.pkl',
+                                    raw_features_output_path=work_dir / 'raw_processor.pkl', cache_dir=None)
+    transformation = DataTransformation(transformation_config)
+    arrays = {}
+    results['data_transformation'] = time_call(
+        lambda: arrays.update(zip(('train', 'test'), transformation.data_transformation())), args.repeat)
+    trainer_config = config.get_model_trainer_config()
+    raw_features = (None, None)
+    if any(model.input_mode == 'raw_categorical' for model in trainer_config.list_trained_models):
+        frames = {}
+        results['raw_categorical_transformation'] = time_call(
+            lambda: frames.update(zip(('train', 'test'), transformation.raw_categorical_transformation())),
+            args.repeat)
+        raw_features = (frames['train'].iloc[:args.train_rows], frames['test'])
+
+    # Training, one candidate per model family
+    X_train, y_train = split_features_target(arrays['train'][:args.train_rows])
+    X_test, y_test = split_features_target(arrays['test'])
+    fitted = {}
+    input_modes = {}
+    for model in trainer_config.list_trained_models:
+        # No trial store, which would turn repeats into stored trials
+        trainer = ModelTraining(replace(trainer_config, n_jobs=args.n_jobs, time_budget=None, trial_store_path=None,
+                                        list_trained_models=[single_candidate(model)]))
+        models, hyperparams, strategies = trainer.initialize_model_class()
+        model_name = list(models[0])[0]
+        if args.models and model_name not in args.models:
+            continue
+        results[f'evaluate_model/{model_name}'] = time_call(
+            lambda: fitted.update(trainer.evaluate_model(X_train, y_train, X_test, y_test, models, hyperparams,
+                                                         strategies, *raw_features)), args.repeat)
+        input_modes[model_name] = trainer.input_modes[model_name]
+        results[f'evaluate_model/{model_name}'].update(train_rows=X_train.shape[0], input_mode=input_modes[model_name])
+
+    # Model save/load; inference is benchmarked with a model on the encoded (compilable) features
+    encoded_models = [model_name for model_name in fitted if input_modes[model_name] == 'encoded']
+    inference_model = args.inference_model if args.inference_model in encoded_models else encoded_models[0]
+    model = fitted[inference_model][1]
+    model_path = work_dir / 'model.pkl'
+    results['save_object'] = time_call(lambda: save_object(model_path, model), args.repeat)
+    results['load_object'] = time_call(lambda: load_object(model_path), args.repeat)
+
+    # Inference through the pickled objects and through the compiled plan
+    features_test = test_data[list(features.numerical_features) + list(features.categorical_features)]
+    processor_path = transformation_config.features_output_path
+    compiled_path = work_dir / 'compiled_predictor.plan'
+    compile_predictor(load_object(processor_path), model, compiled_path, features_test, model_path=model_path)
+    service_config = config.get_prediction_service_config()
+    single_row = features_test.iloc[:1]
+    for variant, use_compiled in (('pickle', False), ('compiled', True)):
+        pipeline = PredictPipeline(replace(service_config, processor_path=processor_path, model_path=model_path,
+                                           compiled_path=compiled_path, use_compiled=use_compiled))
+        single = time_call(lambda: [pipeline.predict(single_row) for _ in range(args.single_calls)], args.repeat)
+        for key in ('median_s', 'min_s', 'cpu_s'):
+            single[key] /= args.single_calls
+        results[f'predict_single/{variant}'] = single
+        results[f'predict_batch/{variant}'] = time_call(lambda: pipeline.predict(features_test), args.repeat)
+        results[f'predict_batch/{variant}']['rows'] = len(features_test)
+        results[f'predict_single/{variant}']['model'] = results[f'predict_batch/{variant}']['model'] = inference_model
+
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    config = ConfigurationManager()
+    report = {'meta': {'created_at': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+                       'python': platform.python_version(), 'platform': platform.platform(),
+                       'machine': platform.machine(), 'numpy': np.__version__, 'repeat': args.repeat,
+                       'train_rows': args.train_rows, 'n_jobs': args.n_jobs},
+              'results': {}}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in args.sizes:
+            print(f'--- {size} rows ---')
+            results = bench_size(config, parse_size(size), args, Path(work_dir))
+            for name, result in results.items():
+                report['results'][f'{size}/{name}'] = result
+                print(f"{name:40s} {result['median_s'] * 1000:12.3f} ms")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f'Results written to {args.output}')
+
+
+def compare(args) -> int:
+    with open(args.baseline, 'r') as file:
+        baseline = json.load(file)
+    with open(args.candidate, 'r') as file:
+        candidate = json.load(file)
+
+    slower = []
+    print(f"{'benchmark':50s} {'baseline ms':>12s} {'candidate ms':>12s} {'ratio':>7s}")
+    for name in sorted(set(baseline['results']) & set(candidate['results'])):
+        base, new = baseline['results'][name]['median_s'], candidate['results'][name]['median_s']
+        ratio = new / base if base > 0 else float('inf')
+        flag = ratio > 1 + args.threshold and new - base > args.noise_floor
+        if flag:
+            slower.append(name)
+        print(f"{name:50s} {base * 1000:12.3f} {new * 1000:12.3f} {ratio:7.2f}{'  SLOWER' if flag else ''}")
+
+    for name in sorted(set(baseline['results']) ^ set(candidate['results'])):
+        print(f'{name}: only in {"baseline" if name in baseline["results"] else "candidate"}')
+
+    if slower:
+        print(f'{len(slower)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}')
+        return 1
+    print('No slowdown')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline hot paths on synthetic data.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='run the benchmarks and store the results')
+    run_parser.add_argument('--sizes', nargs='+', default=['1k', '100k'], help='dataset sizes, e.g. 1k 100k 10M')
+    run_parser.add_argument('--output', type=Path, required=True, help='JSON results file')
+    run_parser.add_argument('--repeat', type=int, default=3, help='runs of each benchmark (median is kept)')
+    run_parser.add_argument('--train-rows', type=int, default=100_000, help='max rows used by the training benchmarks')
+    run_parser.add_argument('--n-jobs', type=int, default=-1, help='worker processes of the model search')
+    run_parser.add_argument('--models', nargs='*', help='model families to benchmark (default: all configured)')
+    run_parser.add_argument('--inference-model', default='LinearRegression', help='model used by the inference benchmarks')
+    run_parser.add_argument('--single-calls', type=int, default=100, help='single-row predictions per run')
+    run_parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic data')
+
+    compare_parser = subparsers.add_parser('compare', help='flag the benchmarks slower than a baseline')
+    compare_parser.add_argument('baseline', type=Path)
+    compare_parser.add_argument('candidate', type=Path)
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='allowed relative slowdown')
+    compare_parser.add_argument('--noise-floor', type=float, default=DEFAULT_NOISE_FLOOR_S,
+                                help='absolute slowdown in seconds below which a difference is ignored')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        run(args)
+        return 0
+    return compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Latency benchmark of the prediction service against a local client.
+
+Starts the service in-process on a free port, sends single-record requests from concurrent client
+threads and reports p50/p99 latency and throughput:
+
+    python -m benchmarks.bench_prediction_service --requests 2000 --concurrency 16
+"""
+import json
+import time
+import argparse
+import threading
+import http.client
+import numpy as np
+from werkzeug.serving import make_server
+from app import create_app
+
+
+SAMPLE_RECORD = {
+    'gender': 'female',
+    'race/ethnicity': 'group B',
+    'parental level of education': "bachelor's degree",
+    'lunch': 'standard',
+    'test preparation course': 'none',
+    'reading score': 72,
+    'writing score': 74,
+}
+
+
+def client(port: int, n_requests: int, latencies: list):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    body = json.dumps(SAMPLE_RECORD)
+    headers = {'Content-Type': 'application/json'}
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        connection.request('POST', '/predict', body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            raise RuntimeError(f'Request failed with status {response.status}')
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the prediction service latency.')
+    parser.add_argument('--requests', type=int, default=2000, help='total number of requests')
+    parser.add_argument('--concurrency', type=int, default=16, help='number of concurrent clients')
+    args = parser.parse_args()
+
+    server = make_server('127.0.0.1', 0, create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    latencies = []
+    per_client = args.requests // args.concurrency
+    clients = [threading.Thread(target=client, args=(server.port, per_client, latencies))
+               for _ in range(args.concurrency)]
+    start = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    latencies_ms = np.array(latencies) * 1000
+    print(f'requests: {len(latencies)}, concurrency: {args.concurrency}')
+    print(f'p50: {np.percentile(latencies_ms, 50):.2f} ms, p99: {np.percentile(latencies_ms, 99):.2f} ms')
+    print(f'throughput: {len(latencies) / elapsed:.0f} requests/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Synthetic student-performance datasets with the schema of features_data_transformation, for benchmarks.
+
+Category levels and score distributions follow the Kaggle StudentsPerformance dataset, so the
+transformations and models do the same work as on the real data at any number of rows.
+"""
+import numpy as np
+import pandas as pd
+from StudentsPerformance.entity import FeaturesDataTransformation
+
+
+CATEGORY_LEVELS = {
+    'gender': ['female', 'male'],
+    'race/ethnicity': ['group A', 'group B', 'group C', 'group D', 'group E'],
+    'parental level of education': ["associate's degree", "bachelor's degree", 'high school', "master's degree",
+                                    'some college', 'some high school'],
+    'lunch': ['free/reduced', 'standard'],
+    'test preparation course': ['completed', 'none'],
+}
+
+# Fraction of missing values injected in each feature, so the imputers have work to do
+MISSING_RATE = 0.01
+
+
+def make_students(n_rows: int, features: FeaturesDataTransformation, seed: int = 0) -> pd.DataFrame:
+    """
+    Generates a dataset with the configured feature and target columns.
+
+    :param n_rows: Number of rows.
+    :param features: Column names of the features and of the target(s).
+    :param seed: Random seed, the same seed always gives the same dataset.
+    :return: DataFrame with categorical (category dtype) and integer score columns.
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    effect = np.zeros(n_rows)
+    for column in features.categorical_features:
+        levels = CATEGORY_LEVELS.get(column, ['level 0', 'level 1', 'level 2'])
+        codes = rng.integers(0, len(levels), n_rows)
+        effect += rng.normal(0, 3, len(levels))[codes]
+        codes[rng.random(n_rows) < MISSING_RATE] = -1
+        data[column] = pd.Categorical.from_codes(codes, categories=levels)
+
+    # Scores are correlated like the real ones (reading/writing ~0.95, with math ~0.8)
+    ability = rng.normal(0, 1, n_rows)
+    for column in features.numerical_features:
+        score = np.clip(np.round(66 + 14 * ability + effect + rng.normal(0, 4, n_rows)), 0, 100)
+        score[rng.random(n_rows) < MISSING_RATE] = np.nan
+        data[column] = score
+    for column in features.target_variables:
+        data[column] = np.clip(np.round(66 + 13 * ability + effect + rng.normal(0, 6, n_rows)), 0, 100)
+
+    return pd.DataFrame(data)